@@ -0,0 +1,99 @@
+"""Benchmark hidden targets with different formats and compressions.
+
+Run the benchmark with
+
+.. code-block:: bash
+
+    $ python benchmarks/compression.py --n-rows 1000000 --directory /scratch
+
+A data set is written to a target without a suffix with ``save_data()`` and read with
+``load_data()`` for every combination of ``hidden_target_format`` and
+``hidden_target_compression``. Compressions whose packages are not installed are
+skipped. The throughput is measured in MB of the data set in memory per second.
+Files are written to ``--directory`` which should be located on the storage you
+want to benchmark.
+
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from pipeline.compression import COMPRESSIONS
+from pipeline.compression import is_compression_available
+from pipeline.templates import collect_templates
+
+
+MB = 1024 ** 2
+
+
+def create_data(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "id": np.arange(n_rows),
+            "x": rng.normal(size=n_rows).round(4),
+            "count": rng.poisson(3, size=n_rows),
+            "group": rng.choice(list("abcdefgh"), size=n_rows),
+        }
+    )
+
+
+def render_functions(hidden_target_format, hidden_target_compression):
+    env, _ = collect_templates([])
+    namespace = {}
+    for template in ["save_data.py", "load_data.py"]:
+        code = env.get_template(template).render(
+            hidden_target_format=hidden_target_format,
+            hidden_target_compression=hidden_target_compression,
+            sample=None,
+        )
+        exec(code, namespace)
+
+    return namespace["save_data"], namespace["load_data"]
+
+
+@click.command()
+@click.option("--n-rows", default=1_000_000, help="Number of rows of the data set.")
+@click.option("--formats", default="csv,pkl,parquet", help="Comma-separated formats.")
+@click.option("--directory", default=None, help="Directory for the benchmark files.")
+def main(n_rows, formats, directory):
+    df = create_data(n_rows)
+    data_size = df.memory_usage(deep=True).sum() / MB
+    compressions = [None] + [c for c in COMPRESSIONS if is_compression_available(c)]
+
+    click.echo(
+        f"{'format':>8} {'compression':>12} {'write MB/s':>11} {'read MB/s':>10} "
+        f"{'MB':>8} {'ratio':>6}"
+    )
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for format_ in formats.split(","):
+            uncompressed_size = None
+            for compression in compressions:
+                save_data, load_data = render_functions(format_, compression)
+                path = Path(tmp, "target")
+
+                start = time.perf_counter()
+                save_data(df, path)
+                write_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                load_data(path)
+                read_seconds = time.perf_counter() - start
+
+                size = path.stat().st_size / MB
+                uncompressed_size = uncompressed_size or size
+                click.echo(
+                    f"{format_:>8} {str(compression):>12} "
+                    f"{data_size / write_seconds:>11.1f} "
+                    f"{data_size / read_seconds:>10.1f} "
+                    f"{size:>8.1f} {uncompressed_size / size:>6.2f}"
+                )
+
+                path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark a grid of OLS specifications in one task against one task per formula.
+
+Run the benchmark with
+
+.. code-block:: bash
+
+    $ python benchmarks/estimation.py --n-rows 100000 --n-outcomes 5 --n-regressors 20
+
+Two projects are created in a temporary directory. The first one has a task with the
+template ``ols.py`` for every formula and the second one a single task with the template
+``ols_specifications.py``. Both projects are built with ``pipeline build`` which must be
+installed.
+
+"""
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+import yaml
+
+
+def create_data(path, n_rows, n_outcomes, n_regressors, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {f"x{i}": rng.normal(size=n_rows) for i in range(n_regressors)}
+    data["g"] = rng.choice(list("abcdefgh"), size=n_rows)
+    for i in range(n_outcomes):
+        data[f"y{i}"] = sum(data[f"x{j}"] for j in range(n_regressors)) + rng.normal(
+            size=n_rows
+        )
+    pd.DataFrame(data).to_csv(path, index=False)
+
+
+def create_specifications(n_outcomes, n_regressors):
+    """Create the grid of outcomes and sets of regressors.
+
+    Example
+    -------
+    >>> create_specifications(1, 2)
+    (['y0'], ['x0', 'x0 + C(g)', 'x0 + x1', 'x0 + x1 + C(g)'])
+
+    """
+    outcomes = [f"y{i}" for i in range(n_outcomes)]
+    regressors = [
+        " + ".join([f"x{j}" for j in range(i + 1)] + controls)
+        for i in range(n_regressors)
+        for controls in [[], ["C(g)"]]
+    ]
+    return outcomes, regressors
+
+
+def create_project(directory, tasks):
+    directory.mkdir()
+    directory.joinpath(".pipeline.yaml").write_text("")
+    directory.joinpath("src").mkdir()
+    directory.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+
+def time_build(directory, n_jobs):
+    start = time.perf_counter()
+    subprocess.run(
+        ["pipeline", "build", "-n", str(n_jobs)],
+        cwd=directory,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("--n-rows", default=10_000, help="Number of observations.")
+@click.option("--n-outcomes", default=5, help="Number of outcomes.")
+@click.option("--n-regressors", default=10, help="Maximum number of regressors.")
+@click.option("--n-jobs", default=1, help="Number of parallel jobs.")
+def main(n_rows, n_outcomes, n_regressors, n_jobs):
+    outcomes, regressors = create_specifications(n_outcomes, n_regressors)
+    formulas = [f"{y} ~ {x}" for y in outcomes for x in regressors]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = Path(tmp, "data.csv")
+        create_data(data, n_rows, n_outcomes, n_regressors)
+
+        separate_tasks = {
+            f"ols-{i}": {
+                "template": "ols.py",
+                "depends_on": data.as_posix(),
+                "formula": formula,
+            }
+            for i, formula in enumerate(formulas)
+        }
+        create_project(Path(tmp, "separate"), separate_tasks)
+
+        grid_task = {
+            "ols-grid": {
+                "template": "ols_specifications.py",
+                "depends_on": data.as_posix(),
+                "outcomes": outcomes,
+                "regressors": regressors,
+                "produces": [
+                    "{{ build_directory }}/" + f"ols-{i}.pkl"
+                    for i in range(len(formulas))
+                ],
+            }
+        }
+        create_project(Path(tmp, "grid"), grid_task)
+
+        seconds_separate = time_build(Path(tmp, "separate"), n_jobs)
+        seconds_grid = time_build(Path(tmp, "grid"), n_jobs)
+
+    click.echo(f"{len(formulas)} specifications with {n_rows} observations.")
+    click.echo(f"{'ols.py':>22} {len(formulas):>4} tasks {seconds_separate:>8.2f}s")
+    click.echo(f"{'ols_specifications.py':>22} {1:>4} tasks {seconds_grid:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark the hashing of files with different sizes and algorithms.
+
+Run the benchmark with
+
+.. code-block:: bash
+
+    $ python benchmarks/hashing.py --sizes 1MB,100MB,1GB,20GB --directory /scratch
+
+Files are written to ``--directory`` which should be located on the storage you want to
+benchmark. Note that the files are read from the page cache if they fit into memory.
+
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from pipeline.hashing import _compute_hash_of_file
+from pipeline.hashing import HASH_ALGORITHMS
+
+
+UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(size):
+    """Parse a human-readable size.
+
+    Examples
+    --------
+    >>> parse_size("20GB")
+    21474836480
+    >>> parse_size("512")
+    512
+
+    """
+    size = size.strip().upper()
+    for unit, factor in UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[: -len(unit)]) * factor)
+
+    return int(size)
+
+
+def create_file(path, size, block_size=UNITS["MB"]):
+    block = bytes(range(256)) * (block_size // 256)
+    with open(path, "wb") as f:
+        for _ in range(size // block_size):
+            f.write(block)
+        f.write(block[: size % block_size])
+
+
+def time_hashing(path, algorithm):
+    start = time.perf_counter()
+    _compute_hash_of_file.__wrapped__(path, None, algorithm)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("--sizes", default="1MB,100MB,1GB", help="Comma-separated file sizes.")
+@click.option("--directory", default=None, help="Directory for the benchmark files.")
+@click.option("--chunk-size", default="16MB", help="Chunk size of tree hashes.")
+def main(sizes, directory, chunk_size):
+    chunk_size = parse_size(chunk_size)
+    algorithms = [
+        algorithm
+        for name in sorted(HASH_ALGORITHMS)
+        for algorithm in [name, f"{name}-tree-{chunk_size}"]
+        if name in ["sha256", "blake2b", "xxh3"]
+    ]
+
+    click.echo(f"{'size':>10} {'algorithm':>24} {'seconds':>10} {'MB/s':>10}")
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for size in sizes.split(","):
+            path = Path(tmp, f"file-{size}")
+            n_bytes = parse_size(size)
+            create_file(path, n_bytes)
+
+            for algorithm in algorithms:
+                seconds = time_hashing(path, algorithm)
+                throughput = n_bytes / UNITS["MB"] / seconds
+                click.echo(
+                    f"{size:>10} {algorithm:>24} {seconds:>10.3f} {throughput:>10.1f}"
+                )
+
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,5 @@
+from pipeline.functions import task
+
 __version__ = "0.0.5"
+
+__all__ = ["task"]
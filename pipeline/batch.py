@@ -0,0 +1,56 @@
+"""This module runs a batch of fused tasks in a single process.
+
+The module is executed as a script by the executors. It does not import pipeline such
+that it works in every environment in which a task can be executed.
+
+"""
+import argparse
+import json
+import runpy
+import sys
+import traceback
+from pathlib import Path
+
+
+def run_batch(paths, report):
+    """Run a batch of rendered Python tasks in this process.
+
+    Each task is executed with :func:`runpy.run_path` like with ``python task.py``. Data
+    sets loaded with ``load_data()`` are cached in ``__pipeline_data_cache__`` and
+    reused by the following tasks. Tracebacks of failing tasks are stored in the report
+    and the remaining tasks are executed nonetheless.
+
+    """
+    data_cache = {}
+    failures = {}
+    for path in paths:
+        sys.argv = [path]
+        sys.path.insert(0, str(Path(path).parent))
+        try:
+            runpy.run_path(
+                path,
+                init_globals={"__pipeline_data_cache__": data_cache},
+                run_name="__main__",
+            )
+        except SystemExit as e:
+            if e.code not in [None, 0]:
+                failures[path] = traceback.format_exc()
+        except Exception:
+            failures[path] = traceback.format_exc()
+        finally:
+            sys.path.pop(0)
+
+    Path(report).write_text(json.dumps(failures))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a batch of tasks.")
+    parser.add_argument("--report", required=True)
+    parser.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    run_batch(args.paths, args.report)
+
+
+if __name__ == "__main__":
+    main()
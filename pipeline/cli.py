@@ -1,17 +1,42 @@
 """This module comprises all CLI capabilities of pipeline."""
+import functools
 import pprint
 import shutil
 
 import click
 
 from pipeline.config import load_config
+from pipeline.distributed import read_coordinator_file
+from pipeline.distributed import run_worker
 from pipeline.main import build_project
+from pipeline.main import collect_garbage
+from pipeline.main import collect_garbage_of_variants
+from pipeline.main import merge_hash_databases
+from pipeline.profiling import PROFILE_MODES
 from pipeline.tasks import process_tasks
 from pipeline.templates import collect_templates
+from pipeline.variants import select_variants
 
 CONTEXT_SETTINGS = {"help_option_names": ["-h", "--help"]}
 
 
+class _NJobsParamType(click.ParamType):
+    """The number of parallel jobs which is a positive integer or 'auto'."""
+
+    name = "integer|auto"
+
+    def convert(self, value, param, ctx):
+        if value == "auto" or isinstance(value, int):
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            self.fail(f"{value!r} is neither an integer nor 'auto'.", param, ctx)
+
+
+N_JOBS = _NJobsParamType()
+
+
 @click.group(context_settings=CONTEXT_SETTINGS, invoke_without_command=True)
 @click.version_option()
 def cli():
@@ -36,18 +61,162 @@ def collect(config, tasks, templates):
 
 @cli.command()
 @click.option("--debug", is_flag=True, default=None)
-@click.option("-n", "--n-jobs", default=None, type=int, help="Number of parallel jobs.")
+@click.option(
+    "-n",
+    "--n-jobs",
+    default=None,
+    type=N_JOBS,
+    help="Number of parallel jobs or 'auto' to use all available CPUs.",
+)
 @click.option(
     "--priority/--no-priority", default=None, help="Schedule tasks by priority."
 )
-def build(debug, n_jobs, priority):
-    """Build the project."""
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Profile the CPU time and/or the memory usage of tasks.",
+)
+@click.option(
+    "--profile-mode",
+    type=click.Choice(PROFILE_MODES),
+    default=None,
+    help="Profile the CPU time, the memory usage, or both. Implies '--profile'.",
+)
+@click.option(
+    "--sample",
+    default=None,
+    help="Build on a sample of the data, e.g., '1%', in a separate build directory.",
+)
+@click.option(
+    "--distributed",
+    is_flag=True,
+    default=None,
+    help="Execute tasks with workers started by 'pipeline worker'.",
+)
+@click.option(
+    "--executor",
+    default=None,
+    help="Executor backend, e.g., 'serial', 'process', or 'local-batch'.",
+)
+@click.option(
+    "--shard",
+    default=None,
+    help="Execute only the i-th of N shards of the unfinished tasks, e.g., '1/4'.",
+)
+@click.option(
+    "--variants",
+    is_flag=False,
+    flag_value="all",
+    default=None,
+    help="Build all variants or a comma-separated selection, e.g., 'base,recent'.",
+)
+@click.argument("tasks", nargs=-1)
+def build(
+    debug,
+    n_jobs,
+    priority,
+    profile,
+    profile_mode,
+    sample,
+    distributed,
+    executor,
+    shard,
+    variants,
+    tasks,
+):
+    """Build the project.
+
+    Tasks can only be passed while profiling. Then, only these tasks are profiled and
+    they are executed even if they are up-to-date.
+
+    With '--variants', the variants of the project are built one after another and
+    identical tasks of different variants are executed only once.
+
+    """
+    if tasks and not profile and profile_mode is None:
+        raise click.UsageError(
+            "Tasks can only be passed with '--profile' or '--profile-mode'."
+        )
+
     click.echo("### Build Project")
-    config = load_config(debug, n_jobs, priority)
-    build_project(config)
+    if profile and profile_mode is None:
+        profile_mode = "cpu"
+    load_config_ = functools.partial(
+        load_config,
+        debug,
+        n_jobs,
+        priority,
+        profile_mode,
+        tasks,
+        sample=sample,
+        distributed=distributed,
+        executor=executor,
+        shard=shard,
+    )
+    if variants is None:
+        build_project(load_config_())
+    else:
+        for variant in select_variants(variants, load_config_()["variants"]):
+            click.echo(f"### Build Variant '{variant}'")
+            build_project(load_config_(variant=variant))
     click.echo("### Finished")
 
 
+@cli.command()
+@click.option("-n", "--n-jobs", default=1, type=int, help="Number of parallel jobs.")
+@click.option(
+    "--timeout",
+    default=60,
+    type=float,
+    help="Seconds to wait for the coordinator to start.",
+)
+def worker(n_jobs, timeout):
+    """Execute tasks of a distributed build on this machine.
+
+    The worker connects to the coordinator started by 'pipeline build --distributed'
+    in the same project and exits when the build is finished.
+
+    """
+    config = load_config()
+    address, authkey = read_coordinator_file(config, timeout)
+    click.echo(f"Connected to {address[0]}:{address[1]}.")
+    n_executed_tasks = run_worker(address, authkey, n_jobs)
+    click.echo(f"Executed {n_executed_tasks} task(s).")
+
+
+@cli.command()
+@click.option("--vacuum", is_flag=True, help="Reclaim the space of deleted rows.")
+def gc(vacuum):
+    """Delete hashes of tasks and dependencies which are not in the project anymore.
+
+    Entries of the variant cache which are not used by any variant are deleted, too.
+
+    """
+    config = load_config()
+    n_deleted = collect_garbage(config, vacuum)
+    click.echo(f"Deleted {n_deleted} stale hash(es).")
+
+    if config["variants"]:
+        configs = [load_config(variant=variant) for variant in config["variants"]]
+        n_deleted = collect_garbage_of_variants(configs)
+        click.echo(f"Deleted {n_deleted} stale entr(y/ies) of the variant cache.")
+
+
+@cli.command("merge-db")
+@click.argument("databases", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+def merge_db(databases):
+    """Merge the hashes of sharded builds into the database of the project.
+
+    Pass the 'db.sql' files of the hidden build directories of the other builds. For
+    every task, the hashes of the build which executed the task last are kept.
+
+    """
+    config = load_config()
+    n_merged = merge_hash_databases(databases, config)
+    click.echo(f"Merged the hashes of {n_merged} task(s).")
+
+
 @cli.command()
 def clean():
     """Clean the project."""
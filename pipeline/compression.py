@@ -0,0 +1,109 @@
+"""This module contains the code to compress hidden targets.
+
+With ``hidden_target_compression``, data sets and models which ``save_data()``,
+``save_model()``, and the R templates write to targets without a suffix are compressed.
+Loading functions detect compressed files by their magic numbers such that tasks do not
+need to know whether a dependency is compressed. Compressed files are written
+deterministically and hashed as they are stored.
+
+"""
+import gzip
+
+
+COMPRESSIONS = ["zstd", "lz4", "gzip"]
+
+MAGIC_NUMBERS = {
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "lz4": b"\x04\x22\x4d\x18",
+    "gzip": b"\x1f\x8b",
+}
+
+
+def is_compression_available(compression):
+    """Check whether the Python package for a compression is installed.
+
+    Example
+    -------
+    >>> is_compression_available("gzip")
+    True
+
+    """
+    try:
+        if compression == "zstd":
+            import zstandard  # noqa: F401
+        elif compression == "lz4":
+            import lz4.frame  # noqa: F401
+    except ImportError:
+        is_available = False
+    else:
+        is_available = compression in COMPRESSIONS
+
+    return is_available
+
+
+def parse_compression(compression):
+    """Parse the compression of hidden targets.
+
+    ``auto`` selects zstd or lz4 if the packages are installed and gzip otherwise.
+
+    Examples
+    --------
+    >>> parse_compression("gzip")
+    'gzip'
+    >>> parse_compression("auto") in COMPRESSIONS
+    True
+    >>> parse_compression(None) is None
+    True
+
+    """
+    if not compression:
+        compression = None
+    elif compression == "auto":
+        compression = next(c for c in COMPRESSIONS if is_compression_available(c))
+    elif compression not in COMPRESSIONS:
+        raise ValueError(
+            "'hidden_target_compression' must be one of "
+            f"{['auto', *sorted(COMPRESSIONS)]}, but is '{compression}'."
+        )
+    elif not is_compression_available(compression):
+        package = {"zstd": "zstandard", "lz4": "lz4"}[compression]
+        raise ValueError(
+            f"The compression '{compression}' requires the package '{package}'. "
+            f"Install it with `conda install -c conda-forge {package}`."
+        )
+
+    return compression
+
+
+def detect_compression(path):
+    """Detect the compression of a file by its magic number or return ``None``."""
+    with open(path, "rb") as f:
+        header = f.read(4)
+
+    return next(
+        (
+            compression
+            for compression, magic_number in MAGIC_NUMBERS.items()
+            if header.startswith(magic_number)
+        ),
+        None,
+    )
+
+
+def open_file(path):
+    """Open a file for reading and decompress it if it is compressed."""
+    compression = detect_compression(path)
+    if compression == "zstd":
+        import zstandard
+
+        f = zstandard.open(path, "rb")
+    elif compression == "lz4":
+        import lz4.frame
+
+        f = lz4.frame.open(path, "rb")
+    elif compression == "gzip":
+        f = gzip.open(path, "rb")
+    else:
+        f = open(path, "rb")
+
+    return f
@@ -1,10 +1,31 @@
+import socket
 from pathlib import Path
 
 from pipeline._yaml import read_yaml
+from pipeline.compression import parse_compression
+from pipeline.hashers import parse_hashers
+from pipeline.hashing import DEFAULT_DIRECTORY_IGNORE
+from pipeline.resources import count_available_cpus
+from pipeline.resources import determine_n_jobs
+from pipeline.sampling import parse_sample
+from pipeline.sharding import parse_shard
 from pipeline.shared import ensure_list
-
-
-def load_config(debug=None, n_jobs=None, priority=None, config=None):
+from pipeline.variants import parse_variants
+
+
+def load_config(
+    debug=None,
+    n_jobs=None,
+    priority=None,
+    profile=None,
+    profile_tasks=None,
+    config=None,
+    sample=None,
+    distributed=None,
+    executor=None,
+    shard=None,
+    variant=None,
+):
     if config is None:
         path = Path.cwd() / ".pipeline.yaml"
 
@@ -20,11 +41,46 @@ def load_config(debug=None, n_jobs=None, priority=None, config=None):
         ("project_directory", ".", "user_config_directory"),
         ("source_directory", "src", "project_directory"),
         ("build_directory", "bld", "project_directory"),
+    ]:
+        config[key] = _generate_path(key, default, default_parent, config)
+
+    # Variants have their own targets and hash database and share the targets of
+    # identical tasks via the cache in the build directory of the project.
+    config["variants"] = parse_variants(config.get("variants", None))
+    config["variant_cache_directory"] = _generate_path(
+        "variant_cache_directory", ".pipeline/variant-cache", "build_directory", config
+    )
+    config["_variant"] = variant
+    if variant is not None:
+        if variant not in config["variants"]:
+            raise ValueError(
+                f"Unknown variant '{variant}'. Choose from {list(config['variants'])}."
+            )
+        config["build_directory"] = config["build_directory"] + f"-{variant}"
+
+    # The command-line input has precedence over the value in the config file.
+    config["sample"] = parse_sample(
+        sample if sample is not None else config.get("sample", None)
+    )
+    config["sample_seed"] = config.get("sample_seed", 0)
+    config["sample_by"] = config.get("sample_by", None)
+    if config["sample"] is not None:
+        # Sampled builds have their own targets and hash database.
+        config["build_directory"] = _generate_path(
+            "sample_build_directory",
+            config["build_directory"] + "-sample",
+            "project_directory",
+            config,
+        )
+
+    for key, default, default_parent in [
         ("hidden_build_directory", ".pipeline", "build_directory"),
         ("hidden_task_directory", ".tasks", "build_directory"),
     ]:
         config[key] = _generate_path(key, default, default_parent, config)
 
+    config["task_modules"] = config.get("task_modules", "task_*.py")
+
     custom_templates_dirs = ensure_list(config.get("custom_templates", []))
     config["custom_templates"] = [
         _generate_path(path, default_parent="project_directory", config=config)
@@ -34,18 +90,84 @@ def load_config(debug=None, n_jobs=None, priority=None, config=None):
     config["_is_debug"] = debug if debug is not None else False
 
     config["globals"] = config.get("globals", {})
+    if variant is not None:
+        config["globals"] = {**config["globals"], **config["variants"][variant]}
 
     config["priority_scheduling"] = (
         config.get("priority_scheduling", False) if priority is None else priority
     )
     config["priority_discount_factor"] = config.get("priority_discount_factor", 0)
 
+    n_cpus = count_available_cpus()
     if config["_is_debug"]:
         # Turn off parallelization if debug modus is requested.
         config["n_jobs"] = 1
     else:
         # The command-line input has precedence over the value in the config file.
         config["n_jobs"] = n_jobs if n_jobs is not None else config.get("n_jobs", 1)
+        if config["n_jobs"] == "auto":
+            config["n_jobs"] = determine_n_jobs(
+                n_cpus,
+                config.get("threads_per_job", 1),
+                config.get("memory_per_job", None),
+            )
+        config["n_jobs"] = int(config["n_jobs"])
+    # Every job gets an equal share of the CPUs such that threads do not compete.
+    config["threads_per_job"] = config.get(
+        "threads_per_job", max(n_cpus // config["n_jobs"], 1)
+    )
+    config["pin_cpus"] = config.get("pin_cpus", False)
+
+    if config["_is_debug"]:
+        # The debugger needs the tasks to be executed in this process.
+        config["executor"] = "serial"
+    elif executor is not None:
+        config["executor"] = executor
+    else:
+        config["executor"] = config.get(
+            "executor", "serial" if config["n_jobs"] == 1 else "process"
+        )
+
+    config["n_hashing_threads"] = config.get("n_hashing_threads", 4)
+    config["hash_algorithm"] = config.get("hash_algorithm", "sha256")
+    config["hash_tree_threshold"] = config.get("hash_tree_threshold", 256 * 1024 ** 2)
+    config["hash_tree_chunk_size"] = config.get("hash_tree_chunk_size", 16 * 1024 ** 2)
+    config["directory_ignore"] = ensure_list(
+        config.get("directory_ignore", DEFAULT_DIRECTORY_IGNORE)
+    )
+    config["hashers"] = parse_hashers(
+        config.get("hashers", None), config["project_directory"]
+    )
+
+    config["fusion_batch_size"] = config.get("fusion_batch_size", 1)
+    config["ephemeral_hidden_targets"] = config.get("ephemeral_hidden_targets", False)
+
+    config["distributed"] = (
+        distributed if distributed is not None else config.get("distributed", False)
+    )
+    config["coordinator_address"] = config.get(
+        "coordinator_address", f"{socket.gethostname()}:0"
+    )
+    config["shard"] = parse_shard(
+        shard if shard is not None else config.get("shard", None)
+    )
+
+    config["hidden_target_format"] = config.get("hidden_target_format", "csv")
+    config["hidden_target_compression"] = parse_compression(
+        config.get("hidden_target_compression", None)
+    )
+    config["dataset_store"] = config.get("dataset_store", False)
+    config["dataset_store_min_consumers"] = config.get("dataset_store_min_consumers", 2)
+
+    config["profile"] = profile if profile is not None else config.get("profile", None)
+    config["profile_tasks"] = (
+        (list(profile_tasks) if profile_tasks else config.get("profile_tasks", []))
+        if config["profile"] is not None
+        else []
+    )
+    config["profile_top_n"] = config.get("profile_top_n", 10)
+
+    config["gc_after_build"] = config.get("gc_after_build", True)
 
     Path(config["hidden_build_directory"]).mkdir(parents=True, exist_ok=True)
     config["db"] = config.get(
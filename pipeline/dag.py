@@ -28,7 +28,8 @@ class Scheduler:
     dependency from all tasks in `task_dict`.
 
     The scheduler can take task priorities into account and proposes only tasks
-    with the highest priorities.
+    with the highest priorities. Among tasks with the same priority, tasks which depend
+    on ephemeral targets are proposed first such that the targets are deleted early.
 
     """
 
@@ -37,6 +38,14 @@ class Scheduler:
         self.task_dict = self._create_task_dependency_dict(unfinished_tasks)
         self.submitted_tasks = set()
         self.priority = priority
+        self.n_ephemeral_dependencies = {
+            id_: sum(
+                1
+                for dependency in self.dag.predecessors(id_)
+                if self.dag.nodes[dependency].get("_is_ephemeral", False)
+            )
+            for id_ in unfinished_tasks
+        }
 
     def _create_task_dependency_dict(self, unfinished_tasks):
         """Create a task-dependency dictionary.
@@ -76,6 +85,12 @@ class Scheduler:
         """
         # Get task candidates.
         candidates = [id_ for id_ in self.task_dict if len(self.task_dict[id_]) == 0]
+        if any(self.n_ephemeral_dependencies.values()):
+            candidates = sorted(
+                candidates,
+                key=lambda id_: self.n_ephemeral_dependencies[id_],
+                reverse=True,
+            )
         if self.priority:
             candidates = sorted(
                 candidates,
@@ -99,6 +114,43 @@ class Scheduler:
 
         return proposals
 
+    def propose_fusable(self, id_, n_proposals):
+        """Propose ready tasks which can be fused with a proposed task.
+
+        Tasks can be fused if they have the same fusion key which is assigned by
+        :func:`pipeline.fusion.mark_fusable_tasks`.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of a proposed task.
+        n_proposals : int
+            The maximum number of tasks which should be proposed.
+
+        Returns
+        -------
+        proposals : set
+            A set of task ids which should be executed together with ``id_``.
+
+        """
+        key = self.dag.nodes[id_].get("_fusion_key")
+        candidates = sorted(
+            id__
+            for id__ in self.task_dict
+            if len(self.task_dict[id__]) == 0
+            and id__ != id_
+            and key is not None
+            and self.dag.nodes[id__].get("_fusion_key") == key
+        )
+        proposals = set(candidates[: max(n_proposals, 0)])
+
+        self.submitted_tasks = self.submitted_tasks.union(proposals)
+
+        for id__ in proposals:
+            del self.task_dict[id__]
+
+        return proposals
+
     def process_finished(self, finished_tasks):
         """Process finished tasks.
 
@@ -119,6 +171,20 @@ class Scheduler:
             for id__ in self.task_dict:
                 self.task_dict[id__].discard(id_)
 
+    def reschedule(self, submitted_tasks):
+        """Return submitted tasks which were not executed to the scheduler.
+
+        Parameters
+        ----------
+        submitted_tasks : str or list
+            An id or a list of ids of submitted tasks.
+
+        """
+        submitted_tasks = ensure_list(submitted_tasks)
+        for id_ in submitted_tasks:
+            self.submitted_tasks.remove(id_)
+            self.task_dict[id_] = set()
+
     @property
     def are_tasks_left(self):
         return len(self.task_dict) != 0 or len(self.submitted_tasks) != 0
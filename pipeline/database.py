@@ -1,20 +1,267 @@
+"""This module contains the database which stores the hashes and runtimes of tasks.
+
+The schema of the database is versioned with SQLite's ``user_version``. Every change to
+the schema is accompanied by a migration in :data:`MIGRATIONS` which upgrades databases
+created by older versions of pipeline.
+
+"""
+import sqlite3
+import time
+from pathlib import Path
+
 from pony import orm
 
 
 db = orm.Database()
 
 
+SCHEMA_VERSION = 2
+
+DEFAULT_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 ** 2,
+}
+
+_SQLITE_PRAGMAS = DEFAULT_SQLITE_PRAGMAS.copy()
+
+_BOUND_DB_CONFIG = {}
+
+
 class Hash(db.Entity):
     task = orm.Required(str)
-    dependency = orm.Required(str)
+    dependency = orm.Required(str, index=True)
     hash_ = orm.Required(str)
+    algorithm = orm.Required(str, default="sha256")
 
     orm.PrimaryKey(task, dependency)
 
 
+class Runtime(db.Entity):
+    """The runtime of the last execution of a task and when it finished."""
+
+    task = orm.PrimaryKey(str)
+    seconds = orm.Required(float)
+    finished = orm.Required(float)
+
+
+@db.on_connect(provider="sqlite")
+def _set_sqlite_pragmas(db, connection):  # noqa: U100
+    cursor = connection.cursor()
+    for pragma, value in _SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
 def create_database(config):
-    try:
+    """Bind the database to the database of the build.
+
+    The database is bound again if it is already bound to the database of another build,
+    for example, of another variant built in the same process.
+
+    """
+    _SQLITE_PRAGMAS.update(config.get("db_pragmas", {}))
+
+    if db.provider is not None and _BOUND_DB_CONFIG != config["db"]:
+        _unbind_database()
+
+    if db.provider is None:
+        _migrate_database(config["db"])
         db.bind(**config["db"])
-        db.generate_mapping(create_tables=True)
-    except orm.BindingError:
-        pass
+        if db.schema is None:
+            db.generate_mapping(create_tables=True)
+        else:
+            # The mapping of the entities is kept and only the tables are created.
+            db.schema.provider = db.provider
+            db.create_tables()
+        _BOUND_DB_CONFIG.clear()
+        _BOUND_DB_CONFIG.update(config["db"])
+        _set_schema_version(config["db"])
+
+
+def _unbind_database():
+    """Close the connection and release the provider of the bound database."""
+    db.disconnect()
+    db.provider = db.provider_name = None
+
+
+def _migrate_to_version_1(connection):
+    """Add the column for the hash algorithm.
+
+    Rows of older versions were hashed with SHA-256 which is recorded as the algorithm.
+
+    """
+    columns = [row[1] for row in connection.execute('PRAGMA table_info("Hash")')]
+    if "algorithm" not in columns:
+        connection.execute(
+            'ALTER TABLE "Hash" ADD COLUMN "algorithm" TEXT NOT NULL DEFAULT \'sha256\''
+        )
+
+
+def _migrate_to_version_2(connection):
+    """Add an index on dependencies which speeds up the garbage collection."""
+    connection.execute(
+        'CREATE INDEX IF NOT EXISTS "idx_hash__dependency" ON "Hash" ("dependency")'
+    )
+
+
+MIGRATIONS = {1: _migrate_to_version_1, 2: _migrate_to_version_2}
+
+
+def _migrate_database(db_config):
+    """Migrate an existing SQLite database to the current schema version."""
+    if db_config.get("provider") == "sqlite" and Path(db_config["filename"]).exists():
+        connection = sqlite3.connect(db_config["filename"])
+        with connection:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            has_table = connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'Hash'"
+            ).fetchone()
+            if has_table:
+                for version_ in range(version + 1, SCHEMA_VERSION + 1):
+                    MIGRATIONS[version_](connection)
+        connection.close()
+
+
+def _set_schema_version(db_config):
+    if db_config.get("provider") == "sqlite":
+        connection = sqlite3.connect(db_config["filename"])
+        with connection:
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.close()
+
+
+@orm.db_session
+def delete_stale_hashes(dag):
+    """Delete hashes of tasks and dependencies which are not part of the DAG anymore.
+
+    Renamed or deleted tasks, removed dependencies, and files in directories which were
+    hashed individually by older versions leave rows behind which slow down lookups.
+
+    Returns
+    -------
+    n_deleted : int
+        The number of deleted rows.
+
+    """
+    # Templates and modules of function tasks are stored under their names, files and
+    # directories under their normalized paths.
+    live_hashes = {
+        (id_, dependency)
+        for id_ in dag.nodes
+        if dag.nodes[id_]["_is_task"]
+        for node in [*dag.predecessors(id_), *dag.successors(id_)]
+        for dependency in [node, Path(node).as_posix()]
+    }
+
+    if db.provider_name == "sqlite":
+        cursor = db.get_connection().cursor()
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS "LiveHash" '
+            "(task TEXT, dependency TEXT, PRIMARY KEY (task, dependency))"
+        )
+        cursor.execute('DELETE FROM "LiveHash"')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO "LiveHash" VALUES (?, ?)', sorted(live_hashes)
+        )
+        cursor.execute(
+            'DELETE FROM "Hash" WHERE NOT EXISTS (SELECT 1 FROM "LiveHash" AS l '
+            'WHERE l.task = "Hash".task AND l.dependency = "Hash".dependency)'
+        )
+        n_deleted = cursor.rowcount
+        cursor.execute('DROP TABLE "LiveHash"')
+    else:
+        n_deleted = 0
+        for hash_ in orm.select(h for h in Hash):
+            if (hash_.task, hash_.dependency) not in live_hashes:
+                hash_.delete()
+                n_deleted += 1
+
+    return n_deleted
+
+
+@orm.db_session
+def save_runtime(id_, seconds):
+    """Save the runtime of a task which has just finished."""
+    try:
+        runtime = Runtime[id_]
+    except orm.ObjectNotFound:
+        Runtime(task=id_, seconds=seconds, finished=time.time())
+    else:
+        runtime.seconds = seconds
+        runtime.finished = time.time()
+
+
+@orm.db_session
+def load_runtimes(ids):
+    """Load the runtimes of the last executions of tasks in seconds."""
+    return {
+        runtime.task: runtime.seconds
+        for runtime in orm.select(r for r in Runtime)
+        if runtime.task in ids
+    }
+
+
+def merge_databases(paths, config):
+    """Merge the hashes of tasks from other databases into the database of the project.
+
+    For every task, the hashes of the database in which the task finished last are kept.
+    Tasks which were never executed in the other databases are ignored.
+
+    Returns
+    -------
+    n_merged : int
+        The number of tasks whose hashes were merged.
+
+    """
+    if config["db"].get("provider") != "sqlite":
+        raise NotImplementedError("Only SQLite databases can be merged.")
+
+    n_merged = 0
+    connection = sqlite3.connect(config["db"]["filename"])
+    for path in paths:
+        _migrate_database({"provider": "sqlite", "filename": str(path)})
+        with connection:
+            connection.execute("ATTACH DATABASE ? AS other", (str(path),))
+        with connection:
+            has_runtimes = connection.execute(
+                "SELECT name FROM other.sqlite_master "
+                "WHERE type = 'table' AND name = 'Runtime'"
+            ).fetchone()
+            if has_runtimes:
+                connection.execute(
+                    'CREATE TEMP TABLE "NewerTask" AS SELECT o.task '
+                    'FROM other."Runtime" AS o LEFT JOIN main."Runtime" AS m '
+                    "ON o.task = m.task WHERE m.task IS NULL OR o.finished > m.finished"
+                )
+                connection.execute(
+                    'DELETE FROM main."Hash" '
+                    'WHERE task IN (SELECT task FROM "NewerTask")'
+                )
+                connection.execute(
+                    'INSERT INTO main."Hash" (task, dependency, hash_, algorithm) '
+                    'SELECT task, dependency, hash_, algorithm FROM other."Hash" '
+                    'WHERE task IN (SELECT task FROM "NewerTask")'
+                )
+                connection.execute(
+                    'INSERT OR REPLACE INTO main."Runtime" (task, seconds, finished) '
+                    'SELECT task, seconds, finished FROM other."Runtime" '
+                    'WHERE task IN (SELECT task FROM "NewerTask")'
+                )
+                n_merged += connection.execute(
+                    'SELECT COUNT(*) FROM "NewerTask"'
+                ).fetchone()[0]
+                connection.execute('DROP TABLE "NewerTask"')
+        connection.execute("DETACH DATABASE other")
+    connection.close()
+
+    return n_merged
+
+
+def vacuum_database(config):
+    """Rebuild the database file to reclaim the space of deleted rows."""
+    if config["db"].get("provider") == "sqlite":
+        connection = sqlite3.connect(config["db"]["filename"])
+        connection.execute("VACUUM")
+        connection.close()
@@ -0,0 +1,422 @@
+"""This module contains the code to execute tasks on multiple machines.
+
+A build with ``pipeline build --distributed`` starts a coordinator which collects the
+unfinished tasks, schedules them, and stores all hashes in the database like the local
+executors. Workers are started with ``pipeline worker`` on any machine which shares the
+file system with the coordinator.
+
+Every worker opens one connection to the coordinator per job. The coordinator sends a
+rendered task file over an idle connection, the worker executes it and sends back the
+exit status, the log, and the hashes of the targets.
+
+The coordinator writes its address and a random key which authenticates connections
+into the hidden build directory. Since the hidden build directory is on the shared file
+system, workers started in the project directory find the coordinator automatically.
+
+"""
+import json
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import AuthenticationError
+from multiprocessing.connection import Client
+from multiprocessing.connection import Listener
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from tqdm import tqdm
+
+from pipeline.dag import Scheduler
+from pipeline.database import save_runtime
+from pipeline.ephemeral import EphemeralTargets
+from pipeline.exceptions import TaskError
+from pipeline.execution import _collect_unfinished_tasks
+from pipeline.execution import _compute_padding_to_prevent_task_description_from_moving
+from pipeline.execution import _create_finished_future
+from pipeline.execution import _format_exception_message
+from pipeline.execution import _look_up_task_in_cache
+from pipeline.execution import _patch_subprocess_environment
+from pipeline.execution import _preprocess_task
+from pipeline.execution import TQDM_BAR_FORMAT
+from pipeline.functions import FUNCTION_TASK_SUFFIX
+from pipeline.hashing import compute_hashes_of_paths
+from pipeline.hashing import compute_hashes_of_task_dependencies
+from pipeline.hashing import save_hashes
+from pipeline.shared import ensure_list
+from pipeline.variants import TaskCache
+
+
+COORDINATOR_FILE = "coordinator.json"
+
+
+def execute_dag_distributed(dag, env, config):
+    """Execute the DAG with workers on multiple machines.
+
+    Tasks are proposed by the scheduler whenever a connection to a worker is idle. Their
+    dependencies are hashed in a pool of threads like in :func:`execute_dag`. If a
+    worker disconnects while it executes a task or before a task is sent to it, the task
+    is returned to the scheduler and executed by another worker.
+
+    Parameters
+    ----------
+    dag : nx.DiGraph
+        The DAG containing the complete workflow.
+    env : jinja2.Environment
+        An environment which manages the templates.
+    config : dict
+        The workflow configuration.
+
+    Returns
+    -------
+    unfinished_tasks : set
+        The ids of the executed tasks.
+
+    """
+    unfinished_tasks = _collect_unfinished_tasks(dag, env, config)
+
+    padding = _compute_padding_to_prevent_task_description_from_moving(unfinished_tasks)
+
+    scheduler = Scheduler(dag, unfinished_tasks, config["priority_scheduling"])
+    ephemeral_targets = EphemeralTargets(dag, unfinished_tasks)
+    task_cache = TaskCache(config)
+    idle_connections = []
+    waiting_tasks = []
+    running_tasks = {}
+    task_paths = {}
+    dependency_hashes = {}
+    cache_lookups = {}
+    task_keys = {}
+    target_hashes = {}
+    start_times = {}
+    runtimes = {}
+
+    with tqdm(
+        total=len(unfinished_tasks), bar_format=TQDM_BAR_FORMAT
+    ) as t, Coordinator(config) as coordinator, ThreadPoolExecutor(
+        config["n_hashing_threads"]
+    ) as hashing_executor:
+        if scheduler.are_tasks_left:
+            t.write(f"Waiting for workers at {coordinator.address_string}.")
+
+        while scheduler.are_tasks_left:
+            idle_connections.extend(coordinator.accept())
+
+            # Dependencies are hashed in the pool of threads while tasks wait for an
+            # idle connection.
+            n_proposals = (
+                len(idle_connections) - len(waiting_tasks) - len(cache_lookups)
+            )
+            proposals = scheduler.propose(n_proposals) if n_proposals > 0 else set()
+            for id_ in sorted(proposals):
+                task_paths[id_] = _preprocess_task(id_, dag, env, config)
+                start_times[id_] = time.perf_counter()
+                if task_cache.is_cacheable(id_, dag):
+                    cache_lookups[id_] = hashing_executor.submit(
+                        _look_up_task_in_cache,
+                        id_,
+                        task_paths[id_],
+                        task_cache,
+                        env,
+                        dag,
+                        config,
+                    )
+                else:
+                    dependency_hashes[id_] = hashing_executor.submit(
+                        compute_hashes_of_task_dependencies, id_, env, dag, config
+                    )
+                    waiting_tasks.append(id_)
+
+            # Copy the targets of tasks which were executed for another variant.
+            for id_ in [id_ for id_, future in cache_lookups.items() if future.done()]:
+                hashes, task_keys[id_], is_restored = cache_lookups.pop(id_).result()
+                task_cache.register(id_, task_keys[id_])
+                dependency_hashes[id_] = _create_finished_future(hashes)
+                if is_restored:
+                    del task_keys[id_]
+                    target_hashes[id_] = hashing_executor.submit(
+                        compute_hashes_of_paths,
+                        ensure_list(dag.nodes[id_]["produces"]),
+                        config,
+                    )
+                    runtimes[id_] = time.perf_counter() - start_times.pop(id_)
+                else:
+                    waiting_tasks.append(id_)
+
+            # Send tasks over idle connections. Workers which exited while they were
+            # idle are dropped and their task is returned to the scheduler.
+            while waiting_tasks and idle_connections:
+                id_ = waiting_tasks.pop(0)
+                connection = idle_connections.pop()
+                try:
+                    connection.send(
+                        {
+                            "id_": id_,
+                            "file": task_paths[id_].read_text(),
+                            "suffix": task_paths[id_].suffix,
+                            "produces": ensure_list(dag.nodes[id_]["produces"]),
+                            "threads": dag.nodes[id_].get("threads"),
+                            "config": config,
+                        }
+                    )
+                except (EOFError, OSError):
+                    connection.close()
+                    _reschedule(id_, scheduler, dependency_hashes, task_keys)
+                    continue
+                running_tasks[connection] = id_
+                t.set_description(id_.ljust(padding))
+
+            ready_connections = wait(list(running_tasks), timeout=0.1)
+
+            failures = {}
+            for connection in ready_connections:
+                id_ = running_tasks.pop(connection)
+                try:
+                    result = connection.recv()
+                except (EOFError, OSError):
+                    connection.close()
+                    _reschedule(id_, scheduler, dependency_hashes, task_keys)
+                    continue
+
+                idle_connections.append(connection)
+                if result["log"]:
+                    t.write(result["log"].rstrip())
+
+                if result["error"] is None:
+                    target_hashes[id_] = _create_finished_future(result["hashes"])
+                    runtimes[id_] = time.perf_counter() - start_times.pop(id_)
+                else:
+                    failures[id_] = result["error"]
+
+            # Save the hashes of tasks whose dependencies and targets are hashed. If
+            # tasks failed, wait for the hashes of all successful tasks.
+            newly_finished_tasks = {
+                id_
+                for id_, future in target_hashes.items()
+                if failures or (future.done() and dependency_hashes[id_].done())
+            }
+            for id_ in sorted(newly_finished_tasks):
+                hashes = {
+                    **dependency_hashes.pop(id_).result(),
+                    **target_hashes.pop(id_).result(),
+                }
+                save_hashes(id_, hashes)
+                save_runtime(id_, runtimes.pop(id_))
+                if id_ in task_keys:
+                    task_cache.store(task_keys.pop(id_), dag.nodes[id_]["produces"])
+                scheduler.process_finished(id_)
+                ephemeral_targets.release(id_, dag)
+                t.update()
+
+            if failures:
+                raise TaskError("\n\n".join(failures.values()))
+
+    return unfinished_tasks
+
+
+def _reschedule(id_, scheduler, dependency_hashes, task_keys):
+    """Return a task to the scheduler after its worker disconnected."""
+    dependency_hashes.pop(id_)
+    task_keys.pop(id_, None)
+    scheduler.reschedule(id_)
+
+
+class Coordinator:
+    """Accept connections of workers and publish the address of the coordinator.
+
+    The coordinator listens at ``coordinator_address``. Connections are accepted in a
+    background thread and collected with :meth:`accept`.
+
+    """
+
+    def __init__(self, config):
+        host, port = config["coordinator_address"].rsplit(":", 1)
+        self.authkey = secrets.token_bytes(32)
+        self.listener = Listener((host, int(port)), authkey=self.authkey)
+        self.address_string = f"{host}:{self.listener.address[1]}"
+        self.path = Path(config["hidden_build_directory"], COORDINATOR_FILE)
+        self.connections = []
+        self._queue = queue.Queue()
+        self._is_closing = False
+        self._thread = threading.Thread(target=self._accept_forever, daemon=True)
+
+    def __enter__(self):
+        _write_coordinator_file(self.path, self.address_string, self.authkey)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.path.unlink()
+
+        # A connection wakes up the thread which waits for connections.
+        self._is_closing = True
+        try:
+            socket.create_connection(self.listener.address).close()
+        except OSError:
+            pass
+        self._thread.join()
+        self.listener.close()
+
+        for connection in self.connections + self.accept():
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+
+    def _accept_forever(self):
+        while not self._is_closing:
+            try:
+                connection = self.listener.accept()
+            except (AuthenticationError, EOFError, OSError):
+                continue
+            self._queue.put(connection)
+
+    def accept(self):
+        """Return connections of new workers."""
+        connections = []
+        while not self._queue.empty():
+            connections.append(self._queue.get())
+        self.connections.extend(connections)
+
+        return connections
+
+
+def _write_coordinator_file(path, address, authkey):
+    """Write the address and the key of the coordinator readable only by the user."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w") as file:
+        json.dump({"address": address, "authkey": authkey.hex()}, file)
+
+
+def read_coordinator_file(config, timeout=60):
+    """Read the address and the key of the coordinator.
+
+    The file is written when the coordinator starts. Wait up to ``timeout`` seconds for
+    the file to appear.
+
+    """
+    path = Path(config["hidden_build_directory"], COORDINATOR_FILE)
+    start = time.time()
+    while not path.exists():
+        if time.time() - start > timeout:
+            raise TimeoutError(f"No coordinator started in {timeout}s. Missing {path}.")
+        time.sleep(0.5)
+
+    content = json.loads(path.read_text())
+    host, port = content["address"].rsplit(":", 1)
+
+    return (host, int(port)), bytes.fromhex(content["authkey"])
+
+
+def run_worker(address, authkey, n_jobs=1):
+    """Execute tasks of a coordinator with ``n_jobs`` connections in parallel.
+
+    Returns
+    -------
+    n_executed_tasks : int
+        The number of tasks executed by the worker.
+
+    """
+    n_executed_tasks = [0] * n_jobs
+    threads = [
+        threading.Thread(target=_run_job, args=(address, authkey, n_executed_tasks, i))
+        for i in range(n_jobs)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return sum(n_executed_tasks)
+
+
+def _run_job(address, authkey, n_executed_tasks, i):
+    try:
+        connection = Client(address, authkey=authkey)
+    except OSError:
+        # The coordinator has already finished.
+        return
+
+    with connection, tempfile.TemporaryDirectory(
+        prefix="pipeline-worker-"
+    ) as directory:
+        while True:
+            try:
+                task = connection.recv()
+            except (EOFError, OSError):
+                break
+            if task is None:
+                break
+
+            result = _execute_remote_task(**task, directory=directory)
+            n_executed_tasks[i] += 1
+
+            try:
+                connection.send(result)
+            except OSError:
+                break
+
+
+def _execute_remote_task(id_, file, suffix, produces, threads, config, directory):
+    """Execute a rendered task and hash its targets.
+
+    Returns
+    -------
+    result : dict
+        A dictionary with the log, an error message or ``None``, and the hashes.
+
+    """
+    path = Path(directory, id_ + suffix)
+    # Errors refer to the task file of the coordinator on the shared file system.
+    task_path = Path(config["hidden_task_directory"], id_ + suffix)
+    result = {"log": "", "error": None, "hashes": {}}
+
+    try:
+        path.write_text(file)
+        if suffix == ".py":
+            command = ["python", str(path)]
+        elif suffix == FUNCTION_TASK_SUFFIX:
+            command = ["python", "-m", "pipeline.functions", str(path)]
+        elif suffix == ".r":
+            command = ["Rscript", str(path)]
+        else:
+            raise NotImplementedError("Only Python and R tasks are allowed.")
+
+        process = subprocess.run(
+            command,
+            env=_patch_subprocess_environment(config, threads=threads),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        result["log"] = process.stdout
+
+        if process.returncode != 0:
+            error = subprocess.CalledProcessError(process.returncode, command)
+            result["error"] = _format_exception_message(
+                id_, task_path, f"{error}\n\n{process.stdout}"
+            )
+        else:
+            missing_targets = [
+                Path(target).as_posix()
+                for target in produces
+                if not Path(target).exists()
+            ]
+            if missing_targets:
+                raise FileNotFoundError(
+                    f"Target(s) {missing_targets} was(were) not produced by task "
+                    f"'{id_}'."
+                )
+            result["hashes"] = compute_hashes_of_paths(produces, config)
+
+    except Exception as e:
+        result["error"] = _format_exception_message(id_, task_path, e)
+
+    return result
@@ -0,0 +1,102 @@
+"""This module contains the code to delete ephemeral targets during a build.
+
+Intermediate targets like resampled data sets are often only needed by the next task.
+Targets of tasks with ``ephemeral: true`` or, with ``ephemeral_hidden_targets: true``,
+targets in the hidden build directory are deleted as soon as all tasks depending on
+them have finished. Targets which no task depends on are never deleted.
+
+The hashes of deleted targets stay in the database. Thus, the task which produced a
+target is not executed again because the target is missing. Only if a dependent task
+needs to be executed, the deleted target is recreated first.
+
+"""
+import shutil
+from pathlib import Path
+
+
+def mark_ephemeral_targets(dag, config):
+    """Mark targets which are deleted after all dependent tasks have finished."""
+    hidden_build_directory = Path(config["hidden_build_directory"])
+    for node in dag.nodes:
+        producers = list(dag.predecessors(node))
+        if not dag.nodes[node]["_is_task"] and producers and dag.out_degree(node) > 0:
+            is_ephemeral = dag.nodes[producers[0]].get("ephemeral")
+            if is_ephemeral is None:
+                is_ephemeral = (
+                    config["ephemeral_hidden_targets"]
+                    and hidden_build_directory in Path(node).parents
+                )
+            if is_ephemeral:
+                dag.nodes[node]["_is_ephemeral"] = True
+
+    return dag
+
+
+def is_ephemeral(node, dag):
+    """Check whether a node is an ephemeral target."""
+    return dag.nodes[node].get("_is_ephemeral", False)
+
+
+def add_tasks_recreating_deleted_targets(dag, unfinished_tasks):
+    """Add the tasks which recreate deleted targets needed by unfinished tasks.
+
+    The dependent tasks of the added tasks are not executed again because the hashes
+    of the recreated targets are compared with the hashes in the database.
+
+    """
+    unfinished_tasks = set(unfinished_tasks)
+    tasks = sorted(unfinished_tasks)
+    while tasks:
+        id_ = tasks.pop()
+        for dependency in dag.predecessors(id_):
+            if is_ephemeral(dependency, dag) and not Path(dependency).exists():
+                for producer in dag.predecessors(dependency):
+                    if producer not in unfinished_tasks:
+                        unfinished_tasks.add(producer)
+                        tasks.append(producer)
+
+    return unfinished_tasks
+
+
+class EphemeralTargets:
+    """Delete ephemeral targets after the last dependent task has finished.
+
+    Parameters
+    ----------
+    dag : nx.DiGraph
+        The DAG containing the complete workflow.
+    unfinished_tasks : set
+        The ids of the tasks which are executed in this build.
+
+    """
+
+    def __init__(self, dag, unfinished_tasks):
+        self.consumers = {
+            node: sum(1 for id_ in dag.successors(node) if id_ in unfinished_tasks)
+            for node in dag.nodes
+            if is_ephemeral(node, dag)
+            and any(
+                id_ in unfinished_tasks
+                for id_ in [*dag.predecessors(node), *dag.successors(node)]
+            )
+        }
+
+    def release(self, id_, dag):
+        """Delete targets of a finished task which are not needed anymore."""
+        for target in dag.successors(id_):
+            if self.consumers.get(target, None) == 0:
+                _delete(target)
+
+        for dependency in dag.predecessors(id_):
+            if self.consumers.get(dependency, 0) > 0:
+                self.consumers[dependency] -= 1
+                if self.consumers[dependency] == 0:
+                    _delete(dependency)
+
+
+def _delete(target):
+    path = Path(target)
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
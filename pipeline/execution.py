@@ -1,8 +1,11 @@
+import json
 import os
 import subprocess
 import sys
 import time
-from concurrent.futures.process import ProcessPoolExecutor
+import traceback
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import click
@@ -10,12 +13,34 @@ import networkx as nx
 from tqdm import tqdm
 
 from pipeline.dag import Scheduler
+from pipeline.database import save_runtime
+from pipeline.ephemeral import add_tasks_recreating_deleted_targets
+from pipeline.ephemeral import EphemeralTargets
 from pipeline.exceptions import TaskError
+from pipeline.functions import execute_function_task
+from pipeline.functions import FUNCTION_TASK_SUFFIX
+from pipeline.functions import write_function_task
+from pipeline.fusion import create_batch_command
+from pipeline.fusion import create_batches
+from pipeline.fusion import get_report_path
 from pipeline.hashing import compare_hashes_of_task
-from pipeline.hashing import save_hash_of_task_target
-from pipeline.hashing import save_hashes_of_task_dependencies
+from pipeline.hashing import compute_hashes_of_task_dependencies
+from pipeline.hashing import compute_hashes_of_task_targets
+from pipeline.hashing import save_hashes
+from pipeline.profiling import create_profiling_command
+from pipeline.profiling import get_profile_paths
+from pipeline.profiling import is_task_profiled
+from pipeline.profiling import remove_profiles
+from pipeline.resources import create_r_thread_settings
+from pipeline.resources import create_thread_environment
+from pipeline.sharding import select_shard
 from pipeline.shared import ensure_list
 from pipeline.shared import render_task_template
+from pipeline.store import collect_shared_datasets
+from pipeline.store import create_environment_variable
+from pipeline.store import DatasetStore
+from pipeline.store import ENVIRONMENT_VARIABLE
+from pipeline.variants import TaskCache
 
 try:
     import rpy2
@@ -36,12 +61,16 @@ else:
 TQDM_BAR_FORMAT = "{l_bar}{bar}|{n_fmt}/{total_fmt} tasks in {elapsed}"
 
 
-def execute_dag_serially(dag, env, config):
-    """Execute the DAG serially.
+def execute_dag(dag, env, executor, config):
+    """Execute the DAG with an executor.
 
-    This function executes the tasks ordered topological which means it is an ordering
-    which ensures that a node is only visited if all of its preceding nodes are visited
-    before.
+    Tasks are executed by the executor backend, for example, serially in this process,
+    in a pool of processes, or as job arrays of a batch scheduler. Hashing the
+    dependencies and targets of tasks is delegated to a pool of threads such that large
+    files do not delay the submission of new tasks or the processing of finished tasks.
+    A task is only marked as finished after its targets were produced and all hashes
+    were saved. While variants are built, the targets of tasks which were executed for
+    another variant are copied from the cache instead.
 
     Parameters
     ----------
@@ -49,90 +78,191 @@ def execute_dag_serially(dag, env, config):
         The DAG containing the complete workflow.
     env : jinja2.Environment
         An environment which manages the templates.
+    executor : pipeline.executors.Executor
+        The executor backend which executes the tasks.
     config : dict
         The workflow configuration.
 
-    """
-    unfinished_tasks = _collect_unfinished_tasks(dag, env, config)
-
-    padding = _compute_padding_to_prevent_task_description_from_moving(unfinished_tasks)
-
-    scheduler = Scheduler(dag, unfinished_tasks, config["priority_scheduling"])
-
-    with tqdm(total=len(unfinished_tasks), bar_format=TQDM_BAR_FORMAT) as t:
-        while scheduler.are_tasks_left:
-            id_ = scheduler.propose().pop()
-
-            t.set_description(id_.ljust(padding))
-
-            save_hashes_of_task_dependencies(id_, env, dag, config)
-
-            path = _preprocess_task(id_, dag, env, config)
-
-            _ = _execute_task(id_, path, config)
-
-            _process_task_targets(id_, dag)
-
-            scheduler.process_finished(id_)
-
-            t.update()
-
-
-def execute_dag_parallelly(dag, env, config):
-    n_jobs = config["n_jobs"]
+    Returns
+    -------
+    unfinished_tasks : set
+        The ids of the executed tasks.
 
+    """
     unfinished_tasks = _collect_unfinished_tasks(dag, env, config)
 
     padding = _compute_padding_to_prevent_task_description_from_moving(unfinished_tasks)
 
     scheduler = Scheduler(dag, unfinished_tasks, config["priority_scheduling"])
+    ephemeral_targets = EphemeralTargets(dag, unfinished_tasks)
+    task_cache = TaskCache(config)
     submitted_tasks = {}
+    dependency_hashes = {}
+    task_paths = {}
+    task_keys = {}
+    cache_lookups = {}
+    waiting_batches = []
+    target_hashes = {}
+    start_times = {}
+    runtimes = {}
 
     with tqdm(
-        total=len(unfinished_tasks), bar_format=TQDM_BAR_FORMAT,
-    ) as t, ProcessPoolExecutor(n_jobs) as executor:
+        total=len(unfinished_tasks), bar_format=TQDM_BAR_FORMAT
+    ) as t, executor, ThreadPoolExecutor(
+        config["n_hashing_threads"]
+    ) as hashing_executor, DatasetStore(
+        dag, unfinished_tasks, env, config, hashing_executor
+    ) as store:
         while scheduler.are_tasks_left:
-            # Add new tasks to the queue.
+            # Add new tasks to the queue. Fused tasks share one slot. With priorities or
+            # ephemeral targets, tasks occupy their slot until their targets are hashed
+            # such that dependent tasks with higher priorities or tasks which allow to
+            # delete ephemeral targets can be proposed first.
             n_proposals = (
-                n_jobs - sum(not task.done() for task in submitted_tasks.values())
-                if config["priority_scheduling"]
+                max(
+                    executor.n_slots
+                    - len(set(submitted_tasks.values()))
+                    - len(target_hashes)
+                    - len(cache_lookups)
+                    - len(waiting_batches),
+                    0,
+                )
+                if config["priority_scheduling"] or ephemeral_targets.consumers
                 else -1
             )
             proposals = scheduler.propose(n_proposals)
 
-            for id_ in ensure_list(proposals):
-                save_hashes_of_task_dependencies(id_, env, dag, config)
+            # Copy the targets of tasks which were executed for another variant. The
+            # keys are computed and the targets are copied in the pool of threads.
+            for id_ in sorted(proposals):
+                if task_cache.is_cacheable(id_, dag):
+                    task_paths[id_] = _preprocess_task(id_, dag, env, config)
+                    cache_lookups[id_] = hashing_executor.submit(
+                        _look_up_task_in_cache,
+                        id_,
+                        task_paths[id_],
+                        task_cache,
+                        env,
+                        dag,
+                        config,
+                    )
+            proposals = proposals - set(cache_lookups)
+
+            # Tasks whose targets are not in the cache are executed.
+            for id_ in [id_ for id_, future in cache_lookups.items() if future.done()]:
+                hashes, task_keys[id_], is_restored = cache_lookups.pop(id_).result()
+                task_cache.register(id_, task_keys[id_])
+                dependency_hashes[id_] = _create_finished_future(hashes)
+                if is_restored:
+                    del task_paths[id_], task_keys[id_]
+                    start_times[id_] = (time.perf_counter(), 1)
+                    submitted_tasks[id_] = _create_finished_future()
+                    t.update()
+                else:
+                    proposals.add(id_)
+
+            for batch in create_batches(proposals, scheduler, config):
+                paths = []
+                shared_datasets = {}
+                for id_ in batch:
+                    if id_ not in dependency_hashes:
+                        dependency_hashes[id_] = hashing_executor.submit(
+                            compute_hashes_of_task_dependencies, id_, env, dag, config
+                        )
+                    paths.append(
+                        task_paths.pop(id_)
+                        if id_ in task_paths
+                        else _preprocess_task(id_, dag, env, config)
+                    )
+                    shared_datasets.update(store.acquire(id_, dag))
+                waiting_batches.append((batch, paths, shared_datasets))
+
+            # Submit batches whose shared data sets are loaded in the pool of threads.
+            for batch, paths, shared_datasets in [
+                waiting_batch
+                for waiting_batch in waiting_batches
+                if all(future.done() for future in waiting_batch[2].values())
+            ]:
+                waiting_batches.remove((batch, paths, shared_datasets))
+                t.set_description(batch[0].ljust(padding))
+                for id_ in batch:
+                    start_times[id_] = (time.perf_counter(), len(batch))
+                future = executor.submit(
+                    batch,
+                    paths,
+                    collect_shared_datasets(shared_datasets),
+                    _collect_resources(batch, dag),
+                )
+                future.add_done_callback(lambda x, n=len(batch): t.update(n))
+                for id_ in batch:
+                    submitted_tasks[id_] = future
+
+            # Wait a little bit for tasks or hashes to finish.
+            executor.wait(
+                [
+                    *submitted_tasks.values(),
+                    *target_hashes.values(),
+                    *cache_lookups.values(),
+                    *(
+                        future
+                        for _, _, shared_datasets in waiting_batches
+                        for future in shared_datasets.values()
+                    ),
+                ],
+                timeout=0.1,
+            )
 
-                path = _preprocess_task(id_, dag, env, config)
+            # Evaluate executed tasks.
+            executed_tasks = {
+                id_ for id_, task in submitted_tasks.items() if task.done()
+            }
 
-                future = executor.submit(_execute_task, id_, path, config)
-                future.add_done_callback(lambda x: t.update())
-                submitted_tasks[id_] = future
+            # Check for exceptions and save the hashes of successful tasks before.
+            failures = _collect_failures(executed_tasks, submitted_tasks)
+            if failures:
+                for id_ in executed_tasks - set(failures):
+                    hashes = {
+                        **dependency_hashes[id_].result(),
+                        **_process_task_targets(id_, dag, config),
+                    }
+                    save_hashes(id_, hashes)
+                    save_runtime(id_, _compute_runtime(id_, start_times))
+                executor.cancel(
+                    [
+                        submitted_tasks[id_]
+                        for id_ in set(submitted_tasks) - executed_tasks
+                    ]
+                )
+                raise TaskError("\n\n".join(dict.fromkeys(failures.values())))
 
-                t.set_description(id_.ljust(padding))
+            for id_ in executed_tasks:
+                target_hashes[id_] = hashing_executor.submit(
+                    _process_task_targets, id_, dag, config
+                )
+                runtimes[id_] = _compute_runtime(id_, start_times)
+                del submitted_tasks[id_]
 
-            # Evaluate finished tasks.
+            # Save the hashes of tasks whose dependencies and targets are hashed.
             newly_finished_tasks = {
-                id_ for id_, task in submitted_tasks.items() if task.done()
+                id_
+                for id_, future in target_hashes.items()
+                if future.done() and dependency_hashes[id_].done()
             }
-
-            # Check for exceptions.
-            exceptions = [
-                str(future.exception())
-                for future in submitted_tasks.values()
-                if future.exception()
-            ]
-            if exceptions:
-                raise TaskError("\n\n".join(exceptions))
-
             for id_ in newly_finished_tasks:
-                _process_task_targets(id_, dag)
-                del submitted_tasks[id_]
+                hashes = {
+                    **dependency_hashes.pop(id_).result(),
+                    **target_hashes.pop(id_).result(),
+                }
+                save_hashes(id_, hashes)
+                save_runtime(id_, runtimes.pop(id_))
+                if id_ in task_keys:
+                    task_cache.store(task_keys.pop(id_), dag.nodes[id_]["produces"])
+                store.release(id_, dag)
+                ephemeral_targets.release(id_, dag)
 
             scheduler.process_finished(newly_finished_tasks)
 
-            # A little bit of sleep time to wait for tasks to finish.
-            time.sleep(0.1)
+    return unfinished_tasks
 
 
 def _collect_unfinished_tasks(dag, env, config):
@@ -141,11 +271,14 @@ def _collect_unfinished_tasks(dag, env, config):
     Iterate over topological sorted nodes in the DAG. If the node is a task, do the
     following.
 
-    1. If the task is marked to be always executed, add it to the set.
+    1. If the task is marked to be always executed or it is explicitly selected for
+       profiling, add it to the set.
     2. Otherwise, compare the hashes of all dependencies and targets. If the hashes do
        not match, add the task to the set of unfinished tasks. After that, go through
        the whole list of descendants of the task and mark all tasks among them as
        unfinished, too.
+    3. Add the tasks which recreate deleted ephemeral targets that unfinished tasks
+       depend on.
 
     Parameters
     ----------
@@ -160,7 +293,11 @@ def _collect_unfinished_tasks(dag, env, config):
     unfinished_tasks = set()
     for id_ in nx.topological_sort(dag):
         if dag.nodes[id_]["_is_task"]:
-            if dag.nodes[id_].get("run_always", False):
+            # Tasks selected for profiling are executed even if they are up-to-date.
+            is_selected = config.get("profile") is not None and id_ in config.get(
+                "profile_tasks", []
+            )
+            if dag.nodes[id_].get("run_always", False) or is_selected:
                 unfinished_tasks.add(id_)
             else:
                 have_same_hashes = compare_hashes_of_task(id_, env, dag, config)
@@ -170,6 +307,11 @@ def _collect_unfinished_tasks(dag, env, config):
                         if dag.nodes[descendant]["_is_task"]:
                             unfinished_tasks.add(descendant)
 
+    unfinished_tasks = add_tasks_recreating_deleted_targets(dag, unfinished_tasks)
+
+    if config.get("shard") is not None:
+        unfinished_tasks = select_shard(dag, unfinished_tasks, config)
+
     return unfinished_tasks
 
 
@@ -194,11 +336,14 @@ def _compute_padding_to_prevent_task_description_from_moving(unfinished_tasks):
 
 
 def _preprocess_task(id_, dag, env, config):
-    file = render_task_template(id_, dag.nodes[id_], env, config)
-
     for target in ensure_list(dag.nodes[id_].get("produces", [])):
         Path(target).parent.mkdir(parents=True, exist_ok=True)
 
+    if "function" in dag.nodes[id_]:
+        return write_function_task(id_, dag.nodes[id_], config)
+
+    file = render_task_template(id_, dag.nodes[id_], env, config)
+
     if dag.nodes[id_]["template"].endswith(".py"):
         path = Path(config["hidden_task_directory"], id_ + ".py")
         path.parent.mkdir(parents=True, exist_ok=True)
@@ -215,27 +360,141 @@ def _preprocess_task(id_, dag, env, config):
     return path
 
 
-def _execute_task(id_, path, config):
-    if path.suffix == ".py":
-        environment = _patch_subprocess_environment(config)
+def _look_up_task_in_cache(id_, path, task_cache, env, dag, config):
+    """Hash the dependencies of a task and copy its targets from the cache.
+
+    The function does not access the database such that it can be called from the pool
+    of hashing threads.
+
+    Returns
+    -------
+    dependency_hashes : dict
+        A dictionary mapping dependencies to tuples of hashes and algorithms.
+    key : str
+        The key of the task in the cache.
+    is_restored : bool
+        Whether the targets were copied from the cache.
+
+    """
+    dependency_hashes = compute_hashes_of_task_dependencies(id_, env, dag, config)
+    key = task_cache.compute_key(id_, path, dependency_hashes, dag)
+    is_restored = task_cache.restore(key, dag.nodes[id_]["produces"])
+
+    return dependency_hashes, key, is_restored
+
+
+def _create_finished_future(result=None):
+    """Create a future which is already done.
+
+    It is the future of a task whose targets were copied from the cache or of hashes
+    which were computed elsewhere.
+
+    """
+    future = Future()
+    future.set_result({} if result is None else result)
+    return future
+
+
+def _collect_failures(ids, futures):
+    """Collect the error messages of failed tasks.
+
+    A batch fails as a whole if its future raised an exception. Otherwise, the future
+    returns the failures of single tasks.
+
+    """
+    failures = {}
+    for id_ in sorted(ids):
+        future = futures[id_]
+        if future.exception():
+            failures[id_] = str(future.exception())
+        elif id_ in future.result():
+            failures[id_] = future.result()[id_]
+
+    return failures
+
+
+def _execute_batch(ids, paths, config, shared_datasets=None, threads=None):
+    """Execute a batch of tasks.
+
+    A single task is executed with :func:`_execute_task`. Multiple fused tasks are
+    executed one after another in a single process with at most ``threads`` threads.
+
+    Returns
+    -------
+    failures : dict
+        A dictionary mapping the ids of tasks which failed to error messages.
+
+    """
+    if len(ids) == 1:
+        _execute_task(ids[0], paths[0], config, shared_datasets, threads)
+        return {}
+
+    environment = _patch_subprocess_environment(config, shared_datasets, threads)
+    report = get_report_path(ids, config)
+    command = create_batch_command(paths, report)
+
+    try:
+        subprocess.run(command, check=True, env=environment)
+    except subprocess.CalledProcessError as e:
+        raise TaskError(f"\n\nThe batch of tasks {ids} failed.\n\n{e}", e)
+
+    return read_batch_report(ids, paths, report)
+
+
+def read_batch_report(ids, paths, report):
+    """Read the report of a batch and return the error messages of failed tasks."""
+    failed_paths = json.loads(Path(report).read_text())
+    Path(report).unlink()
+
+    return {
+        id_: _format_exception_message(id_, path, failed_paths[path.as_posix()])
+        for id_, path in zip(ids, paths)
+        if path.as_posix() in failed_paths
+    }
+
+
+def _execute_task(id_, path, config, shared_datasets=None, threads=None):
+    is_profiled = is_task_profiled(id_, config)
+    if is_profiled:
+        remove_profiles(id_, config)
+
+    # Function tasks are called in this process without a new interpreter unless the
+    # threads of the task must be limited or the task is profiled.
+    is_function_task = path.suffix == FUNCTION_TASK_SUFFIX
+    is_called_in_process = is_function_task and threads is None and not is_profiled
+
+    if path.suffix == ".py" or (is_function_task and not is_called_in_process):
+        environment = _patch_subprocess_environment(config, shared_datasets, threads)
+        command = (
+            create_profiling_command(id_, path, config)
+            if is_profiled
+            else _create_task_command(path)
+        )
 
         try:
-            subprocess.run(["python", str(path)], check=True, env=environment)
+            subprocess.run(command, check=True, env=environment)
 
         except subprocess.CalledProcessError as e:
             message = _format_exception_message(id_, path, e)
             if config["_is_debug"]:
                 click.echo(message)
-                click.echo("Rerun the task to enter the debugger.")
+                _debug_task(path, environment)
+            else:
+                raise TaskError(message, e)
 
-                subprocess.run(
-                    ["python", "-m", "pdb", "-c", "continue", str(path)],
-                    check=True,
-                    env=environment,
+    elif is_called_in_process:
+        try:
+            execute_function_task(path)
+        except Exception:
+            message = _format_exception_message(id_, path, traceback.format_exc())
+            if config["_is_debug"]:
+                click.echo(message)
+                _debug_task(
+                    path, _patch_subprocess_environment(config, shared_datasets)
                 )
-                sys.exit("### Abort build.")
             else:
-                raise TaskError(message, e)
+                # The exception of the task might not be picklable.
+                raise TaskError(message)
 
     elif path.suffix == ".r":
         if not IS_R_INSTALLED:
@@ -244,24 +503,82 @@ def _execute_task(id_, path, config):
                 " conda with `conda install -c conda-forge rpy2`."
             )
         try:
+            # R tasks are executed in this process and the threads are set in R.
+            robjects.r(create_r_thread_settings(threads or config["threads_per_job"]))
+            if is_profiled:
+                profile = get_profile_paths(id_, config)["r"].as_posix()
+                robjects.r(f'Rprof("{profile}")')
             robjects.r.source(str(path))
         except RRuntimeError as e:
             message = _format_exception_message(id_, path, e)
             raise TaskError(message, e)
+        finally:
+            if is_profiled:
+                robjects.r("Rprof(NULL)")
 
     else:
         raise NotImplementedError("Only Python and R tasks are allowed.")
 
 
+def _compute_runtime(id_, start_times):
+    """Compute the runtime of a task from the submission of its batch until now.
+
+    The runtime of a batch of fused tasks is split evenly among them.
+
+    """
+    start, n_tasks = start_times.pop(id_)
+    return (time.perf_counter() - start) / n_tasks
+
+
+def _create_task_command(path):
+    """Create the command which executes a Python or a function task."""
+    if path.suffix == FUNCTION_TASK_SUFFIX:
+        command = ["python", "-m", "pipeline.functions", str(path)]
+    else:
+        command = ["python", str(path)]
+
+    return command
+
+
+def _debug_task(path, environment):
+    """Rerun a failed task with the debugger and abort the build."""
+    click.echo("Rerun the task to enter the debugger.")
+    subprocess.run(
+        ["python", "-m", "pdb", "-c", "continue", *_create_task_command(path)[1:]],
+        env=environment,
+    )
+    sys.exit("### Abort build.")
+
+
+def _collect_resources(ids, dag):
+    """Collect the resource hints of a batch of tasks.
+
+    Tasks can request resources, for example, ``resources: {cpus: 4, memory: 8G}``. For
+    a batch of fused tasks, the first hint of every resource is used. The number of
+    threads of the tasks is passed as ``threads`` and the maximum is used for a batch.
+
+    """
+    resources = {}
+    for id_ in ids:
+        for key, value in dag.nodes[id_].get("resources", {}).items():
+            resources.setdefault(key, value)
+
+    threads = [dag.nodes[id_]["threads"] for id_ in ids if "threads" in dag.nodes[id_]]
+    if threads:
+        resources["threads"] = max(threads)
+
+    return resources
+
+
 def _format_exception_message(id_, path, e):
     exc_info = e.__str__()
     return f"\n\nTask '{id_}' in file '{path}' failed.\n\n{exc_info}"
 
 
-def _process_task_targets(id_, dag):
-    """Process the target of the task."""
+def _process_task_targets(id_, dag, config):
+    """Process the targets of the task and return their hashes."""
     _check_missing_targets(id_, dag)
-    save_hash_of_task_target(id_, dag)
+    return compute_hashes_of_task_targets(id_, dag, config)
 
 
 def _check_missing_targets(id_, dag):
@@ -274,20 +591,31 @@ def _check_missing_targets(id_, dag):
             f"Target(s) {missing_targets} was(were) not produced by task '{id_}'."
         )
 
-    save_hash_of_task_target(id_, dag)
-
 
-def _patch_subprocess_environment(config):
+def _patch_subprocess_environment(config, shared_datasets=None, threads=None):
     """Patch the environment of the subprocess.
 
     The problem is that task files are rendered and, then, stored in the hidden build
     directory. This would prohibit imports if we did not add the project root to the
     `PYTHONPATH`.
 
+    The data sets of the task in the dataset store are passed in another variable.
+
+    The threads of numerical libraries are limited to ``threads`` of the task. Without
+    it, ``threads_per_job`` is used unless the variables are already set.
+
     """
     env = os.environ.copy()
     env["PYTHONPATH"] = (
         str(Path(config["project_directory"])) + ";" + env.get("PYTHONPATH", "")
     )
+    if shared_datasets:
+        env[ENVIRONMENT_VARIABLE] = create_environment_variable(shared_datasets)
+
+    if threads is not None:
+        env.update(create_thread_environment(threads))
+    elif config.get("threads_per_job") is not None:
+        for key, value in create_thread_environment(config["threads_per_job"]).items():
+            env.setdefault(key, value)
 
     return env
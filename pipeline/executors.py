@@ -0,0 +1,348 @@
+"""This module contains the executor backends which execute tasks.
+
+An executor receives batches of rendered tasks which are ready to run and returns a
+:class:`concurrent.futures.Future` for each of them. The future resolves to a
+dictionary mapping the ids of failed tasks in the batch to error messages. Scheduling,
+hashing, and the database are handled by :func:`pipeline.execution.execute_dag`
+independently of the executor.
+
+The executor is selected with ``executor`` in the configuration or ``pipeline build
+--executor``. Built-in backends are
+
+- ``serial`` which executes tasks one after another in this process.
+- ``process`` which executes tasks in a pool of ``n_jobs`` processes.
+- ``local-batch`` which mimics a batch scheduler on the local machine. Ready tasks are
+  submitted as job arrays whose elements are executed as separate processes.
+
+Other packages can add backends by subclassing :class:`Executor` and registering the
+class under the entry point group ``pipeline.executors``.
+
+"""
+import json
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import wait
+from concurrent.futures.process import ProcessPoolExecutor
+from pathlib import Path
+
+from pipeline.exceptions import TaskError
+from pipeline.execution import _execute_batch
+from pipeline.execution import _format_exception_message
+from pipeline.execution import _patch_subprocess_environment
+from pipeline.execution import read_batch_report
+from pipeline.functions import FUNCTION_TASK_SUFFIX
+from pipeline.fusion import create_batch_command
+from pipeline.fusion import get_report_path
+from pipeline.resources import pin_process_to_cpus
+from pipeline.resources import split_cpus
+
+
+ENTRY_POINT_GROUP = "pipeline.executors"
+
+
+class Executor:
+    """The interface of executor backends.
+
+    Subclasses have to implement :meth:`submit`. Backends which do not run tasks in the
+    background have to implement :meth:`poll` to update the state of submitted tasks.
+
+    Parameters
+    ----------
+    config : dict
+        The workflow configuration.
+
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    @property
+    def n_slots(self):
+        """int: The number of batches which are executed at the same time.
+
+        With priority scheduling, only as many tasks are proposed as slots are free.
+
+        """
+        return self.config["n_jobs"]
+
+    def submit(self, ids, paths, shared_datasets=None, resources=None):
+        """Submit a batch of rendered tasks.
+
+        Parameters
+        ----------
+        ids : list
+            The ids of the tasks in the batch.
+        paths : list
+            The paths to the rendered tasks.
+        shared_datasets : dict
+            The data sets of the tasks in the dataset store.
+        resources : dict
+            Resource hints of the tasks, for example, ``{"cpus": 4, "memory": "8G"}``.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            A future which resolves to a dictionary mapping the ids of failed tasks to
+            error messages or raises an exception if the whole batch failed.
+
+        """
+        raise NotImplementedError
+
+    def poll(self):
+        """Update the state of submitted tasks."""
+
+    def wait(self, futures, timeout=None):
+        """Wait until one of the futures is done or the timeout expires."""
+        self.poll()
+        return wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+    def cancel(self, futures):
+        """Cancel submitted tasks which have not finished."""
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self):
+        """Release all resources of the executor."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+class SerialExecutor(Executor):
+    """Execute tasks one after another in this process."""
+
+    @property
+    def n_slots(self):
+        return 1
+
+    def submit(self, ids, paths, shared_datasets=None, resources=None):
+        future = Future()
+        threads = (resources or {}).get("threads")
+        try:
+            future.set_result(
+                _execute_batch(ids, paths, self.config, shared_datasets, threads)
+            )
+        except Exception as e:
+            future.set_exception(e)
+
+        return future
+
+
+class ProcessExecutor(Executor):
+    """Execute tasks in a pool of ``n_jobs`` processes.
+
+    With ``pin_cpus``, every process of the pool and the tasks it executes are pinned
+    to a disjoint set of CPUs.
+
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        cpu_sets = split_cpus(self.n_slots) if config.get("pin_cpus") else []
+        if cpu_sets:
+            queue = multiprocessing.Queue()
+            for cpu_set in cpu_sets:
+                queue.put(cpu_set)
+            self._pool = ProcessPoolExecutor(
+                self.n_slots, initializer=pin_process_to_cpus, initargs=(queue,)
+            )
+        else:
+            self._pool = ProcessPoolExecutor(self.n_slots)
+
+    def submit(self, ids, paths, shared_datasets=None, resources=None):
+        threads = (resources or {}).get("threads")
+        return self._pool.submit(
+            _execute_batch, ids, paths, self.config, shared_datasets, threads
+        )
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+class LocalBatchExecutor(Executor):
+    """Execute tasks like a batch scheduler with job arrays on the local machine.
+
+    Submitted tasks are collected and, when the executor is polled, submitted as one
+    job array. The manifest of the array with the commands, environment variables, and
+    resource hints of its elements is written to ``jobs`` in the hidden build directory.
+    Like a scheduler with a limit on running jobs, at most ``n_jobs`` elements are
+    executed at the same time. Each element runs :mod:`pipeline.job_array` with its
+    index in ``PIPELINE_ARRAY_TASK_ID`` and writes its output to a log file which is
+    kept if the element fails.
+
+    A backend for a real batch scheduler would write the same manifest and submit, for
+    example, ``sbatch --array=0-N`` instead of starting the processes.
+
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.directory = Path(config["hidden_build_directory"], "jobs")
+        self._n_arrays = 0
+        self._pending = []
+        self._queued = []
+        self._running = {}
+
+    def submit(self, ids, paths, shared_datasets=None, resources=None):
+        future = Future()
+        self._pending.append((future, ids, paths, shared_datasets, resources or {}))
+        return future
+
+    def poll(self):
+        if self._pending:
+            self._submit_job_array()
+
+        for future, (process, job) in list(self._running.items()):
+            if process.poll() is not None:
+                del self._running[future]
+                self._evaluate_job(future, process.returncode, job)
+
+        while self._queued and len(self._running) < self.n_slots:
+            future, job = self._queued.pop(0)
+            if not future.cancelled():
+                self._running[future] = (self._start_job(job), job)
+
+    def cancel(self, futures):
+        for future in futures:
+            if future in self._running:
+                process, _ = self._running.pop(future)
+                process.terminate()
+                process.wait()
+            future.cancel()
+
+    def shutdown(self):
+        for process, _ in self._running.values():
+            process.wait()
+
+    def _submit_job_array(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        manifest = self.directory / f"array-{os.getpid()}-{self._n_arrays}.json"
+        self._n_arrays += 1
+
+        elements = []
+        for i, (future, ids, paths, shared_datasets, resources) in enumerate(
+            self._pending
+        ):
+            if len(ids) == 1 and Path(paths[0]).suffix == FUNCTION_TASK_SUFFIX:
+                report = None
+                command = ["python", "-m", "pipeline.functions", str(paths[0])]
+            elif len(ids) == 1:
+                report = None
+                suffix = Path(paths[0]).suffix
+                command = [{".py": "python", ".r": "Rscript"}[suffix], str(paths[0])]
+            else:
+                report = get_report_path(ids, self.config)
+                command = create_batch_command(paths, report)
+
+            environment = _patch_subprocess_environment(
+                self.config, shared_datasets, resources.get("threads")
+            )
+            element = {
+                "ids": ids,
+                "command": command,
+                "environment": {
+                    key: value
+                    for key, value in environment.items()
+                    if os.environ.get(key) != value
+                },
+                "resources": resources,
+                "log": manifest.with_name(f"{manifest.stem}-{i}.log").as_posix(),
+                "status": manifest.with_name(f"{manifest.stem}-{i}.json").as_posix(),
+            }
+            elements.append(element)
+            job = {
+                **element,
+                "paths": paths,
+                "report": report,
+                "index": i,
+                "manifest": manifest,
+            }
+            self._queued.append((future, job))
+
+        manifest.write_text(json.dumps({"elements": elements}, indent=4))
+        self._pending = []
+
+    def _start_job(self, job):
+        environment = {**os.environ, "PIPELINE_ARRAY_TASK_ID": str(job["index"])}
+        return subprocess.Popen(
+            [
+                "python",
+                Path(__file__).with_name("job_array.py").as_posix(),
+                job["manifest"].as_posix(),
+            ],
+            env=environment,
+        )
+
+    def _evaluate_job(self, future, returncode, job):
+        status = Path(job["status"])
+        if status.exists():
+            returncode = json.loads(status.read_text())["returncode"]
+            status.unlink()
+        log = Path(job["log"]).read_text() if Path(job["log"]).exists() else ""
+        if returncode == 0:
+            Path(job["log"]).unlink()
+
+        if returncode == 0 and job["report"] is None:
+            future.set_result({})
+        elif returncode == 0:
+            future.set_result(
+                read_batch_report(job["ids"], job["paths"], job["report"])
+            )
+        elif job["report"] is None:
+            error = subprocess.CalledProcessError(returncode, job["command"])
+            message = _format_exception_message(
+                job["ids"][0], job["paths"][0], f"{error}\n\n{log}"
+            )
+            future.set_exception(TaskError(message, error))
+        else:
+            future.set_exception(
+                TaskError(f"\n\nThe batch of tasks {job['ids']} failed.\n\n{log}")
+            )
+
+
+BUILT_IN_EXECUTORS = {
+    "serial": SerialExecutor,
+    "process": ProcessExecutor,
+    "local-batch": LocalBatchExecutor,
+}
+
+
+def create_executor(config):
+    """Create the executor which is selected in the configuration.
+
+    Executors registered under the entry point group ``pipeline.executors`` take
+    precedence over built-in executors with the same name.
+
+    """
+    executors = {**BUILT_IN_EXECUTORS, **_load_executors_from_entry_points()}
+    name = config["executor"]
+    if name not in executors:
+        raise ValueError(
+            f"Unknown executor '{name}'. Choose one of {sorted(executors)}."
+        )
+
+    return executors[name](config)
+
+
+def _load_executors_from_entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # Python < 3.8.
+        import pkg_resources
+
+        entry_points_ = pkg_resources.iter_entry_points(ENTRY_POINT_GROUP)
+    else:
+        entry_points_ = entry_points()
+        if hasattr(entry_points_, "select"):
+            entry_points_ = entry_points_.select(group=ENTRY_POINT_GROUP)
+        else:
+            entry_points_ = entry_points_.get(ENTRY_POINT_GROUP, [])
+
+    return {entry_point.name: entry_point.load() for entry_point in entry_points_}
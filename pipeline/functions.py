@@ -0,0 +1,371 @@
+"""This module contains the code to use Python functions as tasks.
+
+Rendering a template, writing it to the hidden task directory, and starting a new
+interpreter takes longer than many small steps of a project, for example, renaming the
+columns of a data set. Such steps can be written as Python functions which are marked
+with :func:`task`.
+
+.. code-block:: python
+
+    import pandas as pd
+    import pipeline
+
+
+    @pipeline.task(depends_on="data", produces="{{ build_directory }}/clean.pkl")
+    def clean(depends_on, produces):
+        pd.read_pickle(depends_on).dropna().to_pickle(produces)
+
+Function tasks are collected from the modules in the source directory whose names match
+``task_modules`` (default ``task_*.py``). They are hashed, scheduled, and executed like
+other tasks, but the function is called in the process of the executor. A task is
+executed again if the source or the bytecode of the function, its arguments, or the
+module globals referenced by the function change. Constants and functions of the project
+are tracked, but not attributes of imported modules like ``helpers.clean``.
+
+"""
+import copy
+import importlib.util
+import inspect
+import json
+import linecache
+import sys
+import threading
+from pathlib import Path
+
+import jinja2
+
+from pipeline.exceptions import DuplicatedTaskError
+
+
+TASK_ATTRIBUTE = "_pipeline_task"
+
+FUNCTION_TASK_SUFFIX = ".json"
+
+SEPARATOR = "::"
+
+PATH_ARGUMENTS = ("depends_on", "produces")
+
+CONSTANT_TYPES = (bool, int, float, complex, str, bytes)
+
+_IMPORT_LOCK = threading.RLock()
+
+
+def task(depends_on=None, produces=None, name=None, **options):
+    """Mark a function as a task.
+
+    Parameters
+    ----------
+    depends_on : str or list, optional
+        The dependencies of the task. Like in ``tasks.yaml``, ids of other tasks are
+        replaced with their targets and strings can contain variables of the
+        configuration, for example, ``{{ build_directory }}``.
+    produces : str or list, optional
+        The targets of the task.
+    name : str, optional
+        The id of the task. The default is the name of the function.
+    **options
+        Other options of the task, for example, ``priority``. Options which are
+        parameters of the function are passed as arguments.
+
+    """
+
+    def decorator(func):
+        info = {"id": name or func.__name__, **options}
+        if depends_on is not None:
+            info["depends_on"] = depends_on
+        if produces is not None:
+            info["produces"] = produces
+        setattr(func, TASK_ATTRIBUTE, info)
+
+        return func
+
+    return decorator
+
+
+def collect_function_tasks(config):
+    """Collect the function tasks from the task modules in the source directory.
+
+    Returns
+    -------
+    tasks : dict
+        A dictionary mapping task ids to task dictionaries. The key ``function``
+        identifies the function by the path to the module and the name of the function.
+
+    """
+    paths = sorted(
+        Path(config["source_directory"]).glob(f"**/{config['task_modules']}")
+    )
+
+    tasks = {}
+    for path in paths:
+        module = import_module_from_path(path, config["project_directory"])
+        for name, obj in vars(module).items():
+            info = getattr(obj, TASK_ATTRIBUTE, None)
+            if (
+                not callable(obj)
+                or not isinstance(info, dict)
+                or getattr(obj, "__module__", None) != module.__name__
+            ):
+                continue
+
+            info = copy.deepcopy(info)
+            id_ = info.pop("id")
+            if id_ in tasks:
+                raise DuplicatedTaskError({id_})
+
+            for key in PATH_ARGUMENTS:
+                if key in info:
+                    info[key] = _render_paths(info[key], config)
+            info["function"] = f"{path.as_posix()}{SEPARATOR}{name}"
+            info["config"] = path.as_posix()
+            tasks[id_] = info
+
+    return tasks
+
+
+def _render_paths(paths, config):
+    if isinstance(paths, (list, tuple)):
+        return [jinja2.Template(path).render(**config) for path in paths]
+    else:
+        return jinja2.Template(paths).render(**config)
+
+
+def import_module_from_path(path, project_directory):
+    """Import a task module by its path.
+
+    The module is named after its path relative to the project directory, for example,
+    ``src.task_data``, and the project directory is added to :data:`sys.path` such that
+    imports like ``from src.auxiliary import ...`` work like in templates. Modules are
+    imported again if the file was modified.
+
+    """
+    path = Path(path).resolve()
+    try:
+        name = ".".join(
+            path.relative_to(Path(project_directory).resolve()).with_suffix("").parts
+        )
+    except ValueError:
+        name = path.stem
+    mtime = path.stat().st_mtime
+
+    with _IMPORT_LOCK:
+        module = sys.modules.get(name)
+        if (
+            module is not None
+            and getattr(module, "__file__", None) == str(path)
+            and getattr(module, "_pipeline_mtime", None) == mtime
+        ):
+            return module
+
+        if str(project_directory) not in sys.path:
+            sys.path.insert(0, str(project_directory))
+
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+        module._pipeline_mtime = mtime
+        linecache.checkcache(str(path))
+
+    return module
+
+
+def load_function(key, project_directory):
+    """Load a function which is identified by ``path::name``."""
+    path, name = key.rsplit(SEPARATOR, 1)
+    module = import_module_from_path(path, project_directory)
+
+    return getattr(module, name)
+
+
+def create_function_arguments(func, task_info):
+    """Collect the arguments of a function from the options of its task."""
+    parameters = inspect.signature(func).parameters
+    return {name: task_info[name] for name in parameters if name in task_info}
+
+
+def create_function_fingerprint(task_info, config):
+    """Describe the source, the bytecode, and the arguments of a function task.
+
+    The hash of the description replaces the hash of the task module as a dependency of
+    the task. Thus, changing one function in a module does not execute the other tasks
+    of the module again. The description includes the module globals which are
+    referenced by the function, see :func:`_describe_function`.
+
+    """
+    func = load_function(task_info["function"], config["project_directory"])
+    arguments = create_function_arguments(func, task_info)
+
+    return "\n".join(
+        [
+            _describe_function(func, config["project_directory"], set()),
+            json.dumps(arguments, sort_keys=True, default=str),
+        ]
+    )
+
+
+def _describe_function(func, project_directory, visited):
+    """Describe a function and the module globals which are referenced by it.
+
+    Globals which are constants are described by their values. Functions and classes
+    which are defined in the project are described by their source, and functions are
+    described recursively. Other objects like modules or functions of libraries are
+    only described by their names.
+
+    Attributes of modules like ``helpers.clean`` and the state of other objects are not
+    part of the description. Changing them does not execute the task again.
+
+    """
+    visited.add(func)
+    descriptions = [inspect.getsource(func), _describe_code(func.__code__)]
+
+    for name in sorted(_collect_names(func.__code__)):
+        if name in func.__globals__:
+            value = _describe_global(func.__globals__[name], project_directory, visited)
+            descriptions.append(f"{name} = {value}")
+
+    return "\n".join(descriptions)
+
+
+def _describe_global(value, project_directory, visited):
+    """Describe the value of a module global which is referenced by a function."""
+    if _is_constant(value):
+        description = _describe_constant(value)
+    elif inspect.isfunction(value) and _is_defined_in_project(value, project_directory):
+        description = (
+            f"<function {value.__qualname__}>"
+            if value in visited
+            else _describe_function(value, project_directory, visited)
+        )
+    elif inspect.isclass(value) and _is_defined_in_project(value, project_directory):
+        description = inspect.getsource(value)
+    else:
+        name = getattr(value, "__qualname__", getattr(value, "__name__", ""))
+        description = f"<{type(value).__name__} {name}>"
+
+    return description
+
+
+def _collect_names(code):
+    """Collect the global names of a code object and the code objects nested in it."""
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if inspect.iscode(constant):
+            names |= _collect_names(constant)
+
+    return names
+
+
+def _is_constant(value):
+    """Check whether a value has a representation which does not change between runs."""
+    if value is None or isinstance(value, CONSTANT_TYPES):
+        is_constant = True
+    elif isinstance(value, (tuple, list, set, frozenset)):
+        is_constant = all(_is_constant(element) for element in value)
+    elif isinstance(value, dict):
+        is_constant = all(
+            _is_constant(key) and _is_constant(element)
+            for key, element in value.items()
+        )
+    else:
+        is_constant = False
+
+    return is_constant
+
+
+def _describe_constant(value):
+    """Describe a constant. Elements of sets are sorted since their order varies."""
+    if isinstance(value, (set, frozenset)):
+        elements = sorted(_describe_constant(element) for element in value)
+        description = f"{type(value).__name__}({', '.join(elements)})"
+    elif isinstance(value, (tuple, list)):
+        elements = [_describe_constant(element) for element in value]
+        description = f"{type(value).__name__}({', '.join(elements)})"
+    elif isinstance(value, dict):
+        elements = [
+            f"{_describe_constant(key)}: {_describe_constant(element)}"
+            for key, element in value.items()
+        ]
+        description = f"dict({', '.join(elements)})"
+    else:
+        description = repr(value)
+
+    return description
+
+
+def _is_defined_in_project(value, project_directory):
+    """Check whether a function or a class is defined in a module of the project."""
+    try:
+        path = inspect.getsourcefile(value)
+    except TypeError:
+        # Built-in functions and classes do not have a source file.
+        path = None
+
+    return path is not None and Path(project_directory).resolve() in (
+        Path(path).resolve().parents
+    )
+
+
+def _describe_code(code):
+    """Describe the bytecode of a code object and the code objects nested in it."""
+    constants = [
+        _describe_code(constant) if inspect.iscode(constant) else repr(constant)
+        for constant in code.co_consts
+    ]
+
+    return "\n".join([code.co_code.hex(), repr(code.co_names), *constants])
+
+
+def write_function_task(id_, task_info, config):
+    """Write the file which describes the call of a function task.
+
+    Returns
+    -------
+    path : pathlib.Path
+        The path to the file in the hidden task directory.
+
+    """
+    func = load_function(task_info["function"], config["project_directory"])
+    content = {
+        "function": task_info["function"],
+        "project_directory": Path(config["project_directory"]).as_posix(),
+        "arguments": create_function_arguments(func, task_info),
+    }
+
+    path = Path(config["hidden_task_directory"], id_ + FUNCTION_TASK_SUFFIX)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(content, indent=4))
+
+    return path
+
+
+def execute_function_task(path):
+    """Call the function which is described by the file of a function task.
+
+    Dependencies and targets are passed as :class:`pathlib.Path` objects.
+
+    """
+    content = json.loads(Path(path).read_text())
+    func = load_function(content["function"], content["project_directory"])
+
+    arguments = content["arguments"]
+    for key in PATH_ARGUMENTS:
+        if isinstance(arguments.get(key), list):
+            arguments[key] = [Path(value) for value in arguments[key]]
+        elif key in arguments:
+            arguments[key] = Path(arguments[key])
+
+    return func(**arguments)
+
+
+def main():
+    """Execute a function task in a new process, for example, in a job array."""
+    execute_function_task(sys.argv[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""This module contains the code to fuse many small tasks into batches.
+
+Specification grids often consist of hundreds of tasks which are rendered from the same
+template and depend on the same data. Starting a new interpreter and loading the data
+for each of them takes longer than the computation itself. If ``fusion_batch_size`` is
+larger than one, ready tasks with the same template and dependencies are executed in
+batches by a single process. The process runs the rendered tasks one after another with
+:mod:`pipeline.batch` which shares data sets loaded with ``load_data()`` between them.
+
+Hashes, targets, and failures are still processed for each task separately.
+
+"""
+from pathlib import Path
+
+from pipeline.profiling import is_task_profiled
+from pipeline.shared import ensure_list
+
+
+def mark_fusable_tasks(dag, config):
+    """Assign a fusion key to all tasks which can be executed in batches.
+
+    Python tasks can be fused if they share the template and the dependencies. Tasks
+    which are profiled or executed in the debug mode are never fused.
+
+    """
+    if config["fusion_batch_size"] > 1 and not config["_is_debug"]:
+        for id_ in dag.nodes:
+            task_info = dag.nodes[id_]
+            if (
+                task_info["_is_task"]
+                and task_info.get("template", "").endswith(".py")
+                and not is_task_profiled(id_, config)
+            ):
+                depends_on = ensure_list(task_info.get("depends_on", []))
+                task_info["_fusion_key"] = (
+                    task_info["template"],
+                    tuple(sorted(depends_on)),
+                )
+
+    return dag
+
+
+def create_batches(proposals, scheduler, config):
+    """Split proposed tasks into batches of fusable tasks.
+
+    Batches of proposed tasks which are smaller than ``fusion_batch_size`` are filled
+    with other ready tasks with the same fusion key.
+
+    Returns
+    -------
+    batches : list
+        A list of lists of task ids.
+
+    """
+    batch_size = config["fusion_batch_size"]
+    dag = scheduler.dag
+
+    groups = {}
+    batches = []
+    for id_ in sorted(proposals):
+        key = dag.nodes[id_].get("_fusion_key")
+        if key is None:
+            batches.append([id_])
+        else:
+            groups.setdefault(key, []).append(id_)
+
+    for group in groups.values():
+        for i in range(0, len(group), batch_size):
+            batch = group[i : i + batch_size]
+            n_missing = batch_size - len(batch)
+            batch += sorted(scheduler.propose_fusable(batch[0], n_missing))
+            batches.append(batch)
+
+    return batches
+
+
+def create_batch_command(paths, report):
+    """Create the command which executes a batch of rendered Python tasks."""
+    return [
+        "python",
+        Path(__file__).with_name("batch.py").as_posix(),
+        "--report",
+        Path(report).as_posix(),
+        *[Path(path).as_posix() for path in paths],
+    ]
+
+
+def get_report_path(ids, config):
+    """Get the path to the report of a batch in the hidden task directory."""
+    return Path(config["hidden_task_directory"], f"{min(ids)}.batch.json")
@@ -0,0 +1,294 @@
+"""This module contains the hashers which hash the content of files instead of bytes.
+
+Many files are regenerated with the same content but different bytes. Parquet files
+embed the version of the writer, figures carry creation dates, and CSV files written on
+Windows have other line endings. A hasher is a function which receives the path to a
+file and a hash object and updates the hash object only with the content which matters.
+
+.. code-block:: python
+
+    def hash_json(path, h):
+        h.update(json.dumps(json.loads(path.read_text()), sort_keys=True).encode())
+
+Hashers are selected by the suffix of the file. The built-in hashers are listed in
+:data:`BUILT_IN_HASHERS` and more hashers are registered in the configuration with
+``hashers``, a mapping from suffixes to hashers given as ``module:function``. The
+name of the hasher is recorded in the algorithm of the hash such that changing the
+hasher of a suffix does not execute tasks again.
+
+"""
+import importlib
+import re
+import sys
+import threading
+import zlib
+from pathlib import Path
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    IS_PYARROW_INSTALLED = False
+else:
+    IS_PYARROW_INSTALLED = True
+
+
+CHUNK_SIZE = 1024 ** 2
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+PNG_METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME", b"eXIf", b"pHYs"}
+
+PDF_METADATA_PATTERNS = [
+    (re.compile(rb"/(CreationDate|ModDate)\s*\((?:[^()\\]|\\.)*\)"), rb"/\1()"),
+    (re.compile(rb"/ID\s*\[\s*<[0-9A-Fa-f]*>\s*<[0-9A-Fa-f]*>\s*\]"), rb"/ID[]"),
+    (
+        re.compile(
+            rb"<(xmp:CreateDate|xmp:ModifyDate|xmp:MetadataDate|xmpMM:DocumentID|"
+            rb"xmpMM:InstanceID)>[^<]*</\1>"
+        ),
+        rb"<\1></\1>",
+    ),
+    (
+        re.compile(
+            rb"(xmp:CreateDate|xmp:ModifyDate|xmp:MetadataDate|xmpMM:DocumentID|"
+            rb"xmpMM:InstanceID)=\"[^\"]*\""
+        ),
+        rb'\1=""',
+    ),
+    # The cross-reference table only contains the offsets of objects and changes
+    # whenever the length of a removed value changes.
+    (re.compile(rb"\bxref\s[0-9fn\s]*(?=trailer)"), b""),
+    (re.compile(rb"\bstartxref\s+\d+"), b"startxref"),
+]
+
+_LOADED_HASHERS = {}
+_LOADED_HASHERS_LOCK = threading.Lock()
+
+
+def hash_csv(path, h):
+    """Hash a CSV file with normalized line endings.
+
+    Examples
+    --------
+    >>> import hashlib, tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     windows, unix = Path(directory, "a.csv"), Path(directory, "b.csv")
+    ...     _ = windows.write_bytes(b"a,b\\r\\n1,2\\r\\n")
+    ...     _ = unix.write_bytes(b"a,b\\n1,2\\n")
+    ...     digests = []
+    ...     for path in [windows, unix]:
+    ...         h = hashlib.sha256()
+    ...         hash_csv(path, h)
+    ...         digests.append(h.hexdigest())
+    >>> digests[0] == digests[1]
+    True
+
+    """
+    pending = b""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            chunk = pending + chunk
+            # A carriage return at the end of a chunk might be followed by a newline.
+            if chunk.endswith(b"\r"):
+                chunk, pending = chunk[:-1], b"\r"
+            else:
+                pending = b""
+            h.update(chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n"))
+    h.update(pending.replace(b"\r", b"\n"))
+
+
+def hash_png(path, h):
+    """Hash the image of a PNG file without metadata.
+
+    Textual chunks, the modification time, Exif data, and the physical pixel size are
+    skipped. The image data is decompressed such that the hash does not depend on the
+    compression level.
+
+    """
+    with open(path, "rb") as f:
+        if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise ValueError(f"'{Path(path).as_posix()}' is not a PNG file.")
+
+        decompressor = zlib.decompressobj()
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, type_ = int.from_bytes(header[:4], "big"), header[4:]
+            data = f.read(length)
+            f.read(4)
+
+            if type_ == b"IDAT":
+                h.update(decompressor.decompress(data))
+            elif type_ not in PNG_METADATA_CHUNKS:
+                h.update(type_ + data)
+        h.update(decompressor.flush())
+
+
+def hash_pdf(path, h):
+    """Hash a PDF file without creation dates, document IDs, and object offsets."""
+    content = Path(path).read_bytes()
+    for pattern, replacement in PDF_METADATA_PATTERNS:
+        content = pattern.sub(replacement, content)
+    h.update(content)
+
+
+def hash_parquet(path, h):
+    """Hash the logical data of a Parquet file.
+
+    The hash covers the schema without metadata and the values of every column. It does
+    not depend on the compression, the row groups, or the writer of the file. Columns
+    are read one after another such that only one column is in memory.
+
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    schema = parquet_file.schema_arrow
+    update_hash_with_schema(h, schema)
+    for name in schema.names:
+        update_hash_with_array(h, parquet_file.read(columns=[name]).column(0))
+
+
+def hash_arrow(path, h):
+    """Hash the logical data of an Arrow IPC or Feather file."""
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, memory_map=True)
+    update_hash_with_schema(h, table.schema)
+    for column in table.columns:
+        update_hash_with_array(h, column)
+
+
+def update_hash_with_schema(h, schema):
+    """Update a hash object with the fields of an Arrow schema without metadata."""
+    description = schema.to_string(
+        show_field_metadata=False, show_schema_metadata=False
+    )
+    h.update(description.encode("utf-8") + b"\0")
+
+
+def update_hash_with_array(h, array):
+    """Update a hash object with the values of an Arrow array or chunked array.
+
+    The array is written as an Arrow IPC stream into the hash object. The stream
+    contains the values of dictionaries and child arrays and the buffers of sliced
+    arrays are truncated and rebased. Chunks are combined and dictionary-encoded arrays
+    are decoded such that the hash does not depend on row groups, record batches, or
+    the dictionary. The writer skips the validity bitmap of arrays without missing
+    values which writers differ in whether they store it.
+
+    """
+    import pyarrow as pa
+
+    if hasattr(array, "combine_chunks"):
+        array = array.combine_chunks()
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+
+    batch = pa.RecordBatch.from_arrays([array], names=[""])
+    with pa.ipc.new_stream(_HashWriter(h), batch.schema) as writer:
+        writer.write_batch(batch)
+
+
+class _HashWriter:
+    """A file-like object which updates a hash object with the written bytes."""
+
+    def __init__(self, h):
+        self.h = h
+        self.closed = False
+
+    def write(self, data):
+        self.h.update(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+BUILT_IN_HASHERS = {"csv": hash_csv, "png": hash_png, "pdf": hash_pdf}
+if IS_PYARROW_INSTALLED:
+    BUILT_IN_HASHERS["parquet"] = hash_parquet
+    BUILT_IN_HASHERS["arrow"] = hash_arrow
+
+DEFAULT_HASHERS = {
+    ".csv": "csv",
+    ".png": "png",
+    ".pdf": "pdf",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def parse_hashers(hashers, project_directory):
+    """Parse the hashers of the configuration.
+
+    Hashers of the configuration are merged with the default hashers. A hasher of
+    ``None`` or ``false`` hashes files with a suffix byte by byte. Every hasher is
+    loaded once to report errors before the build starts.
+
+    Examples
+    --------
+    >>> parse_hashers({"CSV": None, "svg": "pdf"}, ".")[".svg"]
+    'pdf'
+    >>> ".csv" in parse_hashers({"CSV": None, "svg": "pdf"}, ".")
+    False
+
+    """
+    # Hashers for Parquet and Arrow files are only available with pyarrow.
+    default_hashers = {
+        suffix: name
+        for suffix, name in DEFAULT_HASHERS.items()
+        if name in BUILT_IN_HASHERS
+    }
+    hashers = {
+        **default_hashers,
+        **{_normalize_suffix(suffix): name for suffix, name in (hashers or {}).items()},
+    }
+    hashers = {suffix: name for suffix, name in hashers.items() if name}
+    for name in hashers.values():
+        load_hasher(name, project_directory)
+
+    return hashers
+
+
+def _normalize_suffix(suffix):
+    suffix = str(suffix).lower()
+    return suffix if suffix.startswith(".") else "." + suffix
+
+
+def get_hasher_name(path, config):
+    """Get the name of the hasher for a file or ``None`` to hash the bytes."""
+    return config.get("hashers", {}).get(Path(path).suffix.lower())
+
+
+def load_hasher(name, project_directory=None):
+    """Load a built-in hasher or a hasher which is given as ``module:function``.
+
+    If the project directory is given, it is added to :data:`sys.path` such that
+    hashers can be defined in the project, for example, ``src.hashers:hash_model``.
+
+    """
+    if name in BUILT_IN_HASHERS:
+        return BUILT_IN_HASHERS[name]
+
+    with _LOADED_HASHERS_LOCK:
+        if name not in _LOADED_HASHERS:
+            module_name, _, function_name = name.partition(":")
+            if not module_name or not function_name:
+                raise ValueError(
+                    f"Unknown hasher '{name}'. Use one of {sorted(BUILT_IN_HASHERS)} "
+                    "or 'module:function'."
+                )
+
+            if project_directory is not None and str(project_directory) not in sys.path:
+                sys.path.insert(0, str(project_directory))
+            module = importlib.import_module(module_name)
+            _LOADED_HASHERS[name] = getattr(module, function_name)
+
+    return _LOADED_HASHERS[name]
@@ -1,13 +1,71 @@
+import fnmatch
 import functools
 import hashlib
+import json
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from pony import orm
 
 from pipeline.database import Hash
+from pipeline.ephemeral import is_ephemeral
+from pipeline.functions import create_function_fingerprint
+from pipeline.hashers import get_hasher_name
+from pipeline.hashers import load_hasher
+from pipeline.hashers import update_hash_with_array
 from pipeline.shared import ensure_list
 from pipeline.shared import render_task_template
 
+try:
+    import xxhash
+except ImportError:
+    IS_XXHASH_INSTALLED = False
+else:
+    IS_XXHASH_INSTALLED = True
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    IS_PYARROW_INSTALLED = False
+else:
+    IS_PYARROW_INSTALLED = True
+
+
+HASH_ALGORITHMS = {
+    "blake2b": hashlib.blake2b,
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+}
+if IS_XXHASH_INSTALLED:
+    HASH_ALGORITHMS["xxh3"] = xxhash.xxh3_128
+
+MMAP_THRESHOLD = 16 * 1024 ** 2
+TREE_SEPARATOR = "-tree-"
+CONTENT_SEPARATOR = "-content-"
+MANIFEST_SUFFIX = "-manifest"
+COLUMNS_SUFFIX = "-columns"
+COLUMNAR_SUFFIXES = [".parquet", ".arrow", ".feather", ".ipc"]
+IGNORE_FILE = ".pipelineignore"
+DEFAULT_DIRECTORY_IGNORE = [
+    "*~",
+    "*.swp",
+    "*.tmp",
+    ".#*",
+    ".~lock.*#",
+    "~$*",
+    ".DS_Store",
+    "Thumbs.db",
+    "__pycache__",
+    ".ipynb_checkpoints",
+]
+
+_MANIFEST_LOCKS = {}
+_MANIFEST_LOCKS_LOCK = threading.Lock()
+
 
 @orm.db_session
 def compare_hashes_of_task(id_, env, dag, config):
@@ -17,6 +75,7 @@ def compare_hashes_of_task(id_, env, dag, config):
     hashes of its dependencies and its targets with hashes in the database.
 
     If a file is missing, a hash does not match, the task is marked for execution.
+    Deleted ephemeral targets are not considered missing if their hashes are recorded.
 
     Parameters
     ----------
@@ -37,67 +96,257 @@ def compare_hashes_of_task(id_, env, dag, config):
     """
     have_same_hashes = True
 
+    templates = env.list_templates()
     dependencies_and_targets = list(dag.predecessors(id_)) + list(dag.successors(id_))
     for node in dependencies_and_targets:
         path = Path(node)
 
-        if node in env.list_templates() or path.exists():
-            if node in env.list_templates():
-                rendered_task = render_task_template(id_, dag.nodes[id_], env, config)
-                hash_ = _compute_hash_of_string(rendered_task)
-                dependency = node
+        if node in templates:
+            rendered_task = render_task_template(id_, dag.nodes[id_], env, config)
+            have_same_hash = _compare_and_update_hash(
+                id_,
+                node,
+                functools.partial(_compute_hash_of_string, rendered_task),
+                config["hash_algorithm"],
+            )
+            have_same_hashes &= have_same_hash
+
+        elif _is_module_of_function_task(id_, node, dag):
+            fingerprint = create_function_fingerprint(dag.nodes[id_], config)
+            have_same_hash = _compare_and_update_hash(
+                id_,
+                node,
+                functools.partial(_compute_hash_of_string, fingerprint),
+                config["hash_algorithm"],
+            )
+            have_same_hashes &= have_same_hash
+
+        elif _get_declared_columns(id_, node, dag, config) is not None:
+            columns = _get_declared_columns(id_, node, dag, config)
+            have_same_hash = _compare_and_update_hash(
+                id_,
+                path.as_posix(),
+                functools.partial(
+                    _compute_hash_of_columns, path, columns, config=config
+                ),
+                config["hash_algorithm"] + COLUMNS_SUFFIX,
+            )
+            have_same_hashes &= have_same_hash
+
+        elif path.is_dir():
+            have_same_hash = _compare_and_update_hash(
+                id_,
+                path.as_posix(),
+                functools.partial(_compute_hash_of_directory, path, config=config),
+                _get_algorithm_for_directory(config),
+            )
+            have_same_hashes &= have_same_hash
+
+        elif path.exists():
+            have_same_hash = _compare_and_update_hash(
+                id_,
+                path.as_posix(),
+                functools.partial(_compute_hash_of_file, path, path.stat().st_mtime),
+                _get_algorithm_for_file(path, config),
+            )
+            have_same_hashes &= have_same_hash
+
+        elif is_ephemeral(node, dag):
+            # Deleted ephemeral targets are unchanged if their hashes were recorded.
+            have_same_hashes &= Hash.exists(task=id_, dependency=path.as_posix())
+
+        else:
+            have_same_hashes = False
+
+    return have_same_hashes
+
 
-            elif path.exists():
-                paths = _path_to_file_or_directory_to_path_iterator(path)
+def _compare_and_update_hash(id_, dependency, compute_hash, algorithm):
+    """Compare the hash of a dependency or target with the hash in the database.
 
-                for path in paths:
-                    hash_ = _compute_hash_of_file(path, path.stat().st_mtime)
-                    dependency = path.as_posix()
+    If the hash in the database was computed with another algorithm, the hash is
+    recomputed with the old algorithm for the comparison. Afterwards, the entry is
+    migrated to the current algorithm so that changing the algorithm does not cause
+    tasks to be executed again.
+
+    """
+    hash_ = compute_hash(algorithm)
 
+    try:
+        hash_in_db = Hash[id_, dependency]
+    except orm.ObjectNotFound:
+        Hash(task=id_, dependency=dependency, hash_=hash_, algorithm=algorithm)
+        have_same_hash = False
+    else:
+        if hash_in_db.algorithm == algorithm:
+            have_same_hash = hash_ == hash_in_db.hash_
+        else:
             try:
-                hash_in_db = Hash[id_, dependency]
-            except orm.ObjectNotFound:
-                Hash(task=id_, dependency=dependency, hash_=hash_)
-                have_same_hashes = False
+                old_hash = compute_hash(hash_in_db.algorithm)
+            except ValueError:
+                have_same_hash = False
             else:
-                try:
-                    assert hash_ == hash_in_db.hash_
-                except AssertionError:
-                    hash_in_db.hash_ = hash_
-                    have_same_hashes = False
+                have_same_hash = old_hash == hash_in_db.hash_
 
-        else:
-            have_same_hashes = False
+        hash_in_db.hash_ = hash_
+        hash_in_db.algorithm = algorithm
 
-    return have_same_hashes
+    return have_same_hash
 
 
-@orm.db_session
-def save_hashes_of_task_dependencies(id_, env, dag, config):
-    """Save file hashes of the dependencies of a task."""
+def compute_hashes_of_task_dependencies(id_, env, dag, config):
+    """Compute the hashes of the dependencies of a task.
+
+    The function does not access the database such that it can be called from threads
+    other than the one which schedules the tasks.
+
+    Returns
+    -------
+    hashes : dict
+        A dictionary mapping dependencies to tuples of hashes and algorithms.
+
+    """
+    hashes = {}
     for dependency in dag.predecessors(id_):
         if dependency in env.list_templates():
             rendered_task = render_task_template(id_, dag.nodes[id_], env, config)
-            hash_ = _compute_hash_of_string(rendered_task)
-            create_or_update_hash(id_, dependency, hash_)
+            algorithm = config["hash_algorithm"]
+            hash_ = _compute_hash_of_string(rendered_task, algorithm)
+            hashes[dependency] = (hash_, algorithm)
+
+        elif _is_module_of_function_task(id_, dependency, dag):
+            fingerprint = create_function_fingerprint(dag.nodes[id_], config)
+            algorithm = config["hash_algorithm"]
+            hash_ = _compute_hash_of_string(fingerprint, algorithm)
+            hashes[dependency] = (hash_, algorithm)
+
+        elif _get_declared_columns(id_, dependency, dag, config) is not None:
+            columns = _get_declared_columns(id_, dependency, dag, config)
+            algorithm = config["hash_algorithm"] + COLUMNS_SUFFIX
+            hash_ = _compute_hash_of_columns(dependency, columns, algorithm, config)
+            hashes[Path(dependency).as_posix()] = (hash_, algorithm)
 
         else:
-            paths = _path_to_file_or_directory_to_path_iterator(dependency)
+            hashes[Path(dependency).as_posix()] = _compute_hash_of_path(
+                dependency, config
+            )
+
+    return hashes
+
+
+def _is_module_of_function_task(id_, node, dag):
+    """Check whether the node is the module which defines the function of a task.
+
+    Instead of the module, the function and its arguments are hashed such that only the
+    tasks of modified functions are executed again.
+
+    """
+    return "function" in dag.nodes[id_] and node == dag.nodes[id_]["config"]
+
+
+def compute_hashes_of_task_targets(id_, dag, config):
+    """Compute the hashes of the targets of a task."""
+    return compute_hashes_of_paths(ensure_list(dag.nodes[id_]["produces"]), config)
+
+
+def compute_hashes_of_paths(paths, config):
+    """Compute the hashes of files and directories."""
+    hashes = {}
+    for path in paths:
+        hashes[Path(path).as_posix()] = _compute_hash_of_path(path, config)
 
-            for path in paths:
-                hash_ = _compute_hash_of_file(path, path.stat().st_mtime)
-                create_or_update_hash(id_, path.as_posix(), hash_)
+    return hashes
+
+
+def _compute_hash_of_path(path, config):
+    """Compute the hash of a file or a directory and return it with the algorithm."""
+    path = Path(path)
+    if path.is_dir():
+        algorithm = _get_algorithm_for_directory(config)
+        hash_ = _compute_hash_of_directory(path, algorithm, config)
+    else:
+        algorithm = _get_algorithm_for_file(path, config)
+        hash_ = _compute_hash_of_file(path, path.stat().st_mtime, algorithm)
+
+    return hash_, algorithm
 
 
 @orm.db_session
-def save_hash_of_task_target(id_, dag):
-    """Loop over the targets of a task and save the hashes of the files."""
-    for path in ensure_list(dag.nodes[id_]["produces"]):
-        paths = _path_to_file_or_directory_to_path_iterator(path)
+def save_hashes(id_, hashes):
+    """Save hashes of dependencies or targets of a task."""
+    for dependency, (hash_, algorithm) in hashes.items():
+        create_or_update_hash(id_, dependency, hash_, algorithm)
+
+
+def _get_hash_object(name):
+    """Get a new hash object of an algorithm.
+
+    Examples
+    --------
+    >>> _get_hash_object("blake2b").name
+    'blake2b'
+    >>> _get_hash_object("unknown")
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown hash algorithm 'unknown'. ...
+
+    """
+    if name in HASH_ALGORITHMS:
+        hash_object = HASH_ALGORITHMS[name]()
+    else:
+        raise ValueError(
+            f"Unknown hash algorithm '{name}'. Available algorithms are "
+            f"{sorted(HASH_ALGORITHMS)}. 'xxh3' requires the package 'xxhash'."
+        )
+
+    return hash_object
+
+
+def _get_algorithm_for_file(path, config):
+    """Get the algorithm for a file.
+
+    Files with a suffix which has a hasher in ``hashers`` are hashed by their content
+    which is recorded in the algorithm like ``sha256-content-parquet``. Files above the
+    threshold ``hash_tree_threshold`` are hashed as a tree of chunks in parallel which
+    is recorded in the algorithm like ``blake2b-tree-16777216``.
+
+    """
+    hasher = get_hasher_name(path, config)
+    if hasher is not None:
+        load_hasher(hasher, config["project_directory"])
+        algorithm = f"{config['hash_algorithm']}{CONTENT_SEPARATOR}{hasher}"
+    else:
+        algorithm = _get_algorithm_for_size(
+            config["hash_algorithm"], Path(path).stat().st_size, config
+        )
+
+    return algorithm
+
 
-        for path in paths:
-            hash_ = _compute_hash_of_file(path, path.stat().st_mtime)
-            create_or_update_hash(id_, path.as_posix(), hash_)
+def _get_algorithm_for_size(name, size, config):
+    if size >= config["hash_tree_threshold"]:
+        algorithm = f"{name}{TREE_SEPARATOR}{config['hash_tree_chunk_size']}"
+    else:
+        algorithm = name
+
+    return algorithm
+
+
+def _parse_algorithm(algorithm):
+    """Parse the name and the chunk size of tree hashes from an algorithm.
+
+    Examples
+    --------
+    >>> _parse_algorithm("sha256")
+    ('sha256', None)
+    >>> _parse_algorithm("blake2b-tree-1024")
+    ('blake2b', 1024)
+
+    """
+    name, _, chunk_size = algorithm.partition(TREE_SEPARATOR)
+    chunk_size = int(chunk_size) if chunk_size else None
+
+    return name, chunk_size
 
 
 @functools.lru_cache()  # noqa: U101
@@ -107,6 +356,14 @@ def _compute_hash_of_file(path, _last_modified=None, algorithm="sha256"):
     The function uses caching to avoid computing the same hash twice if the same file is
     requested and has not been modified in the meantime.
 
+    Small files are read through a buffer and large files are memory-mapped. If the
+    algorithm requests a tree hash, the file is split into chunks which are hashed in
+    parallel by threads and the final hash is the hash of the file size and the digests
+    of all chunks.
+
+    If the algorithm names a hasher like ``sha256-content-csv``, the hasher updates the
+    hash with the content of the file. See :mod:`pipeline.hashers`.
+
     Taken from https://stackoverflow.com/a/44873382/7523785.
 
     See Also
@@ -114,17 +371,63 @@ def _compute_hash_of_file(path, _last_modified=None, algorithm="sha256"):
     _load_hashes_helper
 
     """
-    h = hashlib.new(algorithm)
+    algorithm, _, hasher = algorithm.partition(CONTENT_SEPARATOR)
+    name, chunk_size = _parse_algorithm(algorithm)
+    size = os.path.getsize(path)
+
+    if hasher:
+        h = _get_hash_object(name)
+        load_hasher(hasher)(Path(path), h)
+
+    elif size == 0:
+        h = _get_hash_object(name)
+
+    elif chunk_size is not None:
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped_file, memoryview(mapped_file) as view:
+            offsets = range(0, size, chunk_size)
+            n_threads = min(os.cpu_count() or 1, len(offsets))
+            with ThreadPoolExecutor(n_threads) as executor:
+                digests = list(
+                    executor.map(
+                        lambda x: _compute_digest_of_chunk(view, x, chunk_size, name),
+                        offsets,
+                    )
+                )
+
+        h = _get_hash_object(name)
+        h.update(size.to_bytes(8, "little"))
+        for digest in digests:
+            h.update(digest)
+
+    elif size >= MMAP_THRESHOLD:
+        h = _get_hash_object(name)
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped_file:
+            h.update(mapped_file)
 
-    byte_array = bytearray(128 * 1024)
-    memory_view = memoryview(byte_array)
-    with open(path, "rb", buffering=0) as f:
-        for n in iter(lambda: f.readinto(memory_view), 0):
-            h.update(memory_view[:n])
+    else:
+        h = _get_hash_object(name)
+
+        byte_array = bytearray(128 * 1024)
+        memory_view = memoryview(byte_array)
+        with open(path, "rb", buffering=0) as f:
+            for n in iter(lambda: f.readinto(memory_view), 0):
+                h.update(memory_view[:n])
 
     return h.hexdigest()
 
 
+def _compute_digest_of_chunk(view, offset, chunk_size, name):
+    h = _get_hash_object(name)
+    with view[offset : offset + chunk_size] as chunk:
+        h.update(chunk)
+
+    return h.digest()
+
+
 def _compute_hash_of_string(string, algorithm="sha256"):
     """Compute hash of a string.
 
@@ -134,27 +437,367 @@ def _compute_hash_of_string(string, algorithm="sha256"):
     '36bbe50ed96841d10443bcb670d6554f0a34b761be67ec9c4a8ad2c0c44ca42c'
 
     """
-    h = hashlib.new(algorithm)
+    h = _get_hash_object(algorithm)
     h.update(string.encode("utf-8"))
 
     return h.hexdigest()
 
 
-def _path_to_file_or_directory_to_path_iterator(path):
-    """Convert a path to a file or directory to an iterator over paths."""
+def _get_algorithm_for_directory(config):
+    """Get the algorithm for a directory.
+
+    Example
+    -------
+    >>> _get_algorithm_for_directory({"hash_algorithm": "blake2b"})
+    'blake2b-manifest'
+
+    """
+    return config["hash_algorithm"] + MANIFEST_SUFFIX
+
+
+def _compute_hash_of_directory(path, algorithm, config):
+    """Compute the hash of a directory.
+
+    The directory is walked with :func:`os.scandir` and files and directories matching
+    the patterns in ``directory_ignore`` or in a ``.pipelineignore`` file at the top of
+    the directory are skipped. Patterns follow the rules of :mod:`fnmatch`, patterns
+    with a slash are matched against the path relative to the directory, and patterns
+    starting with ``!`` include previously excluded files.
+
+    The hashes of files are stored in a manifest in the hidden build directory with the
+    size and modification time of the file. A file is only hashed again if its size or
+    modification time changed.
+
+    The hash of the directory is the root of a Merkle tree where the hash of a directory
+    is the hash over the names and hashes of its children.
+
+    """
     path = Path(path)
-    if path.is_dir():
-        paths = list(path.rglob("*"))
+    name = algorithm[: -len(MANIFEST_SUFFIX)]
+    ignore_patterns = _collect_ignore_patterns(path, config)
+
+    with _MANIFEST_LOCKS_LOCK:
+        lock = _MANIFEST_LOCKS.setdefault(path.as_posix(), threading.Lock())
+
+    with lock:
+        manifest_path = _get_manifest_path(path, config)
+        manifest = _read_manifest(manifest_path, path, name)
+
+        files = _collect_files_in_directory(path, ignore_patterns)
+
+        algorithms = {
+            relative_path: _get_algorithm_for_size(name, size, config)
+            for relative_path, (_, size, _) in files.items()
+        }
+        outdated_files = [
+            relative_path
+            for relative_path, (_, size, mtime) in files.items()
+            if manifest.get(relative_path, [None] * 4)[:3]
+            != [size, mtime, algorithms[relative_path]]
+        ]
+        with ThreadPoolExecutor(config["n_hashing_threads"]) as executor:
+            hashes = executor.map(
+                lambda x: _compute_hash_of_file(
+                    files[x][0], files[x][2], algorithms[x]
+                ),
+                outdated_files,
+            )
+            for relative_path, hash_ in zip(outdated_files, hashes):
+                _, size, mtime = files[relative_path]
+                algorithm_ = algorithms[relative_path]
+                manifest[relative_path] = [size, mtime, algorithm_, hash_]
+
+        manifest = {relative_path: manifest[relative_path] for relative_path in files}
+        _write_manifest(manifest_path, path, name, manifest)
+
+    return _compute_merkle_root(manifest, name)
+
+
+def _get_declared_columns(id_, dependency, dag, config):
+    """Get the columns which a task declares to read from a columnar dependency.
+
+    Tasks declare the columns with ``columns``. Only Parquet, Arrow, and Feather files
+    and targets without a suffix in one of these formats are hashed by column. For all
+    other dependencies, ``None`` is returned.
+
+    """
+    columns = dag.nodes[id_].get("columns")
+    path = Path(dependency)
+    suffix = path.suffix if path.suffix else "." + config["hidden_target_format"]
+
+    if (
+        IS_PYARROW_INSTALLED
+        and columns
+        and dag.has_edge(dependency, id_)
+        and suffix in COLUMNAR_SUFFIXES
+        and path.is_file()
+    ):
+        declared_columns = ensure_list(columns)
     else:
-        paths = [path]
+        declared_columns = None
+
+    return declared_columns
+
+
+def _compute_hash_of_columns(path, columns, algorithm, config):
+    """Compute the hash of the schema and some columns of a columnar file.
+
+    The hashes of the schema and of every column are computed from the Arrow buffers
+    and stored in a manifest in the hidden build directory with the size and
+    modification time of the file. Only columns which are not in the manifest are read.
+    Thus, the hash of a task changes only if one of its columns or the schema changes
+    and many tasks reading different columns of the same file read every column once.
+
+    """
+    if not algorithm.endswith(COLUMNS_SUFFIX):
+        raise ValueError(f"'{algorithm}' is not an algorithm for columns.")
+    name = algorithm[: -len(COLUMNS_SUFFIX)]
+    path = Path(path)
+
+    with _MANIFEST_LOCKS_LOCK:
+        lock = _MANIFEST_LOCKS.setdefault(path.as_posix(), threading.Lock())
+
+    with lock:
+        stat = path.stat()
+        state = [stat.st_size, stat.st_mtime_ns]
+
+        manifest_path = _get_manifest_path(path, config)
+        manifest = {
+            key: value
+            for key, value in _read_manifest(manifest_path, path, algorithm).items()
+            if value[:2] == state
+        }
+
+        keys = ["schema"] + [f"columns/{column}" for column in columns]
+        missing_columns = [key[8:] for key in keys[1:] if key not in manifest]
+        if "schema" not in manifest or missing_columns:
+            schema_hash, column_hashes = _compute_hashes_of_arrow_columns(
+                path, missing_columns, name, config
+            )
+            manifest["schema"] = [*state, name, schema_hash]
+            for column in missing_columns:
+                manifest[f"columns/{column}"] = [*state, name, column_hashes[column]]
+            _write_manifest(manifest_path, path, algorithm, manifest)
+
+    h = _get_hash_object(name)
+    for key in keys:
+        h.update(key.encode("utf-8") + b"\0")
+        h.update(str(manifest[key][3]).encode("utf-8"))
+
+    return h.hexdigest()
+
+
+def _compute_hashes_of_arrow_columns(path, columns, name, config):
+    """Compute the hashes of the schema and of columns of a Parquet or Arrow file.
+
+    Columns are combined into a single chunk such that the hashes do not depend on
+    row groups or record batches. Declared columns which do not exist raise an error
+    because their changes could not be detected.
+
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    suffix = path.suffix if path.suffix else "." + config["hidden_target_format"]
+    if suffix == ".parquet":
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        schema = parquet_file.schema_arrow
+    else:
+        with pa.memory_map(path.as_posix()) as source:
+            schema = pa.ipc.open_file(source).schema
+
+    unknown_columns = [column for column in columns if column not in schema.names]
+    if unknown_columns:
+        raise ValueError(
+            f"The columns {unknown_columns} are not in '{path.as_posix()}'. Check "
+            "'columns' of the tasks which depend on the file."
+        )
+
+    if suffix == ".parquet":
+        table = parquet_file.read(columns=columns)
+    else:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+
+    description = schema.to_string(
+        show_field_metadata=False, show_schema_metadata=False
+    )
+    schema_hash = _compute_hash_of_string(description, name)
+
+    column_hashes = {}
+    for column in columns:
+        h = _get_hash_object(name)
+        update_hash_with_array(h, table.column(column))
+        column_hashes[column] = h.hexdigest()
+
+    return schema_hash, column_hashes
+
+
+def _collect_ignore_patterns(path, config):
+    patterns = list(config["directory_ignore"])
+    ignore_file = Path(path, IGNORE_FILE)
+    if ignore_file.exists():
+        for line in ignore_file.read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                patterns.append(line)
+
+    return patterns
+
+
+def _is_ignored(relative_path, name, patterns):
+    """Check whether a file or directory is ignored.
+
+    The last matching pattern decides whether a path is ignored.
+
+    Examples
+    --------
+    >>> _is_ignored("a/b.tmp", "b.tmp", ["*.tmp"])
+    True
+    >>> _is_ignored("a/b.tmp", "b.tmp", ["*.tmp", "!a/b.tmp"])
+    False
+    >>> _is_ignored("a/b.csv", "b.csv", ["/b.csv"])
+    False
+    >>> _is_ignored("b.csv", "b.csv", ["/b.csv"])
+    True
+
+    """
+    is_ignored = False
+    for pattern in patterns:
+        is_negated = pattern.startswith("!")
+        pattern = pattern[1:] if is_negated else pattern
+        pattern = pattern.rstrip("/")
+        if "/" in pattern:
+            is_match = fnmatch.fnmatchcase(relative_path, pattern.lstrip("/"))
+        else:
+            is_match = fnmatch.fnmatchcase(name, pattern)
+
+        if is_match:
+            is_ignored = not is_negated
+
+    return is_ignored
+
+
+def _collect_files_in_directory(path, ignore_patterns):
+    """Collect all files which are not ignored in a directory.
+
+    Returns
+    -------
+    files : dict
+        A dictionary mapping relative paths in POSIX format to tuples of the path, the
+        size, and the modification time in nanoseconds of a file.
+
+    """
+    files = {}
+    directories = [(path, "")]
+    while directories:
+        directory, prefix = directories.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative_path = prefix + entry.name
+                if entry.name == IGNORE_FILE or _is_ignored(
+                    relative_path, entry.name, ignore_patterns
+                ):
+                    pass
+                elif entry.is_dir():
+                    directories.append((entry.path, relative_path + "/"))
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[relative_path] = (
+                        Path(entry.path),
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                    )
+
+    return files
+
+
+def _compute_merkle_root(manifest, name):
+    """Compute the root of the Merkle tree of a directory.
+
+    Example
+    -------
+    >>> manifest = {"a.txt": [0, 0, "md5", "1"], "b/c.txt": [0, 0, "md5", "2"]}
+    >>> _compute_merkle_root(manifest, "md5") == _compute_merkle_root(
+    ...     {**manifest, "b/d.txt": [0, 0, "md5", "3"]}, "md5"
+    ... )
+    False
+
+    """
+    tree = {}
+    for relative_path, (_, _, _, hash_) in manifest.items():
+        *parents, file_name = relative_path.split("/")
+        node = tree
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[file_name] = hash_
+
+    def _hash_node(node):
+        h = _get_hash_object(name)
+        for child_name in sorted(node):
+            child = node[child_name]
+            if isinstance(child, dict):
+                h.update(b"d" + child_name.encode("utf-8") + b"\0")
+                h.update(_hash_node(child).encode("utf-8"))
+            else:
+                h.update(b"f" + child_name.encode("utf-8") + b"\0")
+                h.update(child.encode("utf-8"))
+
+        return h.hexdigest()
+
+    return _hash_node(tree)
+
+
+def delete_stale_manifests(dag, config):
+    """Delete manifests of directories which are not part of the DAG anymore."""
+    manifests = {_get_manifest_path(node, config) for node in dag.nodes}
+    directory = Path(config["hidden_build_directory"], "manifests")
+    if directory.exists():
+        for path in directory.glob("*.json"):
+            if path not in manifests:
+                path.unlink()
+
+
+def _get_manifest_path(path, config):
+    name = hashlib.sha256(Path(path).as_posix().encode("utf-8")).hexdigest()[:20]
+    return Path(config["hidden_build_directory"], "manifests", f"{name}.json")
+
+
+def _read_manifest(manifest_path, path, name):
+    """Read the hashes of files in a manifest of a directory.
+
+    The manifest is discarded if it belongs to another directory or algorithm.
+
+    """
+    try:
+        content = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        content = {}
+
+    if content.get("directory") == Path(path).as_posix() and content.get(
+        "algorithm"
+    ) == name:
+        manifest = content["files"]
+    else:
+        manifest = {}
+
+    return manifest
+
 
-    return paths
+def _write_manifest(manifest_path, path, name, manifest):
+    """Write the manifest atomically."""
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    content = {"directory": Path(path).as_posix(), "algorithm": name, "files": manifest}
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(content))
+    os.replace(tmp_path, manifest_path)
 
 
-def create_or_update_hash(first_key, second_key, hash_):
+def create_or_update_hash(first_key, second_key, hash_, algorithm="sha256"):
     try:
         hash_in_db = Hash[first_key, second_key]
     except orm.ObjectNotFound:
-        Hash(task=first_key, dependency=second_key, hash_=hash_)
+        Hash(task=first_key, dependency=second_key, hash_=hash_, algorithm=algorithm)
     else:
-        hash_in_db.hash = hash_
+        hash_in_db.hash_ = hash_
+        hash_in_db.algorithm = algorithm
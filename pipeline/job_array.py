@@ -0,0 +1,59 @@
+"""This module runs one element of a job array.
+
+Batch schedulers start the script once for every element of a job array. The index of
+the element is passed in ``PIPELINE_ARRAY_TASK_ID``. The module does not import pipeline
+such that it works in every environment in which a task can be executed.
+
+"""
+import argparse
+import json
+import os
+import subprocess
+from pathlib import Path
+
+
+def run_array_element(manifest, index):
+    """Run the command of an element of a job array.
+
+    The output of the command is written to the log of the element and the exit status
+    to its status file.
+
+    """
+    element = json.loads(Path(manifest).read_text())["elements"][index]
+    environment = {**os.environ, **element["environment"]}
+
+    with open(element["log"], "w") as log:
+        process = subprocess.run(
+            element["command"], env=environment, stdout=log, stderr=subprocess.STDOUT
+        )
+
+    # Write the status atomically such that it is never read partially.
+    status = Path(element["status"])
+    temporary_status = status.with_name(status.name + ".tmp")
+    temporary_status.write_text(json.dumps({"returncode": process.returncode}))
+    os.replace(temporary_status, status)
+
+    return process.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an element of a job array.")
+    parser.add_argument("manifest")
+    parser.add_argument(
+        "--index",
+        type=int,
+        default=None,
+        help="Index of the element. Defaults to PIPELINE_ARRAY_TASK_ID.",
+    )
+    args = parser.parse_args()
+
+    index = (
+        args.index
+        if args.index is not None
+        else int(os.environ["PIPELINE_ARRAY_TASK_ID"])
+    )
+    run_array_element(args.manifest, index)
+
+
+if __name__ == "__main__":
+    main()
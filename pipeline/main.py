@@ -1,10 +1,20 @@
 from pipeline.dag import create_dag
 from pipeline.database import create_database
-from pipeline.execution import execute_dag_parallelly
-from pipeline.execution import execute_dag_serially
+from pipeline.database import delete_stale_hashes
+from pipeline.database import merge_databases
+from pipeline.database import vacuum_database
+from pipeline.distributed import execute_dag_distributed
+from pipeline.ephemeral import mark_ephemeral_targets
+from pipeline.execution import execute_dag
+from pipeline.executors import create_executor
+from pipeline.fusion import mark_fusable_tasks
+from pipeline.hashing import delete_stale_manifests
+from pipeline.profiling import summarize_profiles
+from pipeline.sampling import mark_sampled_dependencies
 from pipeline.tasks import process_tasks
 from pipeline.tasks import replace_missing_templates_with_correct_paths
 from pipeline.templates import collect_templates
+from pipeline.variants import prune_task_cache
 
 
 def build_project(config):
@@ -14,11 +24,87 @@ def build_project(config):
     env, missing_templates = collect_templates(config["custom_templates"], tasks)
     tasks = replace_missing_templates_with_correct_paths(tasks, missing_templates)
 
+    unknown_tasks = set(config["profile_tasks"]) - set(tasks)
+    if unknown_tasks:
+        raise ValueError(f"Cannot profile unknown tasks: {sorted(unknown_tasks)}.")
+
     dag = create_dag(tasks, config)
+    dag = mark_fusable_tasks(dag, config)
+    dag = mark_sampled_dependencies(dag, config)
+    dag = mark_ephemeral_targets(dag, config)
 
-    if config["n_jobs"] == 1:
-        execute_dag_serially(dag, env, config)
+    if config["distributed"] and not config["_is_debug"]:
+        executed_tasks = execute_dag_distributed(dag, env, config)
     else:
-        execute_dag_parallelly(dag, env, config)
+        executor = create_executor(config)
+        executed_tasks = execute_dag(dag, env, executor, config)
+
+    if config["profile"]:
+        summarize_profiles(executed_tasks, config)
+
+    if config["gc_after_build"]:
+        delete_stale_hashes(dag)
+        delete_stale_manifests(dag, config)
+        if config["_variant"] is not None:
+            prune_task_cache(config, {config["_variant"]: set(tasks)})
 
     return dag
+
+
+def collect_garbage(config, vacuum=False):
+    """Delete hashes and manifests which do not belong to the current DAG.
+
+    Returns
+    -------
+    n_deleted : int
+        The number of deleted hashes.
+
+    """
+    create_database(config)
+
+    tasks = process_tasks(config)
+    _, missing_templates = collect_templates(config["custom_templates"], tasks)
+    tasks = replace_missing_templates_with_correct_paths(tasks, missing_templates)
+
+    dag = create_dag(tasks, config)
+
+    n_deleted = delete_stale_hashes(dag)
+    delete_stale_manifests(dag, config)
+
+    if vacuum:
+        vacuum_database(config)
+
+    return n_deleted
+
+
+def collect_garbage_of_variants(configs):
+    """Delete entries of the variant cache which are not used by any variant.
+
+    Parameters
+    ----------
+    configs : list
+        The workflow configurations of all variants.
+
+    Returns
+    -------
+    n_deleted : int
+        The number of deleted entries.
+
+    """
+    task_ids = {config["_variant"]: set(process_tasks(config)) for config in configs}
+
+    return prune_task_cache(configs[0], task_ids)
+
+
+def merge_hash_databases(paths, config):
+    """Merge the hashes of other builds, for example, shards, into the database.
+
+    Returns
+    -------
+    n_merged : int
+        The number of tasks whose hashes were merged.
+
+    """
+    create_database(config)
+
+    return merge_databases(paths, config)
@@ -0,0 +1,254 @@
+"""This module contains the code to profile tasks.
+
+Python tasks are executed by running this module as a script such that
+:mod:`cProfile` and :mod:`tracemalloc` can be switched on before the rendered task is
+run. R tasks are profiled with ``Rprof``. The profiles are stored next to the
+rendered task in the hidden task directory and summarized after the build.
+
+"""
+import argparse
+import collections
+import cProfile
+import io
+import pstats
+import re
+import runpy
+import sys
+import tracemalloc
+from pathlib import Path
+
+import click
+
+
+PROFILE_MODES = ["cpu", "mem", "all"]
+
+
+def is_task_profiled(id_, config):
+    """Check whether a task should be profiled.
+
+    Examples
+    --------
+    >>> is_task_profiled("a", {"profile": None, "profile_tasks": []})
+    False
+    >>> is_task_profiled("a", {"profile": "cpu", "profile_tasks": []})
+    True
+    >>> is_task_profiled("a", {"profile": "cpu", "profile_tasks": ["b"]})
+    False
+
+    """
+    return config.get("profile") is not None and (
+        not config["profile_tasks"] or id_ in config["profile_tasks"]
+    )
+
+
+def get_profile_paths(id_, config):
+    """Get the paths to the profiles of a task next to the rendered task."""
+    directory = Path(config["hidden_task_directory"])
+    return {
+        "cpu": directory / f"{id_}.cpu.prof",
+        "mem": directory / f"{id_}.mem.prof",
+        "r": directory / f"{id_}.Rprof.out",
+    }
+
+
+def remove_profiles(id_, config):
+    """Remove profiles of previous builds so that they are not summarized again."""
+    for path in get_profile_paths(id_, config).values():
+        if path.exists():
+            path.unlink()
+
+
+def create_profiling_command(id_, path, config):
+    """Create the command which runs a Python task under the requested profilers."""
+    paths = get_profile_paths(id_, config)
+    return [
+        "python",
+        Path(__file__).as_posix(),
+        "--mode",
+        config["profile"],
+        "--cpu-output",
+        paths["cpu"].as_posix(),
+        "--mem-output",
+        paths["mem"].as_posix(),
+        str(path),
+    ]
+
+
+def run_task_with_profilers(path, mode, cpu_output, mem_output):
+    """Run a rendered Python task or a function task with cProfile and/or tracemalloc.
+
+    The task is executed with :func:`runpy.run_path` so that ``if __name__ ==
+    "__main__"`` blocks are executed like with ``python task.py``. Function tasks are
+    executed with :func:`runpy.run_module` like with ``python -m pipeline.functions
+    task.json``.
+
+    """
+    path = Path(path)
+    # The module is executed as a script and cannot import ``FUNCTION_TASK_SUFFIX``.
+    is_function_task = path.suffix == ".json"
+    sys.argv = ["pipeline.functions", str(path)] if is_function_task else [str(path)]
+    sys.path.insert(0, str(path.parent))
+
+    if mode in ["mem", "all"]:
+        tracemalloc.start(10)
+    profiler = cProfile.Profile() if mode in ["cpu", "all"] else None
+
+    try:
+        if profiler is not None:
+            profiler.enable()
+        if is_function_task:
+            runpy.run_module("pipeline.functions", run_name="__main__")
+        else:
+            runpy.run_path(str(path), run_name="__main__")
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cpu_output)
+        if tracemalloc.is_tracing():
+            tracemalloc.take_snapshot().dump(mem_output)
+            tracemalloc.stop()
+
+
+def summarize_profiles(tasks, config):
+    """Print the top-N hotspots of each profiled task and of the whole build.
+
+    Parameters
+    ----------
+    tasks : iterable
+        Ids of the tasks which were executed in this build.
+    config : dict
+        The workflow configuration.
+
+    """
+    n = config["profile_top_n"]
+
+    build_cpu_stats = None
+    build_mem_stats = collections.Counter()
+    build_r_stats = collections.Counter()
+
+    for id_ in sorted(tasks):
+        paths = get_profile_paths(id_, config)
+
+        if paths["cpu"].exists():
+            click.echo(f"\n### CPU hotspots of task '{id_}'\n")
+            click.echo(_format_cpu_stats(str(paths["cpu"]), n))
+            if build_cpu_stats is None:
+                build_cpu_stats = pstats.Stats(str(paths["cpu"]), stream=io.StringIO())
+            else:
+                build_cpu_stats.add(str(paths["cpu"]))
+
+        if paths["mem"].exists():
+            mem_stats = _read_memory_snapshot(paths["mem"])
+            click.echo(f"\n### Memory hotspots of task '{id_}'\n")
+            click.echo(_format_memory_stats(mem_stats, n))
+            build_mem_stats.update(mem_stats)
+
+        if paths["r"].exists():
+            r_stats = _parse_rprof_output(paths["r"].read_text())
+            click.echo(f"\n### CPU hotspots of task '{id_}'\n")
+            click.echo(_format_rprof_stats(r_stats, n))
+            build_r_stats.update(r_stats)
+
+    if build_cpu_stats is not None:
+        click.echo("\n### CPU hotspots of all Python tasks\n")
+        click.echo(_format_cpu_stats(build_cpu_stats, n))
+    if build_mem_stats:
+        click.echo("\n### Memory hotspots of all Python tasks\n")
+        click.echo(_format_memory_stats(build_mem_stats, n))
+    if build_r_stats:
+        click.echo("\n### CPU hotspots of all R tasks\n")
+        click.echo(_format_rprof_stats(build_r_stats, n))
+
+
+def _format_cpu_stats(path_or_stats, n):
+    stream = io.StringIO()
+    if isinstance(path_or_stats, pstats.Stats):
+        stats = path_or_stats
+        stats.stream = stream
+    else:
+        stats = pstats.Stats(path_or_stats, stream=stream)
+    stats.strip_dirs().sort_stats("tottime").print_stats(n)
+
+    return stream.getvalue().strip("\n")
+
+
+def _read_memory_snapshot(path):
+    """Read a tracemalloc snapshot and sum allocated bytes per line of code."""
+    snapshot = tracemalloc.Snapshot.load(str(path))
+    snapshot = snapshot.filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<*"),
+        ]
+    )
+    stats = collections.Counter()
+    for stat in snapshot.statistics("lineno"):
+        frame = stat.traceback[0]
+        stats[f"{frame.filename}:{frame.lineno}"] += stat.size
+
+    return stats
+
+
+def _format_memory_stats(stats, n):
+    """Format memory statistics.
+
+    Example
+    -------
+    >>> _format_memory_stats({"a.py:1": 2048, "b.py:2": 1024}, 1)
+    '      2.0 KiB  a.py:1'
+
+    """
+    lines = [
+        f"{size / 1024:>9.1f} KiB  {location}"
+        for location, size in collections.Counter(stats).most_common(n)
+    ]
+    return "\n".join(lines)
+
+
+def _parse_rprof_output(text):
+    """Parse the output of ``Rprof`` and compute the self time per function in seconds.
+
+    Each sample is one line with the call stack where the innermost function comes
+    first.
+
+    Example
+    -------
+    >>> text = 'sample.interval=20000\\n"mean" "f"\\n"mean" "f"\\n"f"\\n'
+    >>> _parse_rprof_output(text)
+    Counter({'mean': 0.04, 'f': 0.02})
+
+    """
+    lines = text.splitlines()
+    match = re.search(r"sample\.interval=(\d+)", lines[0]) if lines else None
+    interval = int(match.group(1)) / 1e6 if match else 0.02
+
+    stats = collections.Counter()
+    for line in lines[1:]:
+        functions = re.findall(r'"([^"]*)"', line)
+        if functions:
+            stats[functions[0]] = round(stats[functions[0]] + interval, 6)
+
+    return stats
+
+
+def _format_rprof_stats(stats, n):
+    lines = [
+        f"{seconds:>9.2f} s  {function}"
+        for function, seconds in collections.Counter(stats).most_common(n)
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a task under profilers.")
+    parser.add_argument("--mode", choices=PROFILE_MODES, default="cpu")
+    parser.add_argument("--cpu-output", required=True)
+    parser.add_argument("--mem-output", required=True)
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    run_task_with_profilers(args.path, args.mode, args.cpu_output, args.mem_output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""This module contains the code to size parallel builds to the available resources.
+
+Numerical libraries like NumPy's BLAS, statsmodels, or data.table start as many threads
+as the machine has cores. With many parallel jobs, the threads of all tasks compete for
+the cores and the build becomes slower. Thus, every task is started with a limited
+number of threads, ``threads`` of the task or ``threads_per_job``, which is passed via
+the environment variables in :data:`THREAD_ENVIRONMENT_VARIABLES`.
+
+``n_jobs: auto`` derives the number of parallel jobs from the CPUs which are available
+to the process, respecting the CPU affinity and CPU quotas of cgroups, and, optionally,
+from the available memory.
+
+"""
+import os
+from pathlib import Path
+
+
+CGROUP_DIRECTORY = Path("/sys/fs/cgroup")
+
+MEMINFO = Path("/proc/meminfo")
+
+THREAD_ENVIRONMENT_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "R_DATATABLE_NUM_THREADS",
+    "MC_CORES",
+)
+
+_MEMORY_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def count_available_cpus():
+    """Count the CPUs which are available to this process.
+
+    The count is the minimum of the CPUs in the affinity mask of the process and the CPU
+    quota of the cgroup rounded down.
+
+    """
+    try:
+        n_cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        n_cpus = os.cpu_count() or 1
+
+    quota = _read_cgroup_cpu_quota()
+    if quota is not None:
+        n_cpus = min(n_cpus, max(int(quota), 1))
+
+    return n_cpus
+
+
+def _read_cgroup_cpu_quota():
+    """Read the CPU quota of cgroups v2 or v1 in CPUs or ``None`` if unlimited."""
+    path = CGROUP_DIRECTORY / "cpu.max"
+    if path.exists():
+        quota, period = path.read_text().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+
+    path = CGROUP_DIRECTORY / "cpu" / "cpu.cfs_quota_us"
+    if path.exists():
+        quota = int(path.read_text())
+        period = int(path.with_name("cpu.cfs_period_us").read_text())
+        return None if quota < 0 else quota / period
+
+    return None
+
+
+def get_available_memory():
+    """Get the memory in bytes which is available to this process.
+
+    The available memory is the minimum of ``MemAvailable`` and the unused memory limit
+    of the cgroup. If neither is known, ``None`` is returned.
+
+    """
+    candidates = []
+
+    if MEMINFO.exists():
+        for line in MEMINFO.read_text().splitlines():
+            if line.startswith("MemAvailable:"):
+                candidates.append(int(line.split()[1]) * 1024)
+
+    for limit, usage in [
+        ("memory.max", "memory.current"),
+        ("memory/memory.limit_in_bytes", "memory/memory.usage_in_bytes"),
+    ]:
+        limit, usage = CGROUP_DIRECTORY / limit, CGROUP_DIRECTORY / usage
+        if limit.exists() and usage.exists():
+            content = limit.read_text().strip()
+            if content != "max":
+                candidates.append(int(content) - int(usage.read_text()))
+            break
+
+    return min(candidates) if candidates else None
+
+
+def parse_memory(memory):
+    """Parse an amount of memory to bytes.
+
+    Examples
+    --------
+    >>> parse_memory("2G")
+    2147483648
+    >>> parse_memory("512MB")
+    536870912
+    >>> parse_memory(1000)
+    1000
+
+    """
+    if isinstance(memory, (int, float)):
+        return int(memory)
+
+    memory = memory.strip().upper()
+    if memory.endswith("B"):
+        memory = memory[:-1]
+    if memory[-1:] in _MEMORY_UNITS:
+        return int(float(memory[:-1]) * _MEMORY_UNITS[memory[-1]])
+
+    return int(memory)
+
+
+def determine_n_jobs(n_cpus, threads=1, memory_per_job=None):
+    """Determine the number of parallel jobs for ``n_jobs: auto``.
+
+    Every job gets ``threads`` CPUs. If ``memory_per_job`` is given, the number of jobs
+    is limited such that all jobs fit into the available memory.
+
+    Examples
+    --------
+    >>> determine_n_jobs(16, threads=4)
+    4
+
+    """
+    n_jobs = n_cpus // threads
+
+    if memory_per_job is not None:
+        available_memory = get_available_memory()
+        if available_memory is not None:
+            n_jobs = min(n_jobs, available_memory // parse_memory(memory_per_job))
+
+    return max(n_jobs, 1)
+
+
+def create_thread_environment(threads):
+    """Create the environment variables which limit the threads of a task."""
+    return {variable: str(threads) for variable in THREAD_ENVIRONMENT_VARIABLES}
+
+
+def create_r_thread_settings(threads):
+    """Create R code which limits the threads of R tasks executed in this process.
+
+    Environment variables of the process are read by most libraries only once. Thus,
+    the threads of packages which are already loaded are set explicitly if the packages
+    are installed.
+
+    """
+    return (
+        f"options(mc.cores = {threads})\n"
+        "if (requireNamespace('data.table', quietly = TRUE)) "
+        f"data.table::setDTthreads({threads})\n"
+        "if (requireNamespace('RhpcBLASctl', quietly = TRUE)) {\n"
+        f"    RhpcBLASctl::blas_set_num_threads({threads})\n"
+        f"    RhpcBLASctl::omp_set_num_threads({threads})\n"
+        "}\n"
+    )
+
+
+def split_cpus(n_sets):
+    """Split the CPUs of this process into ``n_sets`` disjoint sets.
+
+    The sets consist of neighboring CPUs. If there are fewer CPUs than sets, CPUs are
+    shared between sets. On platforms without CPU affinity, an empty list is returned.
+
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return []
+
+    cpus = sorted(os.sched_getaffinity(0))
+    if n_sets > len(cpus):
+        return [{cpus[i % len(cpus)]} for i in range(n_sets)]
+
+    return [
+        set(cpus[i * len(cpus) // n_sets : (i + 1) * len(cpus) // n_sets])
+        for i in range(n_sets)
+    ]
+
+
+def pin_process_to_cpus(queue):
+    """Pin the current process to a set of CPUs taken from the queue.
+
+    The function is the initializer of the workers of a process pool. Subprocesses of
+    the workers, the tasks, inherit the affinity.
+
+    """
+    os.sched_setaffinity(0, queue.get())
@@ -0,0 +1,63 @@
+"""This module contains the code to build the project on a sample of the data.
+
+During the development of a project, it is often enough to see whether all tasks run
+through. With ``pipeline build --sample 1%`` or ``sample`` in the configuration,
+``load_data`` keeps only a deterministic sample of the rows of data sets which are not
+produced by tasks. All other data sets are derived from the samples.
+
+Sampled builds write their targets and hashes into a separate build directory such that
+they never mix with the results of the full data.
+
+"""
+from pathlib import Path
+
+from pipeline.shared import ensure_list
+
+
+def parse_sample(sample):
+    """Parse the fraction of sampled rows.
+
+    Examples
+    --------
+    >>> parse_sample("1%")
+    0.01
+    >>> parse_sample("0.5")
+    0.5
+    >>> parse_sample(None) is None
+    True
+
+    """
+    if sample is None:
+        return None
+
+    if isinstance(sample, str):
+        sample = sample.strip()
+        fraction = float(sample[:-1]) / 100 if sample.endswith("%") else float(sample)
+    else:
+        fraction = float(sample)
+
+    if not 0 < fraction <= 1:
+        raise ValueError(
+            f"'sample' must be a fraction in (0, 1] or a percentage, but is {sample}."
+        )
+
+    return fraction
+
+
+def mark_sampled_dependencies(dag, config):
+    """Store the dependencies of tasks whose rows are sampled.
+
+    Only dependencies which are not produced by other tasks are sampled.
+
+    """
+    if config["sample"] is not None:
+        for id_ in dag.nodes:
+            task_info = dag.nodes[id_]
+            if task_info["_is_task"]:
+                task_info["_sampled_dependencies"] = [
+                    Path(dependency).as_posix()
+                    for dependency in ensure_list(task_info.get("depends_on", []))
+                    if dag.in_degree(dependency) == 0
+                ]
+
+    return dag
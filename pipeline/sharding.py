@@ -0,0 +1,112 @@
+"""This module contains the code to split a build into shards.
+
+With ``pipeline build --shard i/N``, only the i-th of N shards of the unfinished tasks
+is executed. The shards can be built on separate machines, for example, in a CI matrix,
+and the databases are combined afterwards with ``pipeline merge-db``.
+
+Tasks which depend on each other must be executed in the same shard. Thus, the
+unfinished tasks are split into connected components and the components are assigned
+to shards such that the runtimes of the last executions are balanced. The assignment
+only depends on the DAG and the recorded runtimes and is the same on every machine.
+
+"""
+import statistics
+
+import networkx as nx
+
+from pipeline.database import load_runtimes
+
+
+def parse_shard(shard):
+    """Parse the shard which is selected with ``"i/N"``.
+
+    Examples
+    --------
+    >>> parse_shard("2/4")
+    (2, 4)
+    >>> parse_shard(None) is None
+    True
+
+    """
+    if shard is None:
+        return None
+
+    try:
+        i, n_shards = (int(part) for part in str(shard).split("/"))
+    except ValueError:
+        raise ValueError(f"'shard' must have the form 'i/N', but is '{shard}'.")
+
+    if not 1 <= i <= n_shards:
+        raise ValueError(f"'shard' must satisfy 1 <= i <= N, but is '{shard}'.")
+
+    return i, n_shards
+
+
+def select_shard(dag, unfinished_tasks, config):
+    """Select the unfinished tasks of the shard in the configuration.
+
+    Parameters
+    ----------
+    dag : nx.DiGraph
+        The DAG containing the complete workflow.
+    unfinished_tasks : set
+        The ids of all unfinished tasks.
+    config : dict
+        The workflow configuration.
+
+    Returns
+    -------
+    tasks : set
+        The ids of the unfinished tasks in the shard.
+
+    """
+    i, n_shards = config["shard"]
+    components = _find_connected_components(dag, unfinished_tasks)
+    runtimes = load_runtimes(unfinished_tasks)
+
+    return assign_components_to_shards(components, runtimes, n_shards)[i - 1]
+
+
+def _find_connected_components(dag, unfinished_tasks):
+    """Find groups of unfinished tasks which are connected by their files."""
+    graph = nx.Graph()
+    graph.add_nodes_from(unfinished_tasks)
+    for id_ in unfinished_tasks:
+        for dependency in dag.predecessors(id_):
+            for predecessor in dag.predecessors(dependency):
+                if predecessor in unfinished_tasks:
+                    graph.add_edge(predecessor, id_)
+
+    return [set(component) for component in nx.connected_components(graph)]
+
+
+def assign_components_to_shards(components, runtimes, n_shards):
+    """Assign components of tasks to shards with balanced runtimes.
+
+    Components are assigned from the longest to the shortest to the shard with the
+    smallest total runtime. Tasks without a recorded runtime are assumed to take the
+    median runtime of the other tasks or one second.
+
+    Examples
+    --------
+    >>> components = [{"a"}, {"b", "c"}, {"d"}]
+    >>> shards = assign_components_to_shards(components, {"a": 5, "b": 1}, 2)
+    >>> [sorted(shard) for shard in shards]
+    [['a'], ['b', 'c', 'd']]
+
+    """
+    default = statistics.median(runtimes.values()) if runtimes else 1
+    costs = [
+        sum(runtimes.get(id_, default) for id_ in component) for component in components
+    ]
+
+    shards = [set() for _ in range(n_shards)]
+    loads = [0] * n_shards
+    for cost, component in sorted(
+        zip(costs, components), key=lambda x: (-x[0], min(x[1]))
+    ):
+        index = loads.index(min(loads))
+        shards[index] |= component
+        loads[index] += cost
+
+    return shards
@@ -0,0 +1,274 @@
+"""This module contains the dataset store which shares data sets between tasks.
+
+Many tasks often depend on the same data set and each of them would parse the file on
+its own. If ``dataset_store`` is enabled, a data set which is needed by multiple Python
+tasks is loaded once by the main process and stored as an Arrow IPC stream in shared
+memory. The names of the shared memory blocks are passed to the tasks via the
+environment variable ``PIPELINE_DATASET_STORE`` and ``load_data()`` attaches to them
+instead of reading the file from disk.
+
+Data sets are loaded in the pool of hashing threads such that the scheduling of other
+tasks is not blocked. A task is submitted once its data sets are stored. A data set is
+evicted from the store as soon as all tasks which depend on it have finished.
+
+Whether a file is a data set is decided by its producer. Targets of tasks are only
+shared if the template of the task writes data with ``save_data()``. Targets without a
+suffix are then stored in the ``hidden_target_format``.
+
+"""
+import json
+from pathlib import Path
+
+import jinja2.meta
+import pandas as pd
+
+from pipeline.compression import open_file
+
+try:
+    from multiprocessing import shared_memory
+
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    IS_DATASET_STORE_AVAILABLE = False
+else:
+    IS_DATASET_STORE_AVAILABLE = True
+
+
+ENVIRONMENT_VARIABLE = "PIPELINE_DATASET_STORE"
+
+SHAREABLE_SUFFIXES = [
+    ".arrow",
+    ".csv",
+    ".dta",
+    ".feather",
+    ".ipc",
+    ".parquet",
+    ".pickle",
+    ".pkl",
+]
+
+PICKLE_SUFFIXES = [".pickle", ".pkl"]
+
+DATA_TEMPLATES = ["save_data.py", "save_data.r", "save_data_chunked.py"]
+
+
+class DatasetStore:
+    """Store data sets which are needed by multiple tasks in shared memory.
+
+    Parameters
+    ----------
+    dag : nx.DiGraph
+        The DAG containing the complete workflow.
+    unfinished_tasks : set
+        The ids of the tasks which are executed in this build.
+    env : jinja2.Environment
+        An environment which manages the templates.
+    config : dict
+        The workflow configuration.
+    executor : concurrent.futures.Executor
+        The pool of threads in which data sets are loaded.
+
+    """
+
+    def __init__(self, dag, unfinished_tasks, env, config, executor):
+        if config["dataset_store"] and not IS_DATASET_STORE_AVAILABLE:
+            raise RuntimeError(
+                "The dataset store requires Python 3.8 or higher and 'pyarrow'. Install"
+                " it with `conda install -c conda-forge pyarrow`."
+            )
+        self.hidden_target_format = config["hidden_target_format"]
+        self.consumers = (
+            _count_consumers(dag, unfinished_tasks, env, config)
+            if config["dataset_store"]
+            else {}
+        )
+        self.datasets = {}
+        self.executor = executor
+
+    def acquire(self, id_, dag):
+        """Start loading the shared dependencies of a task.
+
+        Returns
+        -------
+        shared_datasets : dict
+            A dictionary mapping paths of dependencies to futures of shared memory
+            blocks. Pass the futures to :func:`collect_shared_datasets` once they are
+            done.
+
+        """
+        shared_datasets = {}
+        for dependency in dag.predecessors(id_):
+            if self.consumers.get(dependency, 0) > 0:
+                if dependency not in self.datasets:
+                    self.datasets[dependency] = self.executor.submit(
+                        _create_shared_dataset, dependency, self.hidden_target_format
+                    )
+                shared_datasets[dependency] = self.datasets[dependency]
+
+        return shared_datasets
+
+    def release(self, id_, dag):
+        """Release the dependencies of a finished task and evict unused data sets."""
+        for dependency in dag.predecessors(id_):
+            if self.consumers.get(dependency, 0) > 0:
+                self.consumers[dependency] -= 1
+                if self.consumers[dependency] == 0:
+                    self._evict(dependency)
+
+    def close(self):
+        """Evict all data sets."""
+        for dependency in list(self.datasets):
+            self._evict(dependency)
+
+    def _evict(self, dependency):
+        future = self.datasets.pop(dependency, None)
+        shm = None if future is None or future.exception() else future.result()
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def collect_shared_datasets(futures):
+    """Collect the names of the shared memory blocks of finished futures.
+
+    Pickles which do not contain data frames are not stored and loaded from disk.
+
+    """
+    names = {}
+    for dependency, future in futures.items():
+        shm = future.result()
+        if shm is not None:
+            names[dependency] = shm.name
+
+    return names
+
+
+def create_environment_variable(shared_datasets):
+    """Serialize the mapping of paths to shared memory blocks for the subprocess.
+
+    Example
+    -------
+    >>> create_environment_variable({"bld/data.csv": "psm_1234"})
+    '{"bld/data.csv": "psm_1234"}'
+
+    """
+    return json.dumps(shared_datasets)
+
+
+def _count_consumers(dag, unfinished_tasks, env, config):
+    """Count the unfinished Python tasks which depend on each shareable data set.
+
+    Only data sets with at least ``dataset_store_min_consumers`` consumers are stored.
+
+    """
+    consumers = {}
+    for node in dag.nodes:
+        if not dag.nodes[node]["_is_task"] and _is_shareable(node, dag, env, config):
+            n_consumers = sum(
+                1
+                for successor in dag.successors(node)
+                if successor in unfinished_tasks
+                and dag.nodes[successor].get("template", "").endswith(".py")
+            )
+            if n_consumers >= config["dataset_store_min_consumers"]:
+                consumers[node] = n_consumers
+
+    return consumers
+
+
+def _is_shareable(node, dag, env, config):
+    """Check whether a node is a data set which can be stored.
+
+    Files in the project are data sets if their suffix is a format of a data set.
+    Targets of tasks are only data sets if the template of the task writes data with
+    ``save_data()`` such that, for example, pickled models are never stored. Targets
+    without a suffix are written with the ``hidden_target_format``.
+
+    """
+    suffix = Path(node).suffix
+    producers = [task for task in dag.predecessors(node) if dag.nodes[task]["_is_task"]]
+    if not producers:
+        return suffix in SHAREABLE_SUFFIXES
+
+    if not all(_writes_data(dag.nodes[task], env) for task in producers):
+        return False
+
+    suffix = suffix if suffix else f".{config['hidden_target_format']}"
+    return suffix in SHAREABLE_SUFFIXES
+
+
+def _writes_data(task_info, env):
+    """Check whether the template of a task includes a template which saves data."""
+    if "template" not in task_info:
+        return False
+
+    templates = {task_info["template"]}
+    unvisited_templates = [task_info["template"]]
+    while unvisited_templates:
+        source = env.loader.get_source(env, unvisited_templates.pop())[0]
+        for template in jinja2.meta.find_referenced_templates(env.parse(source)):
+            if template is not None and template not in templates:
+                templates.add(template)
+                unvisited_templates.append(template)
+
+    return any(template in templates for template in DATA_TEMPLATES)
+
+
+def _create_shared_dataset(path, hidden_target_format):
+    """Load a data set and write it as an Arrow IPC stream into shared memory.
+
+    Pickles which do not contain data frames are not stored and ``None`` is returned.
+    Tasks read these files from disk.
+
+    """
+    table = _read_table(path, hidden_target_format)
+    if table is None:
+        return None
+
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(sink.size(), 1))
+    stream = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+
+    return shm
+
+
+def _read_table(path, hidden_target_format):
+    """Read a data set like ``load_data()`` and convert it to an Arrow table.
+
+    ``None`` is returned for pickles of objects other than data frames.
+
+    """
+    path = Path(path)
+    suffix = path.suffix if path.suffix else f".{hidden_target_format}"
+
+    if suffix in [".feather", ".arrow", ".ipc"]:
+        table = feather.read_table(path)
+    elif suffix == ".parquet":
+        table = pq.read_table(path)
+    elif suffix == ".dta":
+        with open_file(path) as f:
+            table = pa.Table.from_pandas(pd.read_stata(f))
+    elif suffix == ".csv":
+        with open_file(path) as f:
+            table = pa.Table.from_pandas(pd.read_csv(f))
+    elif suffix in PICKLE_SUFFIXES:
+        with open_file(path) as f:
+            df = pd.read_pickle(f)
+        table = pa.Table.from_pandas(df) if isinstance(df, pd.DataFrame) else None
+    else:
+        raise NotImplementedError
+
+    return table
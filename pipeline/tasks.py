@@ -5,10 +5,18 @@ import jinja2
 
 from pipeline._yaml import read_yaml
 from pipeline.exceptions import DuplicatedTaskError
+from pipeline.functions import collect_function_tasks
 
 
 def process_tasks(config):
     user_defined_tasks = _collect_user_defined_tasks(config)
+    function_tasks = collect_function_tasks(config)
+
+    duplicated_ids = set(user_defined_tasks) & set(function_tasks)
+    if duplicated_ids:
+        raise DuplicatedTaskError(duplicated_ids)
+    user_defined_tasks.update(function_tasks)
+
     tasks = _add_default_output_path(user_defined_tasks, config)
     tasks = _replace_task_dependencies_with_task_outputs(tasks)
 
@@ -17,7 +25,7 @@ def process_tasks(config):
 
 def replace_missing_templates_with_correct_paths(tasks, missing_templates):
     for id_ in tasks:
-        if tasks[id_]["template"] in missing_templates:
+        if tasks[id_].get("template") in missing_templates:
             tasks[id_]["template"] = missing_templates[tasks[id_]["template"]]
 
     return tasks
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import jinja2
+from pipeline.compression import MAGIC_NUMBERS
 from pipeline.shared import ensure_list
 import numbers
 
@@ -37,6 +38,9 @@ def collect_templates(custom_templates, tasks=None):
     register_as_template_function(ensure_list)
     register_as_template_function(ensure_r_vector)
 
+    # Templates detect compressed files with the same magic numbers as pipeline.
+    env.globals["COMPRESSION_MAGIC_NUMBERS"] = MAGIC_NUMBERS
+
     return env, missing_templates
 
 
@@ -45,7 +49,7 @@ def _collect_missing_templates(tasks, custom, internal):
 
     missing_templates = {}
     for task_info in tasks.values():
-        if task_info["template"] not in existing_templates:
+        if "template" in task_info and task_info["template"] not in existing_templates:
             path = (Path(task_info["config"]).parent / task_info["template"]).as_posix()
             missing_templates[task_info["template"]] = path
 
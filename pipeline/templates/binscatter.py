@@ -0,0 +1,26 @@
+"""Binned scatter plot with the means of ``y`` within quantile bins of ``x``."""
+
+{% extends 'figure.py' %}
+
+{% block columns %}{{ columns | default([x, y]) }}{% endblock %}
+
+{% block plot %}
+    import numpy as np
+
+    df = df[["{{ x }}", "{{ y }}"]].dropna()
+    x = df["{{ x }}"].to_numpy()
+    y = df["{{ y }}"].to_numpy()
+
+    n_bins = {{ n_bins | default(20) }}
+    edges = np.quantile(x, np.linspace(0, 1, n_bins + 1))
+    bins = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, n_bins - 1)
+
+    # Bins are empty if quantiles coincide, for example, for discrete variables.
+    counts = np.bincount(bins, minlength=n_bins)
+    is_filled = counts > 0
+    x_means = np.bincount(bins, weights=x, minlength=n_bins)[is_filled]
+    y_means = np.bincount(bins, weights=y, minlength=n_bins)[is_filled]
+
+    ax.scatter(x_means / counts[is_filled], y_means / counts[is_filled])
+    ax.set(xlabel="{{ x }}", ylabel="{{ y }}")
+{% endblock %}
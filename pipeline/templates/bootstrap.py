@@ -0,0 +1,86 @@
+import joblib
+import numpy as np
+import patsy
+import statsmodels.api as sm
+
+
+{% include 'load_data.py' %}
+
+
+{% include 'save_data.py' %}
+
+
+FAMILIES = {
+    "logit": sm.families.Binomial(sm.families.links.Logit()),
+    "probit": sm.families.Binomial(sm.families.links.Probit()),
+}
+
+
+def fit_replication(y, x, seed, model):
+    """Fit the model on one case resample.
+
+    The resample is drawn as an array of indices and converted to frequency weights
+    such that the data is never copied.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_obs = len(y)
+    weights = np.bincount(rng.integers(0, n_obs, n_obs), minlength=n_obs)
+
+    if model == "ols":
+        # The weighted cross-products are summed without a weighted copy of ``x``.
+        xtwx = np.einsum("ij,i,ik->jk", x, weights, x)
+        xtwy = x.T @ (weights * y)
+        params = np.linalg.lstsq(xtwx, xtwy, rcond=None)[0]
+    elif model in FAMILIES:
+        glm = sm.GLM(y, x, family=FAMILIES[model], freq_weights=weights)
+        params = glm.fit().params
+    else:
+        raise NotImplementedError(f"Model '{model}' is not supported.")
+
+    return params
+
+
+def fit_replications(y, x, seeds, model):
+    return np.vstack([fit_replication(y, x, seed, model) for seed in seeds])
+
+
+def bootstrap(df):
+    y, x = patsy.dmatrices("{{ formula }}", data=df, return_type="dataframe")
+    columns = x.columns
+    y = y.to_numpy()[:, 0]
+    x = x.to_numpy()
+
+    # Every replication has its own seed such that the results do not depend on the
+    # number of jobs.
+    seeds = np.random.SeedSequence({{ seed | default(0) }}).spawn(
+        {{ n_replications | default(1000) }}
+    )
+    n_jobs = {{ bootstrap_n_jobs | default(1) }}
+    chunks = np.array_split(np.arange(len(seeds)), n_jobs)
+
+    results = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(fit_replications)(
+            y, x, [seeds[i] for i in chunk], "{{ model | default('ols') }}"
+        )
+        for chunk in chunks
+        if len(chunk)
+    )
+    coefficients = pd.DataFrame(np.vstack(results), columns=columns)
+    coefficients.index.name = "replication"
+
+    return coefficients
+
+
+def main():
+    df = load_data(
+        "{{ depends_on }}",
+        columns={{ columns | default(None) }},
+        filters={{ filters | default(None) }},
+    )
+    coefficients = bootstrap(df)
+    save_data(coefficients, "{{ produces }}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 
 {% extends 'figure.py' %}
 
+{% block columns %}{{ columns | default([a]) }}{% endblock %}
+
 {% block plot %}
     import seaborn as sns
 
@@ -1,5 +1,4 @@
 import numpy as np
-import joblib
 import pandas as pd
 import statsmodels.formula.api as smf
 
@@ -7,19 +6,27 @@ import statsmodels.formula.api as smf
 {% include 'load_data.py' %}
 
 
+{% include 'save_model.py' %}
+
+
 def fit_model(df):
     {% block estimation_method %}{% endblock %}
     return model
 
 
-def save_model(model):
-    joblib.dump(model, "{{ produces }}")
-
-
 def main():
-    df = load_data("{{ depends_on }}")
+    df = load_data(
+        "{{ depends_on }}",
+        columns={{ columns | default(None) }},
+        filters={{ filters | default(None) }},
+    )
     model = fit_model(df)
-    save_model(model)
+    save_model(
+        model,
+        "{{ produces }}",
+        remove_data={{ remove_data | default(False) }},
+        compress={{ compress | default(0) }},
+    )
 
 
 if __name__ == "__main__":
@@ -2,7 +2,10 @@ suppressMessages(library(tidyverse))
 
 {% include 'load_data.r' %}
 
-df = suppressMessages(load_data("{{ depends_on }}"))
+df = suppressMessages(load_data(
+    "{{ depends_on }}",
+    columns={{ ensure_r_vector(columns) if columns is defined else "NULL" }}
+))
 
 # df %>% mutate_if(is.character, as.factor) -> df
 
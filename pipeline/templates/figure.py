@@ -1,3 +1,7 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
 import matplotlib.pyplot as plt
 
 
@@ -13,5 +17,9 @@ def plot(df):
 
 
 if __name__ == '__main__':
-    df = load_data("{{ depends_on }}")
+    df = load_data(
+        "{{ depends_on }}",
+        columns={% block columns %}{{ columns | default(None) }}{% endblock %},
+        filters={{ filters | default(None) }},
+    )
     plot(df)
@@ -0,0 +1,19 @@
+"""Aligned with https://matplotlib.org/api/_as_gen/matplotlib.axes.Axes.hexbin.html."""
+
+{% extends 'figure.py' %}
+
+{% block columns %}{{ columns | default([x, y]) }}{% endblock %}
+
+{% block plot %}
+    df = df[["{{ x }}", "{{ y }}"]].dropna()
+
+    collection = ax.hexbin(
+        df["{{ x }}"].to_numpy(),
+        df["{{ y }}"].to_numpy(),
+        gridsize={{ gridsize | default(50) }},
+        bins={{ '"log"' if log | default(True) else None }},
+        mincnt=1,
+    )
+    fig.colorbar(collection, ax=ax, label="Count")
+    ax.set(xlabel="{{ x }}", ylabel="{{ y }}")
+{% endblock %}
@@ -0,0 +1,21 @@
+"""Aligned with https://matplotlib.org/api/_as_gen/matplotlib.axes.Axes.hist2d.html."""
+
+{% extends 'figure.py' %}
+
+{% block columns %}{{ columns | default([x, y]) }}{% endblock %}
+
+{% block plot %}
+    from matplotlib.colors import LogNorm
+
+    df = df[["{{ x }}", "{{ y }}"]].dropna()
+
+    *_, image = ax.hist2d(
+        df["{{ x }}"].to_numpy(),
+        df["{{ y }}"].to_numpy(),
+        bins={{ bins | default(50) }},
+        cmin=1,
+        norm={{ "LogNorm()" if log | default(True) else None }},
+    )
+    fig.colorbar(image, ax=ax, label="Count")
+    ax.set(xlabel="{{ x }}", ylabel="{{ y }}")
+{% endblock %}
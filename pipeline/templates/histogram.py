@@ -0,0 +1,15 @@
+"""Density of a variable estimated with a histogram."""
+
+{% extends 'figure.py' %}
+
+{% block columns %}{{ columns | default([a]) }}{% endblock %}
+
+{% block plot %}
+    import numpy as np
+
+    values = df["{{ a }}"].dropna().to_numpy()
+    density, edges = np.histogram(values, bins={{ bins | default(50) }}, density=True)
+
+    ax.stairs(density, edges, fill=True)
+    ax.set(xlabel="{{ a }}", ylabel="Density")
+{% endblock %}
@@ -1,21 +1,144 @@
+import json
+import os
 from pathlib import Path
 import pandas as pd
 
 
-def load_data(path):
+def load_data(path, columns=None, filters=None):
+    """Load a data set.
+
+    ``columns`` selects a subset of columns and ``filters`` selects rows, for example,
+    ``[("year", ">=", 2000)]``. For Parquet, Feather, and Arrow files, only the
+    requested columns and row groups are read. Files without a suffix are read with the
+    format in ``hidden_target_format``. Compressed CSV, Stata, and pickle files are
+    decompressed transparently. Data sets in the dataset store of the build are
+    read from shared memory. Tasks which are executed in a batch load every data set
+    only once.
+
+    """
     path = Path(path)
 
-    if path.suffix == ".feather":
-        df = pd.read_feather(path)
-    elif path.suffix == ".dta":
-        df = pd.read_stata(path)
-    elif path.suffix == ".csv" or path.suffix == "":
-        df = pd.read_csv(path)
-    elif path.suffix in [".pkl", ".pickle"]:
-        df = pd.read_pickle(path)
-    elif path.suffix == ".sav":
-        df = pd.read_spss(path)
+    cache = globals().get("__pipeline_data_cache__")
+    key = (path.as_posix(), repr(columns), repr(filters))
+    if cache is not None and key in cache:
+        return cache[key].copy()
+
+    {% if sample %}
+    if path.as_posix() in {{ _sampled_dependencies | default([]) }}:
+        df = _load_sample(path, columns, filters)
+    else:
+        df = _load_data(path, columns, filters)
+    {% else %}
+    df = _load_data(path, columns, filters)
+    {% endif %}
+
+    if cache is not None:
+        cache[key] = df
+        df = df.copy()
+
+    return df
+
+
+def _load_data(path, columns, filters):
+    suffix = path.suffix if path.suffix else ".{{ hidden_target_format }}"
+
+    shared_datasets = json.loads(os.environ.get("PIPELINE_DATASET_STORE", "{}"))
+    if path.as_posix() in shared_datasets:
+        return _load_shared_dataset(shared_datasets[path.as_posix()], columns, filters)
+
+    if filters is not None and suffix not in [".feather", ".arrow", ".ipc", ".parquet"]:
+        raise NotImplementedError(
+            "Filters are only supported for Parquet, Feather, and Arrow files."
+        )
+
+    if suffix in [".feather", ".arrow", ".ipc"]:
+        df = _load_arrow_file(path, columns, filters)
+    elif suffix == ".parquet":
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+    elif suffix == ".dta":
+        with _open_file(path) as f:
+            df = pd.read_stata(f, columns=columns)
+    elif suffix == ".csv":
+        with _open_file(path) as f:
+            df = pd.read_csv(f, usecols=columns)
+    elif suffix in [".pkl", ".pickle"]:
+        with _open_file(path) as f:
+            df = pd.read_pickle(f)
+        df = df if columns is None else df[columns]
+    elif suffix == ".sav":
+        df = pd.read_spss(path, usecols=columns)
     else:
         raise NotImplementedError
 
     return df
+
+
+{% if sample %}
+def _load_sample(path, columns, filters):
+    """Load a deterministic sample of the rows of a data set.
+
+    Rows are drawn with a fixed seed. If ``sample_by`` is set, the rows are sampled by
+    the hashes of these columns such that the same units are kept in all data sets.
+
+    """
+    import numpy as np
+
+    sample_by = {{ ensure_list(sample_by) if sample_by else None }}
+    if sample_by is not None and columns is not None:
+        df = _load_data(path, list(dict.fromkeys(columns + sample_by)), filters)
+    else:
+        df = _load_data(path, columns, filters)
+
+    if sample_by is None:
+        draws = np.random.default_rng({{ sample_seed }}).random(len(df))
+    else:
+        hashes = pd.util.hash_pandas_object(df[sample_by], index=False).to_numpy()
+        # Rehash with the seed to draw another sample of units.
+        draws = pd.util.hash_array(hashes + np.uint64({{ sample_seed }})) / 2 ** 64
+    df = df.loc[draws < {{ sample }}]
+
+    return df if columns is None else df[columns]
+{% endif %}
+
+
+{% include 'open_compressed_file.py' %}
+
+
+def _load_arrow_file(path, columns, filters):
+    """Load an Arrow IPC or Feather file which is memory-mapped."""
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    if filters is not None:
+        table = table.filter(pq.filters_to_expression(filters))
+
+    return table.to_pandas()
+
+
+_SHARED_MEMORY_BLOCKS = []
+
+
+def _load_shared_dataset(name, columns, filters):
+    """Load a data set from the dataset store without copying the Arrow buffers."""
+    from multiprocessing import resource_tracker
+    from multiprocessing import shared_memory
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, the block would be unlinked when the task exits.
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+    # Data frames may point to the block which must stay open until the task ends.
+    _SHARED_MEMORY_BLOCKS.append(shm)
+
+    table = pa.ipc.open_stream(pa.py_buffer(shm.buf)).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    if filters is not None:
+        table = table.filter(pq.filters_to_expression(filters))
+
+    return table.to_pandas()
@@ -3,16 +3,93 @@ library(tools)
 library(feather)
 
 
-load_data <- function(path){
-    if (file_ext(path) == "feather") {
-        df <- read_feather(path)
-    } else if (file_ext(path) %in% c("csv", "")) {
-        df <- read_csv(path)
-    } else if (file_ext(path) == "rds") {
+load_data <- function(path, columns=NULL){
+    {% if sample %}
+    is_sampled <- path %in% {{ ensure_r_vector(_sampled_dependencies | default([])) }}
+    sample_by <- {{ ensure_r_vector(ensure_list(sample_by)) if sample_by else "NULL" }}
+    requested_columns <- columns
+    if (is_sampled && !is.null(columns) && !is.null(sample_by)) {
+        columns <- union(columns, sample_by)
+    }
+
+    {% endif %}
+    # Files without a suffix are read with the format in 'hidden_target_format'.
+    suffix <- if (file_ext(path) == "") "{{ hidden_target_format }}" else file_ext(path)
+
+    if (suffix == "feather") {
+        df <- read_feather(path, columns=columns)
+    } else if (suffix %in% c("arrow", "ipc") && is.null(columns)) {
+        df <- arrow::read_feather(path, mmap=TRUE)
+    } else if (suffix %in% c("arrow", "ipc")) {
+        df <- arrow::read_feather(
+            path, col_select=tidyselect::all_of(columns), mmap=TRUE
+        )
+    } else if (suffix == "parquet" && is.null(columns)) {
+        df <- arrow::read_parquet(path)
+    } else if (suffix == "parquet") {
+        df <- arrow::read_parquet(path, col_select=tidyselect::all_of(columns))
+    } else if (suffix == "csv") {
+        df <- read_csv_file(path)
+    } else if (suffix == "rds") {
         df <- readRDS(path)
     } else {
         stop("NotImplementedError")
     }
 
+    {% if sample %}
+    if (is_sampled) {
+        df <- sample_rows(df, sample_by)
+        columns <- requested_columns
+    }
+
+    {% endif %}
+    if (!is.null(columns)) {
+        df <- df[columns]
+    }
+
     return(df)
 }
+
+
+read_csv_file <- function(path){
+    # Compressed files are detected by the magic number at the start of the file. gzip
+    # is read by R itself, zstd and lz4 require the arrow package.
+    header <- readBin(path, "raw", n=4)
+    if (identical(header, as.raw(c(0x28, 0xb5, 0x2f, 0xfd)))) {
+        df <- read_compressed_csv(path, "zstd")
+    } else if (identical(header, as.raw(c(0x04, 0x22, 0x4d, 0x18)))) {
+        df <- read_compressed_csv(path, "lz4")
+    } else if (identical(header[1:2], as.raw(c(0x1f, 0x8b)))) {
+        df <- read_csv(gzfile(path))
+    } else {
+        df <- read_csv(path)
+    }
+
+    return(df)
+}
+
+
+read_compressed_csv <- function(path, codec){
+    stream <- arrow::CompressedInputStream$create(path, codec=codec)
+    df <- arrow::read_csv_arrow(stream)
+    stream$close()
+
+    return(df)
+}
+{% if sample %}
+
+
+sample_rows <- function(df, sample_by){
+    # Rows are drawn with a fixed seed. If 'sample_by' is set, the rows are sampled by
+    # the hashes of these columns such that the same units are kept in all data sets.
+    if (is.null(sample_by)) {
+        set.seed({{ sample_seed }})
+        draws <- runif(nrow(df))
+    } else {
+        keys <- do.call(paste, c(as.list(df[sample_by]), sep="\r"))
+        draws <- (digest::digest2int(keys, {{ sample_seed }}L) %% 1000000L) / 1000000
+    }
+
+    return(df[draws < {{ sample }}, ])
+}
+{% endif %}
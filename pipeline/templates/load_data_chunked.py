@@ -0,0 +1,59 @@
+from pathlib import Path
+import pandas as pd
+
+
+def iter_data_chunks(path, chunksize=100_000, columns=None, filters=None):
+    """Iterate over a data set in chunks of ``chunksize`` rows.
+
+    Only one chunk is held in memory at a time. ``columns`` and ``filters`` have the same
+    meaning as in ``load_data()``. Parquet, Feather, and Arrow files are read as record
+    batches with :mod:`pyarrow.dataset`. Files without a suffix are read with the format
+    in ``hidden_target_format``. Compressed CSV and Stata files are decompressed
+    transparently. If no rows are selected, one empty chunk with the selected columns is
+    yielded.
+
+    """
+    path = Path(path)
+    suffix = path.suffix if path.suffix else ".{{ hidden_target_format }}"
+
+    if filters is not None and suffix not in [".feather", ".arrow", ".ipc", ".parquet"]:
+        raise NotImplementedError(
+            "Filters are only supported for Parquet, Feather, and Arrow files."
+        )
+
+    if suffix in [".feather", ".arrow", ".ipc", ".parquet"]:
+        yield from _iter_arrow_batches(path, suffix, chunksize, columns, filters)
+    elif suffix in [".csv", ".dta"]:
+        with _open_file(path) as f:
+            if suffix == ".csv":
+                chunks = pd.read_csv(f, usecols=columns, chunksize=chunksize)
+            else:
+                chunks = pd.read_stata(f, columns=columns, chunksize=chunksize)
+            with chunks:
+                yield from chunks
+    else:
+        raise NotImplementedError(f"Files with suffix '{suffix}' cannot be streamed.")
+
+
+def _iter_arrow_batches(path, suffix, chunksize, columns, filters):
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    format_ = "parquet" if suffix == ".parquet" else "ipc"
+    dataset = ds.dataset(path, format=format_)
+    filter_ = None if filters is None else pq.filters_to_expression(filters)
+
+    is_empty = True
+    for batch in dataset.to_batches(
+        columns=columns, filter=filter_, batch_size=chunksize
+    ):
+        if batch.num_rows:
+            is_empty = False
+            yield batch.to_pandas()
+
+    # Like pandas for CSV files, yield an empty chunk with the schema of the selection.
+    if is_empty:
+        yield dataset.head(0, columns=columns, filter=filter_).to_pandas()
+
+
+{% include 'open_compressed_file.py' %}
@@ -0,0 +1,107 @@
+import numpy as np
+import patsy
+import statsmodels.api as sm
+
+
+{% include 'load_data.py' %}
+
+
+{% include 'save_model.py' %}
+
+
+def absorb_fixed_effects(matrix, codes, tolerance, max_iterations):
+    """Subtract the group means of multiple fixed effects with alternating projections.
+
+    The columns of ``matrix`` are demeaned within the groups of one fixed effect after
+    another until the largest group mean is smaller than ``tolerance``. Group means are
+    computed with :func:`numpy.bincount` such that no dummy variables are created.
+
+    """
+    matrix = matrix.copy()
+    counts = [np.bincount(code) for code in codes]
+
+    for _ in range(max_iterations):
+        largest_mean = 0
+        for code, count in zip(codes, counts):
+            means = np.column_stack(
+                [
+                    np.bincount(code, weights=matrix[:, j], minlength=len(count))
+                    for j in range(matrix.shape[1])
+                ]
+            )
+            means /= count[:, None]
+            matrix -= means[code]
+            largest_mean = max(largest_mean, np.abs(means).max())
+
+        # One fixed effect is absorbed exactly in a single iteration.
+        if len(codes) == 1 or largest_mean < tolerance:
+            break
+    else:
+        raise RuntimeError(
+            f"Fixed effects were not absorbed after {max_iterations} iterations."
+        )
+
+    return matrix
+
+
+def fit_model(df):
+    absorb = {{ ensure_list(absorb) }}
+    {% if cluster is defined %}
+    cluster = {{ ensure_list(cluster) }}
+    {% else %}
+    cluster = absorb[:1]
+    {% endif %}
+    df = df.dropna(subset=list(dict.fromkeys(absorb + cluster)))
+
+    # Fixed effects replace the intercept. The design is built with an intercept such
+    # that categorical regressors drop a reference level which would be collinear with
+    # the fixed effects.
+    description = patsy.ModelDesc.from_formula("{{ formula }}")
+    if patsy.INTERCEPT not in description.rhs_termlist:
+        description.rhs_termlist.insert(0, patsy.INTERCEPT)
+    y, x = patsy.dmatrices(
+        description, data=df, NA_action="drop", return_type="dataframe"
+    )
+    x = x.drop(columns="Intercept")
+    df = df.loc[y.index]
+
+    codes = [df[column].factorize()[0] for column in absorb]
+    demeaned = absorb_fixed_effects(
+        np.column_stack([y, x]),
+        codes,
+        tolerance={{ fe_tolerance | default(1e-8) }},
+        max_iterations={{ fe_max_iterations | default(10000) }},
+    )
+    y.iloc[:, 0] = demeaned[:, 0]
+    x.iloc[:, :] = demeaned[:, 1:]
+
+    model = sm.OLS(y, x)
+    # Every fixed effect except the first one has a redundant level.
+    n_absorbed = sum(code.max() + 1 for code in codes) - (len(codes) - 1)
+    model.df_resid = len(y) - x.shape[1] - n_absorbed
+    model.df_model = x.shape[1]
+
+    groups = np.column_stack([df[column].factorize()[0] for column in cluster])
+    groups = groups[:, 0] if len(cluster) == 1 else groups
+    result = model.fit(cov_type="cluster", cov_kwds={"groups": groups})
+
+    return result
+
+
+def main():
+    df = load_data(
+        "{{ depends_on }}",
+        columns={{ columns | default(None) }},
+        filters={{ filters | default(None) }},
+    )
+    model = fit_model(df)
+    save_model(
+        model,
+        "{{ produces }}",
+        remove_data={{ remove_data | default(False) }},
+        compress={{ compress | default(0) }},
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+{% extends 'estimation.r' %}
+
+{% block estimation_method %}
+{% set absorb = ensure_list(absorb) %}
+{% set cluster = ensure_list(cluster) if cluster is defined else absorb[:1] %}
+model = lfe::felm(
+    {{ formula }} | {{ absorb | join(" + ") }} | 0 | {{ cluster | join(" + ") }},
+    data=df
+)
+{% endblock %}
@@ -0,0 +1,156 @@
+import numpy as np
+import patsy
+import statsmodels.api as sm
+from statsmodels.regression.linear_model import OLSResults
+from statsmodels.regression.linear_model import RegressionResultsWrapper
+
+
+{% include 'load_data.py' %}
+
+
+{% include 'save_model.py' %}
+
+
+def create_formulas():
+    {% if formulas is defined %}
+    formulas = {{ ensure_list(formulas) }}
+    {% else %}
+    formulas = [
+        f"{outcome} ~ {regressors}"
+        for outcome in {{ ensure_list(outcomes) }}
+        for regressors in {{ ensure_list(regressors) }}
+    ]
+    {% endif %}
+    return formulas
+
+
+def create_design_matrices(formulas, df):
+    """Create the design matrices of all specifications.
+
+    Specifications with the same regressors share one design matrix. Each design matrix
+    is built from the regressors of the formula alone such that patsy codes categorical
+    variables and interactions like for a single model. Missing values are kept and
+    handled for each specification separately.
+
+    """
+    na_action = patsy.NAAction(NA_types=[])
+    descriptions = [patsy.ModelDesc.from_formula(formula) for formula in formulas]
+
+    designs = {}
+    outcomes = {}
+    specifications = []
+    for d in descriptions:
+        regressors = tuple(d.rhs_termlist)
+        if regressors not in designs:
+            designs[regressors] = patsy.dmatrix(
+                patsy.ModelDesc([], d.rhs_termlist),
+                df,
+                NA_action=na_action,
+                return_type="dataframe",
+            )
+
+        outcome = tuple(d.lhs_termlist)
+        if outcome not in outcomes:
+            outcomes[outcome] = patsy.dmatrix(
+                patsy.ModelDesc([], d.lhs_termlist),
+                df,
+                NA_action=na_action,
+                return_type="dataframe",
+            ).iloc[:, 0]
+
+        specifications.append((outcomes[outcome], regressors))
+
+    return designs, specifications
+
+
+def fit_models(formulas, df):
+    """Fit all specifications.
+
+    Specifications with the same regressors and observations share the QR decomposition
+    of the design matrix and are solved together for all outcomes.
+
+    """
+    designs, specifications = create_design_matrices(formulas, df)
+
+    groups = {}
+    for i, (outcome, regressors) in enumerate(specifications):
+        exog = designs[regressors]
+        mask = exog.notna().all(axis=1).to_numpy() & outcome.notna().to_numpy()
+        key = (regressors, mask.tobytes())
+        groups.setdefault(key, (mask, []))[1].append(i)
+
+    models = [None] * len(specifications)
+    for (regressors, _), (mask, indices) in groups.items():
+        exog = designs[regressors].loc[mask]
+        endogs = [specifications[i][0][mask] for i in indices]
+        for i, model in zip(indices, fit_ols_batch(exog, endogs)):
+            models[i] = model
+
+    return models
+
+
+def fit_ols_batch(exog, endogs):
+    """Fit OLS models with the same design matrix and return statsmodels' results."""
+    x = exog.to_numpy()
+    y = np.column_stack([endog.to_numpy() for endog in endogs])
+
+    q, r = np.linalg.qr(x)
+    rank = np.linalg.matrix_rank(r)
+    if rank == x.shape[1]:
+        r_inv = np.linalg.inv(r)
+        pinv_x = r_inv @ q.T
+        normalized_cov_params = r_inv @ r_inv.T
+    else:
+        pinv_x = np.linalg.pinv(x)
+        normalized_cov_params = pinv_x @ pinv_x.T
+    params = pinv_x @ y
+
+    results = []
+    for j, endog in enumerate(endogs):
+        model = sm.OLS(endog, exog)
+        model.rank = rank
+        model.pinv_wexog = pinv_x
+        model.normalized_cov_params = normalized_cov_params
+        model.df_model = rank - model.k_constant
+        model.df_resid = model.nobs - rank
+
+        result = OLSResults(
+            model,
+            params[:, j],
+            normalized_cov_params=normalized_cov_params,
+            cov_type="{{ cov_type | default('nonrobust') }}",
+        )
+        results.append(RegressionResultsWrapper(result))
+
+    return results
+
+
+def save_models(models):
+    paths = {{ ensure_list(produces) }}
+    if len(paths) != len(models):
+        raise ValueError(
+            f"The task produces {len(paths)} files, but has {len(models)} models."
+        )
+
+    for model, path in zip(models, paths):
+        save_model(
+            model,
+            path,
+            remove_data={{ remove_data | default(False) }},
+            compress={{ compress | default(0) }},
+        )
+
+
+def main():
+    formulas = create_formulas()
+    df = load_data(
+        "{{ depends_on }}",
+        columns={{ columns | default(None) }},
+        filters={{ filters | default(None) }},
+    )
+    models = fit_models(formulas, df)
+    save_models(models)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+def _open_file(path):
+    """Open a file for reading and decompress it if it is compressed.
+
+    The compression is detected by the magic number at the start of the file.
+
+    """
+    with open(path, "rb") as f:
+        header = f.read(4)
+
+    magic_numbers = {{ COMPRESSION_MAGIC_NUMBERS }}
+    compression = next(
+        (name for name, number in magic_numbers.items() if header.startswith(number)),
+        None,
+    )
+
+    return _open_compressed_file(path, compression, "rb")
+
+
+def _open_compressed_file(path, compression, mode="wb"):
+    """Open a file with a compression or without if it is ``None``.
+
+    gzip uses the fastest compression level because intermediate targets are written and
+    read more often than stored. The modification time is not written into gzip files
+    such that equal data sets have equal hashes.
+
+    """
+    if compression == "zstd":
+        import zstandard
+
+        f = zstandard.open(path, mode)
+    elif compression == "lz4":
+        import lz4.frame
+
+        f = lz4.frame.open(path, mode)
+    elif compression == "gzip":
+        import gzip
+
+        f = gzip.GzipFile(path, mode, compresslevel=1, mtime=0)
+    else:
+        f = open(path, mode)
+
+    return f
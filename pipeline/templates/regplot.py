@@ -2,9 +2,19 @@
 
 {% extends 'figure.py' %}
 
+{% block columns %}{{ columns | default([x, y]) }}{% endblock %}
+
 {% block plot %}
     import seaborn as sns
 
+    {% set lowess_sample_size = lowess_sample_size | default(10000) %}
+    {% if lowess_sample_size %}
+    # LOWESS scales quadratically with the number of observations. A fixed random
+    # sample keeps the figure reproducible.
+    if len(df) > {{ lowess_sample_size }}:
+        df = df.sample({{ lowess_sample_size }}, random_state={{ seed | default(0) }})
+    {% endif %}
+
     sns.regplot(
         x="{{ x }}", y="{{ y }}",
         data=df,
@@ -2,17 +2,42 @@ from pathlib import Path
 
 
 def save_data(df, path):
+    """Save a data set.
+
+    Files without a suffix are written with the format in ``hidden_target_format`` and
+    compressed with ``hidden_target_compression``. Arrow files are not compressed so
+    that they can be memory-mapped.
+
+    """
     path = Path(path)
+    suffix = path.suffix if path.suffix else ".{{ hidden_target_format }}"
+    compression = None if path.suffix else {{ '"%s"' % hidden_target_compression if hidden_target_compression else None }}
 
-    if path.suffix == ".feather":
+    if suffix == ".feather":
         df.to_feather(path)
-    elif path.suffix == ".dta":
-        df.to_stata(path)
-    elif path.suffix == ".csv" or path.suffix == "":
-        df.to_csv(path)
-    elif path.suffix in [".pkl", ".pickle"]:
-        df.to_pickle(path)
+    elif suffix in [".arrow", ".ipc"]:
+        import pyarrow.feather as feather
+
+        feather.write_feather(df, path, compression="uncompressed")
+    elif suffix == ".parquet":
+        df.to_parquet(
+            path,
+            compression=compression or "snappy",
+            compression_level=1 if compression == "gzip" else None,
+        )
+    elif suffix == ".dta":
+        with _open_compressed_file(path, compression) as f:
+            df.to_stata(f)
+    elif suffix == ".csv":
+        with _open_compressed_file(path, compression) as f:
+            df.to_csv(f)
+    elif suffix in [".pkl", ".pickle"]:
+        with _open_compressed_file(path, compression) as f:
+            df.to_pickle(f)
     else:
         raise NotImplementedError
 
     return df
+
+
+{% include 'open_compressed_file.py' %}
@@ -3,11 +3,26 @@ library(tools)
 
 
 save_data <- function(df, path){
-    if (file_ext(path) == "feather") {
+    # Files without a suffix are written with the format in 'hidden_target_format' and
+    # compressed with 'hidden_target_compression'.
+    is_hidden_target <- file_ext(path) == ""
+    suffix <- if (is_hidden_target) "{{ hidden_target_format }}" else file_ext(path)
+    compression <- if (is_hidden_target) {{ '"%s"' % hidden_target_compression if hidden_target_compression else "NULL" }} else NULL
+
+    if (suffix == "feather") {
         write_feather(df, path)
-    } else if (file_ext(path) %in% c("csv", "")) {
+    } else if (suffix %in% c("arrow", "ipc")) {
+        # Arrow files are not compressed so that they can be memory-mapped.
+        arrow::write_feather(df, path, compression="uncompressed")
+    } else if (suffix == "parquet" && is.null(compression)) {
+        arrow::write_parquet(df, path)
+    } else if (suffix == "parquet") {
+        arrow::write_parquet(df, path, compression=compression)
+    } else if (suffix == "csv" && is.null(compression)) {
         write_csv(df, path)
-    } else if (file_ext(path) == "rds") {
+    } else if (suffix == "csv") {
+        write_compressed_csv(df, path, compression)
+    } else if (suffix == "rds") {
         saveRDS(df, path)
     } else {
         stop("NotImplementedError")
@@ -15,3 +30,18 @@ save_data <- function(df, path){
 
     return(df)
 }
+
+
+write_compressed_csv <- function(df, path, compression){
+    # zstd and lz4 require the arrow package. Otherwise, the file is compressed with
+    # gzip which can be read by all templates.
+    if (compression %in% c("zstd", "lz4") && requireNamespace("arrow", quietly=TRUE)) {
+        stream <- arrow::CompressedOutputStream$create(path, codec=compression)
+        arrow::write_csv_arrow(df, stream)
+        stream$close()
+    } else {
+        connection <- gzfile(path, "wb")
+        write_csv(df, connection)
+        close(connection)
+    }
+}
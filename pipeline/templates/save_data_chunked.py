@@ -0,0 +1,72 @@
+from pathlib import Path
+
+
+class ChunkWriter:
+    """Write a data set chunk by chunk.
+
+    Use the writer as a context manager and call :meth:`write` for every chunk. All
+    chunks must have the same columns and data types as the first chunk. The index is
+    not written. Files without a suffix are written with the format in
+    ``hidden_target_format`` and compressed with ``hidden_target_compression``.
+
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        suffix = self.path.suffix
+        self.suffix = suffix if suffix else ".{{ hidden_target_format }}"
+        self.compression = None if suffix else {{ '"%s"' % hidden_target_compression if hidden_target_compression else None }}
+        if self.suffix not in [".csv", ".feather", ".arrow", ".ipc", ".parquet"]:
+            raise NotImplementedError(
+                f"Files with suffix '{self.suffix}' cannot be written in chunks."
+            )
+        self.n_chunks = 0
+        self._writer = None
+        self._schema = None
+        self._file = None
+
+    def write(self, df):
+        if self.suffix == ".csv":
+            if self._file is None:
+                self._file = _open_compressed_file(self.path, self.compression)
+            df.to_csv(self._file, header=not self.n_chunks, index=False)
+        else:
+            self._write_arrow_table(df)
+        self.n_chunks += 1
+
+    def _write_arrow_table(self, df):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.suffix == ".parquet":
+                self._writer = pq.ParquetWriter(
+                    self.path,
+                    self._schema,
+                    compression=self.compression or "snappy",
+                    compression_level=1 if self.compression == "gzip" else None,
+                )
+            else:
+                self._writer = ipc.new_file(self.path, self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self._file is not None:
+            self._file.close()
+        elif not self.n_chunks:
+            # Create an empty file such that the target exists even without chunks.
+            self.path.touch()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+{% include 'open_compressed_file.py' %}
@@ -0,0 +1,77 @@
+import importlib.util
+from pathlib import Path
+
+import joblib
+
+
+STATISTICS = [
+    "aic",
+    "bic",
+    "bse",
+    "f_pvalue",
+    "fvalue",
+    "llf",
+    "llnull",
+    "llr",
+    "llr_pvalue",
+    "prsquared",
+    "pvalues",
+    "rsquared",
+    "rsquared_adj",
+    "scale",
+    "ssr",
+    "tvalues",
+]
+
+
+def save_model(model, path, remove_data=False, compress=0):
+    """Save a statsmodels model.
+
+    With ``remove_data``, the data and arrays with one value per observation are removed
+    from the model except for the residuals which are needed by stargazer. ``compress``
+    is the compression level from 0 to 9 of :func:`joblib.dump`. Models without
+    compression can be memory-mapped when they are loaded.
+
+    Models without a suffix and ``compress`` are compressed with
+    ``hidden_target_compression``. Since joblib does not support zstd, lz4 or gzip are
+    used instead.
+
+    """
+    if remove_data:
+        _remove_data(model)
+    if not compress and not Path(path).suffix:
+        compress = _get_hidden_target_compression()
+    joblib.dump(model, path, compress=compress)
+
+
+def _get_hidden_target_compression():
+    compression = {{ '"%s"' % hidden_target_compression if hidden_target_compression else None }}
+    if compression == "zstd":
+        compression = "lz4" if importlib.util.find_spec("lz4") else "gzip"
+
+    return (compression, 3) if compression else 0
+
+
+def _remove_data(model):
+    results = getattr(model, "_results", model)
+
+    # Statistics which are computed from the data must be cached before the removal.
+    for statistic in STATISTICS:
+        try:
+            getattr(results, statistic)
+        except (AttributeError, NotImplementedError, ValueError):
+            pass
+    resid = getattr(results, "resid", None)
+
+    results.remove_data()
+    if resid is not None:
+        results._cache["resid"] = resid
+
+    # Models from formulas keep the data frame to rebuild the design when unpickled. The
+    # row labels are cached because they are needed to attach them to the residuals.
+    data = results.model.data
+    data.row_labels
+    data.__dict__.pop("model_spec", None)
+    data.frame = None
+    data.orig_endog = data.orig_endog[:0]
+    data.orig_exog = data.orig_exog[:0]
@@ -1,10 +1,20 @@
 import joblib
+import warnings
 from pathlib import Path
 from stargazer.stargazer import Stargazer
 
 
 def load_model(path):
-    model = joblib.load(path)
+    """Load a model.
+
+    Uncompressed models are memory-mapped such that large arrays are only read from the
+    disk if they are accessed. Compressed models are loaded entirely.
+
+    """
+    {% set mmap_mode = mmap_mode | default("r") %}
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*mmap_mode.*compressed.*")
+        model = joblib.load(path, mmap_mode={{ '"%s"' % mmap_mode if mmap_mode else None }})
     return model
 
 
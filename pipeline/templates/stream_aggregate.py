@@ -0,0 +1,48 @@
+{% include 'load_data_chunked.py' %}
+
+
+{% include 'save_data.py' %}
+
+
+def aggregate_chunk(chunk):
+    {% block aggregate_chunk %}{% endblock %}
+    return result
+
+
+def combine(left, right):
+    {% block combine %}
+    result = pd.concat([left, right]).groupby(level=0).sum()
+    {% endblock %}
+    return result
+
+
+def finalize(result):
+    {% block finalize %}{% endblock %}
+    return result
+
+
+def main():
+    chunks = iter_data_chunks(
+        "{{ depends_on }}",
+        chunksize={{ chunksize | default(100000) }},
+        columns={{ columns | default(None) }},
+        filters={{ filters | default(None) }},
+    )
+
+    # Partial results are combined immediately so that only one chunk and the running
+    # result are held in memory.
+    result = None
+    for chunk in chunks:
+        partial = aggregate_chunk(chunk)
+        result = partial if result is None else combine(result, partial)
+
+    # Custom versions of 'load_data_chunked.py' might not yield chunks of empty data.
+    if result is None:
+        raise ValueError("'{{ depends_on }}' contains no chunks to aggregate.")
+
+    result = finalize(result)
+    save_data(result, "{{ produces }}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+{% include 'load_data_chunked.py' %}
+
+
+{% include 'save_data_chunked.py' %}
+
+
+def transform_chunk(chunk):
+    {% block transform_chunk %}{% endblock %}
+    return chunk
+
+
+def main():
+    chunks = iter_data_chunks(
+        "{{ depends_on }}",
+        chunksize={{ chunksize | default(100000) }},
+        columns={{ columns | default(None) }},
+        filters={{ filters | default(None) }},
+    )
+    with ChunkWriter("{{ produces }}") as writer:
+        for chunk in chunks:
+            writer.write(transform_chunk(chunk))
+
+
+if __name__ == "__main__":
+    main()
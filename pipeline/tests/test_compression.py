@@ -0,0 +1,107 @@
+import gzip
+import os
+import textwrap
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.compression import detect_compression
+from pipeline.compression import is_compression_available
+from pipeline.compression import open_file
+from pipeline.compression import parse_compression
+
+
+@pytest.mark.unit
+def test_parse_invalid_compression():
+    with pytest.raises(ValueError, match="must be one of"):
+        parse_compression("brotli")
+
+
+@pytest.mark.unit
+def test_parse_unavailable_compression():
+    if is_compression_available("zstd"):
+        pytest.skip("zstandard is installed.")
+    with pytest.raises(ValueError, match="requires the package 'zstandard'"):
+        parse_compression("zstd")
+
+
+@pytest.mark.unit
+def test_open_file_decompresses_transparently(tmp_path):
+    compressed = tmp_path / "compressed"
+    with gzip.open(compressed, "wb") as f:
+        f.write(b"data")
+    uncompressed = tmp_path / "uncompressed"
+    uncompressed.write_bytes(b"data")
+
+    assert detect_compression(compressed) == "gzip"
+    assert detect_compression(uncompressed) is None
+    for path in [compressed, uncompressed]:
+        with open_file(path) as f:
+            assert f.read() == b"data"
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("hidden_target_format", ["csv", "pkl", "parquet"])
+def test_build_with_compressed_hidden_targets(
+    test_project_config, hidden_target_format
+):
+    config = test_project_config
+    config["hidden_target_format"] = hidden_target_format
+    config["hidden_target_compression"] = "gzip"
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+    tasks = {
+        "create-data": {"template": "create_data.py"},
+        "summarize": {
+            "template": "summarize.py",
+            "depends_on": "create-data",
+            "produces": "{{ build_directory }}/summary.txt",
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+    create_data = """
+    import pandas as pd
+
+    {% include 'save_data.py' %}
+
+    df = pd.DataFrame({"a": range(1_000), "b": ["x", "y"] * 500})
+    save_data(df, "{{ produces }}")
+    """
+    project_path.joinpath("src", "create_data.py").write_text(
+        textwrap.dedent(create_data)
+    )
+    summarize = """
+    from pathlib import Path
+
+    {% include 'load_data.py' %}
+
+    df = load_data("{{ depends_on }}")
+    Path("{{ produces }}").write_text(f"{df.a.sum()} {df.b.iloc[-1]}")
+    """
+    project_path.joinpath("src", "summarize.py").write_text(textwrap.dedent(summarize))
+
+    os.chdir(project_path)
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "2/2 tasks" in result.output
+    assert project_path.joinpath("bld", "summary.txt").read_text() == "499500 y"
+
+    hidden_target = project_path.joinpath("bld", ".pipeline", "create-data")
+    if hidden_target_format == "parquet":
+        assert pd.read_parquet(hidden_target).shape == (1_000, 2)
+    else:
+        assert detect_compression(hidden_target) == "gzip"
+
+    # Compressed targets are reproducible such that their hashes do not change.
+    content = hidden_target.read_bytes()
+    hidden_target.unlink()
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert hidden_target.read_bytes() == content
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import textwrap
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+from pony import orm
+
+from pipeline.cli import cli
+from pipeline.database import _migrate_database
+from pipeline.database import _set_schema_version
+from pipeline.database import Hash
+from pipeline.database import SCHEMA_VERSION
+
+
+@pytest.mark.unit
+def test_migrate_database_of_version_zero(tmp_path):
+    path = tmp_path / "db.sql"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'CREATE TABLE "Hash" ("task" TEXT NOT NULL, "dependency" TEXT NOT NULL, '
+        '"hash_" TEXT NOT NULL, PRIMARY KEY ("task", "dependency"))'
+    )
+    connection.execute("INSERT INTO \"Hash\" VALUES ('task', 'dependency', 'abc')")
+    connection.commit()
+    connection.close()
+
+    db_config = {"provider": "sqlite", "filename": path.as_posix()}
+    _migrate_database(db_config)
+    _set_schema_version(db_config)
+
+    connection = sqlite3.connect(path)
+    rows = connection.execute('SELECT "algorithm" FROM "Hash"').fetchall()
+    indices = connection.execute('PRAGMA index_list("Hash")').fetchall()
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    connection.close()
+
+    assert rows == [("sha256",)]
+    assert "idx_hash__dependency" in [index[1] for index in indices]
+    assert version == SCHEMA_VERSION
+
+
+@pytest.mark.end_to_end
+def test_gc_deletes_hashes_of_removed_tasks(test_project_config):
+    project_path = Path(test_project_config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    task = textwrap.dedent(
+        """
+        from pathlib import Path
+
+
+        if __name__ == '__main__':
+            Path("{{ produces }}").write_text("done")
+        """
+    )
+    project_path.joinpath("src", "task.py").write_text(task)
+
+    tasks = textwrap.dedent(
+        """
+        gc-task-1:
+            template: task.py
+            produces: {{ build_directory }}/out-1.txt
+
+        gc-task-2:
+            template: task.py
+            produces: {{ build_directory }}/out-2.txt
+        """
+    )
+    project_path.joinpath("src", "tasks.yaml").write_text(tasks)
+    # Do not remove the hashes automatically after the build.
+    project_path.joinpath(".pipeline.yaml").write_text("gc_after_build: false")
+
+    os.chdir(project_path)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    # Remove the second task and collect the garbage.
+    project_path.joinpath("src", "tasks.yaml").write_text(tasks.split("gc-task-2")[0])
+    result = runner.invoke(cli, ["gc", "--vacuum"])
+    assert result.exit_code == 0
+    assert "stale hash(es)." in result.output
+
+    with orm.db_session:
+        assert orm.count(h for h in Hash if h.task == "gc-task-1") == 3
+        assert orm.count(h for h in Hash if h.task == "gc-task-2") == 0
+
+
+@pytest.mark.end_to_end
+def test_gc_keeps_hashes_of_directories_with_trailing_slash(test_project_config):
+    project_path = Path(test_project_config["project_directory"])
+    project_path.joinpath("src", "raw").mkdir(parents=True)
+    project_path.joinpath("src", "raw", "data.csv").write_text("a\n1\n")
+
+    task = textwrap.dedent(
+        """
+        from pathlib import Path
+
+
+        if __name__ == '__main__':
+            Path("{{ produces }}").write_text("done")
+        """
+    )
+    project_path.joinpath("src", "task.py").write_text(task)
+
+    tasks = textwrap.dedent(
+        """
+        task:
+            template: task.py
+            depends_on: {{ source_directory }}/raw/
+            produces: {{ build_directory }}/out.txt
+        """
+    )
+    project_path.joinpath("src", "tasks.yaml").write_text(tasks)
+
+    os.chdir(project_path)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "1/1 tasks" in result.output
+
+    # The hashes of the directory are not stale and the task is up-to-date.
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
@@ -0,0 +1,166 @@
+import os
+import textwrap
+import threading
+from pathlib import Path
+
+import networkx as nx
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.config import load_config
+from pipeline.dag import Scheduler
+from pipeline.distributed import Coordinator
+from pipeline.distributed import read_coordinator_file
+from pipeline.distributed import run_worker
+
+
+@pytest.mark.unit
+def test_reschedule_submitted_task():
+    dag = nx.DiGraph([("a", "a.txt"), ("a.txt", "b")])
+    dag.nodes["b"]["depends_on"] = "a.txt"
+    scheduler = Scheduler(dag, {"a", "b"}, False)
+
+    assert scheduler.propose(-1) == {"a"}
+    scheduler.reschedule("a")
+    assert scheduler.propose(-1) == {"a"}
+    scheduler.process_finished("a")
+    assert scheduler.propose(-1) == {"b"}
+
+
+@pytest.fixture
+def distributed_project(test_project_config):
+    config = test_project_config
+    config["coordinator_address"] = "localhost:0"
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = {
+        "create-number": {
+            "template": "write.py",
+            "number": 1,
+            "produces": "{{ build_directory }}/number.txt",
+        },
+        **{
+            f"add-{i}": {
+                "template": "add.py",
+                "depends_on": "create-number",
+                "number": i,
+                "produces": "{{ build_directory }}/" + f"add-{i}.txt",
+            }
+            for i in range(6)
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    write = """
+    from pathlib import Path
+
+    Path("{{ produces }}").write_text("{{ number }}")
+    """
+    project_path.joinpath("src", "write.py").write_text(textwrap.dedent(write))
+    add = """
+    from pathlib import Path
+
+    number = int(Path("{{ depends_on }}").read_text())
+    print("Adding {{ number }}.")
+    Path("{{ produces }}").write_text(str(number + {{ number }}))
+    """
+    project_path.joinpath("src", "add.py").write_text(textwrap.dedent(add))
+
+    os.chdir(project_path)
+
+    yield project_path
+
+
+def _start_workers(n_workers, n_jobs):
+    config = load_config()
+    results = []
+
+    def _worker():
+        address, authkey = read_coordinator_file(config, timeout=30)
+        results.append(run_worker(address, authkey, n_jobs))
+
+    threads = [threading.Thread(target=_worker) for _ in range(n_workers)]
+    for thread in threads:
+        thread.start()
+
+    return threads, results
+
+
+@pytest.mark.end_to_end
+def test_distributed_build(distributed_project):
+    threads, results = _start_workers(n_workers=2, n_jobs=2)
+
+    result = CliRunner().invoke(cli, ["build", "--distributed"])
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert result.exit_code == 0
+    assert "Adding 5." in result.output
+    assert sum(results) == 7
+    for i in range(6):
+        path = distributed_project.joinpath("bld", f"add-{i}.txt")
+        assert path.read_text() == str(1 + i)
+    coordinator_file = distributed_project.joinpath(
+        "bld", ".pipeline", "coordinator.json"
+    )
+    assert not coordinator_file.exists()
+
+    # The hashes were saved by the coordinator and no worker is needed.
+    result = CliRunner().invoke(cli, ["build", "--distributed"])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
+
+
+@pytest.mark.end_to_end
+def test_distributed_build_with_failing_task(distributed_project):
+    add = distributed_project.joinpath("src", "add.py")
+    add.write_text(add.read_text() + '\nraise ValueError("Failed to add.")\n')
+    threads, results = _start_workers(n_workers=1, n_jobs=1)
+
+    result = CliRunner().invoke(cli, ["build", "--distributed"])
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert result.exit_code == 1
+    assert "Task 'add-" in str(result.exception)
+    assert "ValueError: Failed to add." in str(result.exception)
+    assert distributed_project.joinpath("bld", "number.txt").exists()
+    assert not any(thread.is_alive() for thread in threads)
+
+
+class _ExitedConnection:
+    """A connection to a worker which exited while it was idle."""
+
+    def send(self, obj):
+        raise BrokenPipeError
+
+    def close(self):
+        pass
+
+
+@pytest.mark.end_to_end
+def test_distributed_build_with_worker_exiting_while_idle(
+    distributed_project, monkeypatch
+):
+    accept = Coordinator.accept
+    exited_connections = [_ExitedConnection()]
+
+    def _accept(self):
+        connections = exited_connections + accept(self)
+        exited_connections.clear()
+        return connections
+
+    monkeypatch.setattr(Coordinator, "accept", _accept)
+    threads, results = _start_workers(n_workers=1, n_jobs=1)
+
+    result = CliRunner().invoke(cli, ["build", "--distributed"])
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert result.exit_code == 0
+    assert sum(results) == 7
@@ -0,0 +1,150 @@
+import os
+import textwrap
+from pathlib import Path
+
+import networkx as nx
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.dag import Scheduler
+from pipeline.ephemeral import add_tasks_recreating_deleted_targets
+from pipeline.ephemeral import EphemeralTargets
+from pipeline.ephemeral import mark_ephemeral_targets
+
+
+def _create_dag(tmp_path, ephemeral=None):
+    """Create a DAG where ``produce`` writes a file which ``consume-{i}`` read."""
+    hidden_target = tmp_path.joinpath(".pipeline", "produce").as_posix()
+    final_target = tmp_path.joinpath("final.txt").as_posix()
+
+    dag = nx.DiGraph()
+    dag.add_edge("produce", hidden_target)
+    for i in range(2):
+        dag.add_edge(hidden_target, f"consume-{i}")
+    dag.add_edge("consume-0", final_target)
+    for node in dag.nodes:
+        dag.nodes[node]["_is_task"] = not node.startswith(tmp_path.as_posix())
+        if node.startswith("consume"):
+            dag.nodes[node]["depends_on"] = hidden_target
+    if ephemeral is not None:
+        dag.nodes["produce"]["ephemeral"] = ephemeral
+
+    config = {
+        "hidden_build_directory": tmp_path.joinpath(".pipeline").as_posix(),
+        "ephemeral_hidden_targets": True,
+    }
+
+    return mark_ephemeral_targets(dag, config), hidden_target, final_target
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("ephemeral, expected", [(None, True), (False, False)])
+def test_mark_ephemeral_targets(tmp_path, ephemeral, expected):
+    dag, hidden_target, final_target = _create_dag(tmp_path, ephemeral)
+
+    assert dag.nodes[hidden_target].get("_is_ephemeral", False) is expected
+    # Targets without dependent tasks are kept.
+    assert "_is_ephemeral" not in dag.nodes[final_target]
+
+
+@pytest.mark.unit
+def test_ephemeral_targets_are_deleted_after_last_consumer(tmp_path):
+    dag, hidden_target, _ = _create_dag(tmp_path)
+    Path(hidden_target).parent.mkdir()
+    Path(hidden_target).write_text("data")
+
+    ephemeral_targets = EphemeralTargets(dag, {"produce", "consume-0", "consume-1"})
+    ephemeral_targets.release("produce", dag)
+    ephemeral_targets.release("consume-0", dag)
+    assert Path(hidden_target).exists()
+    ephemeral_targets.release("consume-1", dag)
+    assert not Path(hidden_target).exists()
+
+
+@pytest.mark.unit
+def test_add_tasks_recreating_deleted_targets(tmp_path):
+    dag, hidden_target, _ = _create_dag(tmp_path)
+
+    assert add_tasks_recreating_deleted_targets(dag, {"consume-1"}) == {
+        "produce",
+        "consume-1",
+    }
+
+    Path(hidden_target).parent.mkdir()
+    Path(hidden_target).write_text("data")
+    assert add_tasks_recreating_deleted_targets(dag, {"consume-1"}) == {"consume-1"}
+
+
+@pytest.mark.unit
+def test_scheduler_prefers_consumers_of_ephemeral_targets(tmp_path):
+    dag, _, _ = _create_dag(tmp_path)
+    dag.add_edge("first", "first.txt")
+    dag.add_edge("first.txt", "other")
+    dag.add_node("first", _is_task=True)
+    dag.add_node("first.txt", _is_task=False)
+    dag.add_node("other", _is_task=True, depends_on="first.txt")
+
+    scheduler = Scheduler(dag, {"produce", "first", "other", "consume-0"}, False)
+    assert scheduler.propose(2) == {"produce", "first"}
+    scheduler.process_finished(["produce", "first"])
+    assert scheduler.propose(1) == {"consume-0"}
+    assert scheduler.propose(1) == {"other"}
+
+
+@pytest.mark.end_to_end
+def test_build_with_ephemeral_hidden_targets(test_project_config):
+    config = test_project_config
+    config["ephemeral_hidden_targets"] = True
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = {
+        **{f"resample-{i}": {"template": "resample.py", "seed": i} for i in range(2)},
+        **{
+            f"estimate-{i}": {
+                "template": "estimate.py",
+                "depends_on": f"resample-{i}",
+                "produces": "{{ build_directory }}/" + f"estimate-{i}.txt",
+            }
+            for i in range(2)
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+    resample = """
+    from pathlib import Path
+
+    Path("{{ produces }}").write_text("{{ seed }}")
+    """
+    project_path.joinpath("src", "resample.py").write_text(textwrap.dedent(resample))
+    estimate = """
+    from pathlib import Path
+
+    Path("{{ produces }}").write_text(Path("{{ depends_on }}").read_text())
+    """
+    estimate_path = project_path.joinpath("src", "estimate.py")
+    estimate_path.write_text(textwrap.dedent(estimate))
+
+    os.chdir(project_path)
+    bld = project_path.joinpath("bld")
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "4/4 tasks" in result.output
+    assert bld.joinpath("estimate-1.txt").read_text() == "1"
+    assert not bld.joinpath(".pipeline", "resample-1").exists()
+
+    # Deleted targets do not cause tasks to be executed again.
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
+
+    # Deleted targets are recreated for dependent tasks which are executed again.
+    estimate_path.write_text(estimate_path.read_text() + "\n")
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "4/4 tasks" in result.output
+    assert not bld.joinpath(".pipeline", "resample-0").exists()
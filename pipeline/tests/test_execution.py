@@ -1,8 +1,11 @@
 import os
+import textwrap
 from pathlib import Path
 
 import pytest
+from click.testing import CliRunner
 
+from pipeline.cli import cli
 from pipeline.execution import _patch_subprocess_environment
 
 
@@ -15,3 +18,49 @@ def test_patch_subprocess_environment(monkeypatch):
     result = _patch_subprocess_environment(config)
 
     assert result == {"PYTHONPATH": f"{path};"}
+
+
+@pytest.mark.end_to_end
+def test_parallel_execution_saves_hashes(test_project_config):
+    """Test that hashes computed in threads are saved and tasks are not rerun."""
+    project_path = Path(test_project_config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = textwrap.dedent(
+        """
+        task-1:
+            template: task.py
+            produces: {{ build_directory }}/out-1.txt
+
+        task-2:
+            template: task.py
+            depends_on: task-1
+            produces: {{ build_directory }}/out-2.txt
+        """
+    )
+    project_path.joinpath("src", "tasks.yaml").write_text(tasks)
+
+    task = textwrap.dedent(
+        """
+        from pathlib import Path
+
+
+        if __name__ == '__main__':
+            path = Path("{{ build_directory }}/runs.txt")
+            runs = path.read_text() if path.exists() else ""
+            path.write_text(runs + "{{ produces }}\\n")
+            Path("{{ produces }}").write_text("done")
+        """
+    )
+    project_path.joinpath("src", "task.py").write_text(task)
+
+    os.chdir(project_path)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build", "-n", "2"])
+    assert result.exit_code == 0
+    assert len(project_path.joinpath("bld", "runs.txt").read_text().split()) == 2
+
+    result = runner.invoke(cli, ["build", "-n", "2"])
+    assert result.exit_code == 0
+    assert len(project_path.joinpath("bld", "runs.txt").read_text().split()) == 2
@@ -0,0 +1,129 @@
+import json
+import os
+import textwrap
+from pathlib import Path
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+import pipeline.executors
+from pipeline.cli import cli
+from pipeline.executors import create_executor
+from pipeline.executors import ProcessExecutor
+from pipeline.executors import SerialExecutor
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "name, expected", [("serial", SerialExecutor), ("process", ProcessExecutor)]
+)
+def test_create_built_in_executor(name, expected):
+    with create_executor({"executor": name, "n_jobs": 2}) as executor:
+        assert type(executor) is expected
+
+
+@pytest.mark.unit
+def test_create_executor_from_entry_point(monkeypatch):
+    class CustomExecutor(SerialExecutor):
+        pass
+
+    monkeypatch.setattr(
+        pipeline.executors,
+        "_load_executors_from_entry_points",
+        lambda: {"custom": CustomExecutor},
+    )
+    assert type(create_executor({"executor": "custom"})) is CustomExecutor
+
+    with pytest.raises(ValueError, match="Unknown executor 'slurm'"):
+        create_executor({"executor": "slurm"})
+
+
+@pytest.fixture
+def batch_project(test_project_config):
+    config = test_project_config
+    config["executor"] = "local-batch"
+    config["n_jobs"] = 2
+    config["fusion_batch_size"] = 2
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = {
+        "create-number": {
+            "template": "write.py",
+            "produces": "{{ build_directory }}/number.txt",
+            "resources": {"cpus": 2, "memory": "1G"},
+        },
+        **{
+            f"add-{i}": {
+                "template": "add.py",
+                "depends_on": "create-number",
+                "number": i,
+                "produces": "{{ build_directory }}/" + f"add-{i}.txt",
+            }
+            for i in range(5)
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    write = """
+    from pathlib import Path
+
+    Path("{{ produces }}").write_text("1")
+    """
+    project_path.joinpath("src", "write.py").write_text(textwrap.dedent(write))
+    add = """
+    from pathlib import Path
+
+    number = int(Path("{{ depends_on }}").read_text())
+    Path("{{ produces }}").write_text(str(number + {{ number }}))
+    """
+    project_path.joinpath("src", "add.py").write_text(textwrap.dedent(add))
+
+    os.chdir(project_path)
+
+    yield project_path
+
+
+@pytest.mark.end_to_end
+def test_build_with_local_batch_executor(batch_project):
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    for i in range(5):
+        assert batch_project.joinpath("bld", f"add-{i}.txt").read_text() == str(1 + i)
+
+    # The first job array contains only the first task and its resource hints.
+    manifests = sorted(
+        batch_project.joinpath("bld", ".pipeline", "jobs").glob("array-*.json"),
+        key=lambda path: int(path.stem.rsplit("-", 1)[1]),
+    )
+    first_array = json.loads(manifests[0].read_text())
+    assert len(first_array["elements"]) == 1
+    assert first_array["elements"][0]["ids"] == ["create-number"]
+    assert first_array["elements"][0]["resources"] == {"cpus": 2, "memory": "1G"}
+
+    # Fused tasks are elements of the second array.
+    second_array = json.loads(manifests[1].read_text())
+    assert sorted(len(element["ids"]) for element in second_array["elements"]) == [
+        1,
+        2,
+        2,
+    ]
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
+
+
+@pytest.mark.end_to_end
+def test_local_batch_executor_reports_failing_task(batch_project):
+    write = batch_project.joinpath("src", "write.py")
+    write.write_text(write.read_text() + '\nraise ValueError("Failed to write.")\n')
+
+    result = CliRunner().invoke(cli, ["build"])
+
+    assert result.exit_code == 1
+    assert "Task 'create-number'" in str(result.exception)
+    assert "ValueError: Failed to write." in str(result.exception)
@@ -0,0 +1,225 @@
+import os
+import textwrap
+from pathlib import Path
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+import pipeline
+from pipeline.cli import cli
+from pipeline.config import load_config
+from pipeline.functions import collect_function_tasks
+from pipeline.functions import create_function_fingerprint
+from pipeline.functions import TASK_ATTRIBUTE
+
+
+@pytest.mark.unit
+def test_task_decorator_keeps_function():
+    @pipeline.task(depends_on="a.txt", produces="b.txt", priority=2)
+    def copy(depends_on, produces):
+        return depends_on, produces
+
+    assert copy("a", "b") == ("a", "b")
+    assert getattr(copy, TASK_ATTRIBUTE) == {
+        "id": "copy",
+        "depends_on": "a.txt",
+        "produces": "b.txt",
+        "priority": 2,
+    }
+
+
+TASK_MODULE = """
+import pipeline
+
+
+OFFSET = 0
+
+
+@pipeline.task(produces="{{ build_directory }}/number.txt")
+def write_number(produces):
+    produces.write_text("1")
+
+
+@pipeline.task(
+    name="add-numbers",
+    depends_on=["write_number", "{{ source_directory }}/data.txt"],
+    produces="{{ build_directory }}/sum.txt",
+    summand=10,
+)
+def add(depends_on, produces, summand):
+    numbers = [int(path.read_text()) for path in depends_on]
+    produces.write_text(str(sum(numbers) + summand + OFFSET + helper()))
+
+
+def helper():
+    return 0
+"""
+
+
+@pytest.fixture
+def function_project(test_project_config):
+    config = test_project_config
+    config["n_jobs"] = 2
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+    project_path.joinpath("src", "data.txt").write_text("5")
+    project_path.joinpath("src", "task_numbers.py").write_text(TASK_MODULE)
+
+    tasks = {
+        "write-message": {
+            "template": "message.py",
+            "depends_on": "add-numbers",
+            "produces": "{{ build_directory }}/message.txt",
+        }
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+    message = """
+    from pathlib import Path
+
+    number = Path("{{ depends_on }}").read_text()
+    Path("{{ produces }}").write_text(f"The sum is {number}.")
+    """
+    project_path.joinpath("src", "message.py").write_text(textwrap.dedent(message))
+
+    os.chdir(project_path)
+
+    yield project_path
+
+
+@pytest.mark.unit
+def test_collect_function_tasks(function_project):
+    config = load_config()
+    tasks = collect_function_tasks(config)
+
+    assert set(tasks) == {"write_number", "add-numbers"}
+    assert tasks["add-numbers"]["depends_on"] == [
+        "write_number",
+        f"{config['source_directory']}/data.txt",
+    ]
+    assert tasks["add-numbers"]["produces"] == f"{config['build_directory']}/sum.txt"
+    assert tasks["add-numbers"]["summand"] == 10
+    assert tasks["add-numbers"]["function"].endswith("task_numbers.py::add")
+
+
+@pytest.mark.unit
+def test_function_fingerprint_changes_only_with_function(function_project):
+    config = load_config()
+    module = function_project.joinpath("src", "task_numbers.py")
+    tasks = collect_function_tasks(config)
+    fingerprints = {
+        id_: create_function_fingerprint(task_info, config)
+        for id_, task_info in tasks.items()
+    }
+
+    module.write_text(module.read_text().replace("+ summand", "- summand"))
+    os.utime(module, (0, 0))
+    tasks = collect_function_tasks(config)
+
+    fingerprint = create_function_fingerprint(tasks["add-numbers"], config)
+    assert fingerprint != fingerprints["add-numbers"]
+    fingerprint = create_function_fingerprint(tasks["write_number"], config)
+    assert fingerprint == fingerprints["write_number"]
+
+    tasks["write_number"]["produces"] = "other.txt"
+    fingerprint = create_function_fingerprint(tasks["write_number"], config)
+    assert fingerprint != fingerprints["write_number"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "old, new", [("OFFSET = 0", "OFFSET = 1"), ("return 0", "return 1")]
+)
+def test_function_fingerprint_changes_with_referenced_globals(
+    function_project, old, new
+):
+    config = load_config()
+    module = function_project.joinpath("src", "task_numbers.py")
+    tasks = collect_function_tasks(config)
+    fingerprints = {
+        id_: create_function_fingerprint(task_info, config)
+        for id_, task_info in tasks.items()
+    }
+
+    module.write_text(module.read_text().replace(old, new))
+    os.utime(module, (0, 0))
+    tasks = collect_function_tasks(config)
+
+    fingerprint = create_function_fingerprint(tasks["add-numbers"], config)
+    assert fingerprint != fingerprints["add-numbers"]
+    fingerprint = create_function_fingerprint(tasks["write_number"], config)
+    assert fingerprint == fingerprints["write_number"]
+
+
+@pytest.mark.end_to_end
+def test_build_with_function_tasks(function_project):
+    result = CliRunner().invoke(cli, ["build"])
+
+    assert result.exit_code == 0
+    assert "3/3 tasks" in result.output
+    bld = function_project.joinpath("bld")
+    assert bld.joinpath("sum.txt").read_text() == "16"
+    assert bld.joinpath("message.txt").read_text() == "The sum is 16."
+    assert bld.joinpath(".tasks", "add-numbers.json").exists()
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
+
+    # Only the modified function and its dependent tasks are executed again.
+    module = function_project.joinpath("src", "task_numbers.py")
+    module.write_text(module.read_text().replace("+ summand", "- summand"))
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "2/2 tasks" in result.output
+    assert bld.joinpath("message.txt").read_text() == "The sum is -4."
+
+
+@pytest.mark.end_to_end
+def test_failing_function_task(function_project):
+    module = function_project.joinpath("src", "task_numbers.py")
+    module.write_text(
+        module.read_text().replace(
+            'produces.write_text("1")', 'raise ValueError("Failed to write.")'
+        )
+    )
+
+    result = CliRunner().invoke(cli, ["build"])
+
+    assert result.exit_code == 1
+    assert "Task 'write_number'" in str(result.exception)
+    assert "ValueError: Failed to write." in str(result.exception)
+
+
+@pytest.mark.end_to_end
+def test_function_task_with_threads_runs_in_new_interpreter(function_project):
+    module = function_project.joinpath("src", "task_numbers.py")
+    module.write_text(
+        module.read_text()
+        .replace(
+            '@pipeline.task(produces="{{ build_directory }}/number.txt")',
+            '@pipeline.task(produces="{{ build_directory }}/number.txt", threads=3)',
+        )
+        .replace(
+            'produces.write_text("1")',
+            'import os; produces.write_text(os.environ["OMP_NUM_THREADS"])',
+        )
+    )
+
+    result = CliRunner().invoke(cli, ["build"])
+
+    assert result.exit_code == 0
+    assert function_project.joinpath("bld", "number.txt").read_text() == "3"
+
+
+@pytest.mark.end_to_end
+def test_profile_function_task(function_project):
+    result = CliRunner().invoke(cli, ["build", "--profile", "add-numbers"])
+
+    assert result.exit_code == 0
+    assert "hotspots of task 'add-numbers'" in result.output
+    task_directory = function_project.joinpath("bld", ".tasks")
+    assert task_directory.joinpath("add-numbers.cpu.prof").exists()
+    assert function_project.joinpath("bld", "sum.txt").read_text() == "16"
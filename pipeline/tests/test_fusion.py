@@ -0,0 +1,136 @@
+import os
+import textwrap
+from pathlib import Path
+
+import networkx as nx
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.dag import Scheduler
+from pipeline.fusion import create_batches
+from pipeline.fusion import mark_fusable_tasks
+
+
+@pytest.mark.unit
+def test_create_batches():
+    dag = nx.DiGraph()
+    dag.add_node("data.csv", _is_task=False)
+    for id_, template in [("a", "a.py"), ("b", "a.py"), ("c", "a.py"), ("d", "d.r")]:
+        dag.add_node(id_, _is_task=True, template=template, depends_on="data.csv")
+    config = {
+        "fusion_batch_size": 2,
+        "_is_debug": False,
+        "profile": None,
+        "profile_tasks": [],
+    }
+    dag = mark_fusable_tasks(dag, config)
+
+    scheduler = Scheduler(dag, {"a", "b", "c", "d"}, False)
+    batches = create_batches(scheduler.propose(-1), scheduler, config)
+    assert batches == [["d"], ["a", "b"], ["c"]]
+
+    # Batches are filled with other ready tasks.
+    scheduler = Scheduler(dag, {"a", "b", "c", "d"}, False)
+    del scheduler.task_dict["a"]
+    batches = create_batches({"a"}, scheduler, config)
+    assert batches == [["a", "b"]]
+    assert set(scheduler.task_dict) == {"c", "d"}
+
+
+@pytest.fixture
+def fusion_project(test_project_config):
+    config = test_project_config
+    config["fusion_batch_size"] = 3
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = {
+        "create-data": {
+            "template": "create_data.py",
+            "produces": "{{ build_directory }}/data.csv",
+        },
+        **{
+            f"sum-{i}": {
+                "template": "sum.py",
+                "depends_on": "create-data",
+                "produces": "{{ build_directory }}/" + f"sum-{i}.txt",
+                "factor": i,
+            }
+            for i in range(5)
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    create_data = """
+    import pandas as pd
+
+    pd.DataFrame({"a": [1, 2, 3]}).to_csv("{{ produces }}", index=False)
+    """
+    project_path.joinpath("src", "create_data.py").write_text(
+        textwrap.dedent(create_data)
+    )
+
+    task = """
+    import os
+
+    {% include 'load_data.py' %}
+
+    if {{ factor }} == int(os.environ.get("FAILING_TASK", -1)):
+        raise Exception
+
+    df = load_data("{{ depends_on }}")
+    df["a"] *= {{ factor }}
+    Path("{{ produces }}").write_text(f"{df.a.sum()}:{os.getpid()}")
+    """
+    project_path.joinpath("src", "sum.py").write_text(textwrap.dedent(task))
+
+    os.chdir(project_path)
+
+    return project_path
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("n_jobs", ["1", "2"])
+def test_fused_tasks_share_processes(fusion_project, n_jobs):
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build", "-n", n_jobs])
+    assert result.exit_code == 0
+
+    outputs = [
+        fusion_project.joinpath("bld", f"sum-{i}.txt").read_text().split(":")
+        for i in range(5)
+    ]
+    assert [int(output[0]) for output in outputs] == [6 * i for i in range(5)]
+    assert len({output[1] for output in outputs}) == 2
+
+    # Tasks in a batch modify their copy of the data and not the shared data set.
+    result = runner.invoke(cli, ["build", "-n", n_jobs])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
+
+
+@pytest.mark.end_to_end
+def test_failure_in_fused_task_is_recorded_per_task(fusion_project, monkeypatch):
+    # Put all tasks in one batch since the build stops after the failing batch.
+    config = yaml.safe_load(fusion_project.joinpath(".pipeline.yaml").read_text())
+    config["fusion_batch_size"] = 5
+    fusion_project.joinpath(".pipeline.yaml").write_text(yaml.dump(config))
+    monkeypatch.setenv("FAILING_TASK", "1")
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 1
+    assert "Task 'sum-1'" in str(result.exception)
+
+    outputs = {i: fusion_project.joinpath("bld", f"sum-{i}.txt") for i in range(5)}
+    assert not outputs[1].exists()
+    assert all(outputs[i].exists() for i in [0, 2, 3, 4])
+
+    monkeypatch.delenv("FAILING_TASK")
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "1/1 tasks" in result.output
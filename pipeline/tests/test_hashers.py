@@ -0,0 +1,200 @@
+import hashlib
+import os
+import textwrap
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.config import load_config
+from pipeline.hashers import hash_arrow
+from pipeline.hashers import hash_parquet
+from pipeline.hashers import hash_pdf
+from pipeline.hashers import hash_png
+from pipeline.hashers import parse_hashers
+from pipeline.hashers import update_hash_with_array
+from pipeline.hashing import _compute_hash_of_file
+from pipeline.hashing import _get_algorithm_for_file
+
+
+def _hash(hasher, path):
+    h = hashlib.sha256()
+    hasher(path, h)
+    return h.hexdigest()
+
+
+@pytest.mark.unit
+def test_hash_parquet_ignores_layout_and_metadata(tmp_path):
+    df = pd.DataFrame({"a": range(100), "b": ["x", None] * 50})
+    path = tmp_path / "data.parquet"
+
+    df.to_parquet(path)
+    expected = _hash(hash_parquet, path)
+
+    df.to_parquet(path, compression="gzip", row_group_size=10)
+    assert _hash(hash_parquet, path) == expected
+
+    df.assign(a=lambda x: x.a + 1).to_parquet(path)
+    assert _hash(hash_parquet, path) != expected
+
+
+@pytest.mark.unit
+def test_hash_arrow_ignores_compression(tmp_path):
+    df = pd.DataFrame({"a": range(100), "b": [1.5, None] * 50})
+    path = tmp_path / "data.arrow"
+
+    df.to_feather(path, compression="uncompressed")
+    expected = _hash(hash_arrow, path)
+
+    df.to_feather(path, compression="zstd", chunksize=10)
+    assert _hash(hash_arrow, path) == expected
+
+    df.assign(b=1.0).to_feather(path)
+    assert _hash(hash_arrow, path) != expected
+
+
+@pytest.mark.unit
+def test_hash_parquet_includes_categories(tmp_path):
+    path = tmp_path / "data.parquet"
+
+    pd.DataFrame({"g": pd.Categorical(["a", "b", "a"])}).to_parquet(path)
+    expected = _hash(hash_parquet, path)
+
+    pd.DataFrame({"g": pd.Categorical(["a", "z", "a"])}).to_parquet(path)
+    assert _hash(hash_parquet, path) != expected
+
+
+@pytest.mark.unit
+def test_update_hash_with_sliced_and_nested_arrays():
+    pa = pytest.importorskip("pyarrow")
+
+    def hash_array(array):
+        h = hashlib.sha256()
+        update_hash_with_array(h, array)
+        return h.hexdigest()
+
+    numbers = pa.array([1, None, 3, 4, 5, 6, 7, 8, 9, 10])
+    assert hash_array(numbers.slice(1, 3)) == hash_array(pa.array([None, 3, 4]))
+
+    lists = pa.array([[1, 2], [3], [4, 5, 6]])
+    assert hash_array(lists.slice(1, 2)) == hash_array(pa.array([[3], [4, 5, 6]]))
+
+    type_ = pa.list_(pa.dictionary(pa.int32(), pa.string()))
+    assert hash_array(pa.array([["a", "b"], ["c"]], type_)) != hash_array(
+        pa.array([["a", "b"], ["z"]], type_)
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "hasher, suffix, metadata",
+    [
+        (hash_png, ".png", [{"Software": "a"}, {"Software": "b"}]),
+        (
+            hash_pdf,
+            ".pdf",
+            [
+                {"CreationDate": pd.Timestamp("2020-01-01").to_pydatetime()},
+                {"CreationDate": pd.Timestamp("2020-05-17").to_pydatetime()},
+            ],
+        ),
+    ],
+)
+def test_hash_figures_without_metadata(tmp_path, hasher, suffix, metadata):
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.plot([1, 2, 3])
+    paths = [tmp_path / f"{i}{suffix}" for i in range(3)]
+    for path, metadata_ in zip(paths, metadata):
+        fig.savefig(path, metadata=metadata_)
+    ax.plot([3, 2, 1])
+    fig.savefig(paths[2], metadata=metadata[0])
+    plt.close(fig)
+
+    assert paths[0].read_bytes() != paths[1].read_bytes()
+    assert _hash(hasher, paths[0]) == _hash(hasher, paths[1])
+    assert _hash(hasher, paths[0]) != _hash(hasher, paths[2])
+
+
+CUSTOM_HASHER = """
+def hash_first_line(path, h):
+    h.update(path.read_bytes().splitlines()[0])
+"""
+
+
+@pytest.mark.unit
+def test_register_custom_hasher(tmp_path):
+    tmp_path.joinpath("src").mkdir()
+    tmp_path.joinpath("src", "hashers.py").write_text(CUSTOM_HASHER)
+    config = {
+        "hash_algorithm": "sha256",
+        "hash_tree_threshold": 2 ** 30,
+        "project_directory": tmp_path.as_posix(),
+        "hashers": parse_hashers(
+            {"txt": "src.hashers:hash_first_line", "csv": None}, tmp_path.as_posix()
+        ),
+    }
+
+    path = tmp_path / "log.txt"
+    path.write_text("first\nsecond")
+    algorithm = _get_algorithm_for_file(path, config)
+    assert algorithm == "sha256-content-src.hashers:hash_first_line"
+    expected = _compute_hash_of_file(path, 0, algorithm)
+    path.write_text("first\nthird")
+    assert _compute_hash_of_file(path, 1, algorithm) == expected
+
+    path = tmp_path / "data.csv"
+    path.write_text("a\n")
+    assert _get_algorithm_for_file(path, config) == "sha256"
+
+
+@pytest.mark.unit
+def test_parse_unknown_hasher():
+    with pytest.raises(ValueError, match="Unknown hasher 'unknown'"):
+        parse_hashers({".txt": "unknown"}, ".")
+
+
+@pytest.mark.end_to_end
+def test_csv_with_other_line_endings_does_not_execute_tasks(test_project_config):
+    project_path = Path(test_project_config["project_directory"])
+    project_path.joinpath("src").mkdir()
+    data = project_path.joinpath("src", "data.csv")
+    data.write_bytes(b"a,b\n1,2\n")
+
+    tasks = {
+        "copy-csv": {
+            "template": "copy.py",
+            "depends_on": data.as_posix(),
+            "produces": "{{ build_directory }}/copy.csv",
+        }
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+    task = """
+    import shutil
+
+    shutil.copyfile("{{ depends_on }}", "{{ produces }}")
+    """
+    project_path.joinpath("src", "copy.py").write_text(textwrap.dedent(task))
+
+    os.chdir(project_path)
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "1/1 tasks" in result.output
+    assert load_config()["hashers"][".csv"] == "csv"
+
+    data.write_bytes(b"a,b\r\n1,2\r\n")
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
+
+    data.write_bytes(b"a,b\r\n1,3\r\n")
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "1/1 tasks" in result.output
@@ -1,6 +1,22 @@
+import hashlib
+import os
+import textwrap
+from pathlib import Path
+
+import pandas as pd
 import pytest
+import yaml
+from click.testing import CliRunner
 
+import pipeline.hashing
+from pipeline.cli import cli
+from pipeline.hashing import _compute_hash_of_columns
+from pipeline.hashing import _compute_hash_of_directory
+from pipeline.hashing import _compute_hash_of_file
 from pipeline.hashing import _compute_hash_of_string
+from pipeline.hashing import _get_algorithm_for_directory
+from pipeline.hashing import _get_algorithm_for_file
+from pipeline.hashing import DEFAULT_DIRECTORY_IGNORE
 
 
 @pytest.mark.unit
@@ -17,3 +33,221 @@ from pipeline.hashing import _compute_hash_of_string
 def test_compute_hash_of_string(string, result):
     hash_ = _compute_hash_of_string(string)
     assert hash_ == result
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("algorithm", ["sha256", "blake2b"])
+@pytest.mark.parametrize("mmap_threshold", [1, 2 ** 30])
+def test_compute_hash_of_file(tmp_path, monkeypatch, algorithm, mmap_threshold):
+    monkeypatch.setattr(pipeline.hashing, "MMAP_THRESHOLD", mmap_threshold)
+    content = os.urandom(300_000)
+    path = tmp_path / "file"
+    path.write_bytes(content)
+
+    hash_ = _compute_hash_of_file.__wrapped__(path, None, algorithm)
+
+    assert hash_ == hashlib.new(algorithm, content).hexdigest()
+
+
+@pytest.mark.unit
+def test_compute_tree_hash_of_file(tmp_path):
+    content = os.urandom(2_500)
+    path = tmp_path / "file"
+    path.write_bytes(content)
+
+    hash_ = _compute_hash_of_file.__wrapped__(path, None, "blake2b-tree-1000")
+
+    expected = hashlib.blake2b(len(content).to_bytes(8, "little"))
+    for i in range(0, len(content), 1_000):
+        expected.update(hashlib.blake2b(content[i : i + 1_000]).digest())
+    assert hash_ == expected.hexdigest()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "size, expected",
+    [(10, "blake2b"), (100, "blake2b-tree-20"), (200, "blake2b-tree-20")],
+)
+def test_get_algorithm_for_file(tmp_path, size, expected):
+    config = {
+        "hash_algorithm": "blake2b",
+        "hash_tree_threshold": 100,
+        "hash_tree_chunk_size": 20,
+    }
+    path = tmp_path / "file"
+    path.write_bytes(b"0" * size)
+
+    assert _get_algorithm_for_file(path, config) == expected
+
+
+@pytest.fixture()
+def directory_config(tmp_path):
+    return {
+        "hash_algorithm": "sha256",
+        "hash_tree_threshold": 2 ** 30,
+        "hash_tree_chunk_size": 2 ** 20,
+        "n_hashing_threads": 2,
+        "directory_ignore": DEFAULT_DIRECTORY_IGNORE,
+        "hidden_build_directory": (tmp_path / ".pipeline").as_posix(),
+    }
+
+
+@pytest.mark.unit
+def test_compute_hash_of_directory(tmp_path, directory_config):
+    directory = tmp_path / "data"
+    directory.joinpath("sub").mkdir(parents=True)
+    directory.joinpath("a.csv").write_text("a")
+    directory.joinpath("sub", "b.csv").write_text("b")
+    algorithm = _get_algorithm_for_directory(directory_config)
+
+    hash_ = _compute_hash_of_directory(directory, algorithm, directory_config)
+
+    # Temporary files and ignored files do not change the hash.
+    directory.joinpath("sub", "b.csv~").write_text("backup")
+    directory.joinpath("sub", "c.log").write_text("log")
+    directory.joinpath(".pipelineignore").write_text("# Comment\n*.log\n")
+    assert _compute_hash_of_directory(directory, algorithm, directory_config) == hash_
+
+    # Included files change the hash.
+    directory.joinpath(".pipelineignore").write_text("*.log\n!sub/c.log\n")
+    assert _compute_hash_of_directory(directory, algorithm, directory_config) != hash_
+
+    # Moving a file into another directory changes the hash.
+    directory.joinpath(".pipelineignore").unlink()
+    directory.joinpath("sub", "c.log").unlink()
+    directory.joinpath("sub", "b.csv").rename(directory.joinpath("b.csv"))
+    assert _compute_hash_of_directory(directory, algorithm, directory_config) != hash_
+
+
+@pytest.mark.unit
+def test_compute_hash_of_directory_reuses_manifest(
+    tmp_path, monkeypatch, directory_config
+):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    for i in range(3):
+        directory.joinpath(f"{i}.csv").write_text(str(i))
+    algorithm = _get_algorithm_for_directory(directory_config)
+
+    hash_ = _compute_hash_of_directory(directory, algorithm, directory_config)
+
+    hashed_files = []
+
+    def _record_hashed_file(path, *args):
+        hashed_files.append(path.name)
+        return _compute_hash_of_file.__wrapped__(path, *args)
+
+    monkeypatch.setattr(pipeline.hashing, "_compute_hash_of_file", _record_hashed_file)
+
+    assert _compute_hash_of_directory(directory, algorithm, directory_config) == hash_
+    assert hashed_files == []
+
+    directory.joinpath("1.csv").write_text("changed")
+    assert _compute_hash_of_directory(directory, algorithm, directory_config) != hash_
+    assert hashed_files == ["1.csv"]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_compute_hash_of_columns(tmp_path, directory_config, suffix):
+    directory_config["hidden_target_format"] = "csv"
+    path = tmp_path / f"data{suffix}"
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", None]})
+
+    def _write(df, **kwargs):
+        if suffix == ".parquet":
+            df.to_parquet(path, **kwargs)
+        else:
+            df.to_feather(path, **kwargs)
+
+    def _hash(columns):
+        return _compute_hash_of_columns(
+            path, columns, "sha256-columns", directory_config
+        )
+
+    _write(df)
+    hash_a, hash_b = _hash(["a"]), _hash(["b"])
+
+    # Changing another column or the layout of the file does not change the hash.
+    _write(df.assign(b=["z", "y", None]), compression="zstd")
+    assert _hash(["a"]) == hash_a
+    assert _hash(["b"]) != hash_b
+
+    _write(df.assign(a=[1, 2, 4]))
+    assert _hash(["a"]) != hash_a
+
+    # Changing the schema changes the hash.
+    _write(df.assign(c=1))
+    assert _hash(["a"]) != hash_a
+
+    with pytest.raises(ValueError, match="not an algorithm for columns"):
+        _compute_hash_of_columns(path, ["a"], "sha256", directory_config)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_compute_hash_of_categorical_and_unknown_columns(
+    tmp_path, directory_config, suffix
+):
+    directory_config["hidden_target_format"] = "csv"
+    path = tmp_path / f"data{suffix}"
+
+    def _hash(categories):
+        df = pd.DataFrame({"g": pd.Categorical(categories)})
+        if suffix == ".parquet":
+            df.to_parquet(path)
+        else:
+            df.to_feather(path)
+        return _compute_hash_of_columns(path, ["g"], "sha256-columns", directory_config)
+
+    # Relabelling a category changes the hash.
+    assert _hash(["a", "b", "a"]) != _hash(["a", "zz", "a"])
+
+    with pytest.raises(ValueError, match=r"columns \['typo'\] are not in"):
+        _compute_hash_of_columns(
+            path, ["g", "typo"], "sha256-columns", directory_config
+        )
+
+
+@pytest.mark.end_to_end
+def test_tasks_depend_only_on_declared_columns(test_project_config):
+    project_path = Path(test_project_config["project_directory"])
+    project_path.joinpath("src").mkdir()
+    data = project_path.joinpath("src", "data.parquet")
+    pd.DataFrame({"y": [1.0, 2.0], "x": [3.0, 4.0], "z": [5.0, 6.0]}).to_parquet(data)
+
+    tasks = {
+        "sum-columns": {
+            "template": "sum.py",
+            "depends_on": data.as_posix(),
+            "columns": ["y", "x"],
+            "produces": "{{ build_directory }}/sum.txt",
+        }
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+    task = """
+    from pathlib import Path
+
+    import pandas as pd
+
+    df = pd.read_parquet("{{ depends_on }}", columns={{ columns }})
+    Path("{{ produces }}").write_text(str(df.sum().sum()))
+    """
+    project_path.joinpath("src", "sum.py").write_text(textwrap.dedent(task))
+
+    os.chdir(project_path)
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "1/1 tasks" in result.output
+
+    pd.DataFrame({"y": [1.0, 2.0], "x": [3.0, 4.0], "z": [0.0, 0.0]}).to_parquet(data)
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "0/0 tasks" in result.output
+
+    pd.DataFrame({"y": [1.0, 2.0], "x": [3.0, 5.0], "z": [0.0, 0.0]}).to_parquet(data)
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "1/1 tasks" in result.output
+    assert project_path.joinpath("bld", "sum.txt").read_text() == "11.0"
@@ -0,0 +1,89 @@
+import os
+import textwrap
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.profiling import _parse_rprof_output
+
+
+@pytest.mark.unit
+def test_parse_rprof_output_with_memory_and_line_information():
+    text = textwrap.dedent(
+        """
+        memory profiling: line profiling: sample.interval=10000
+        #File 1: task.r
+        :1234:5678:0:0:"rnorm" "1#2" "eval"
+        :1234:5678:0:0:"rnorm" "eval"
+        "lm" "eval"
+        """
+    ).strip()
+    result = _parse_rprof_output(text)
+
+    assert result == {"rnorm": 0.02, "lm": 0.01}
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize(
+    "options, suffix",
+    [(["--profile"], ".cpu.prof"), (["--profile-mode", "mem"], ".mem.prof")],
+)
+def test_profile_selected_task(test_project_config, options, suffix):
+    config = test_project_config
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = textwrap.dedent(
+        """
+        task-1:
+            template: task.py
+            produces: {{ build_directory }}/out-1.txt
+
+        task-2:
+            template: task.py
+            produces: {{ build_directory }}/out-2.txt
+        """
+    )
+    project_path.joinpath("src", "tasks.yaml").write_text(tasks)
+
+    task = textwrap.dedent(
+        """
+        from pathlib import Path
+
+
+        def compute():
+            return [i ** 2 for i in range(100_000)]
+
+
+        if __name__ == '__main__':
+            compute()
+            Path("{{ produces }}").write_text("done")
+        """
+    )
+    project_path.joinpath("src", "task.py").write_text(task)
+
+    os.chdir(project_path)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build", *options, "task-1"])
+    assert result.exit_code == 0
+    assert "hotspots of task 'task-1'" in result.output
+    assert "hotspots of task 'task-2'" not in result.output
+
+    task_directory = project_path.joinpath("bld", ".tasks")
+    assert task_directory.joinpath("task-1" + suffix).exists()
+    assert not task_directory.joinpath("task-2" + suffix).exists()
+
+    # Selected tasks are profiled even if they are up-to-date.
+    result = runner.invoke(cli, ["build", *options, "task-1"])
+    assert result.exit_code == 0
+    assert "hotspots of task 'task-1'" in result.output
+
+    # Without profiling, passed tasks are rejected instead of building all tasks.
+    result = runner.invoke(cli, ["build", "task-1"])
+    assert result.exit_code == 2
+    assert "Tasks can only be passed with '--profile'" in result.output
+    assert "hotspots" not in result.output
+    assert "### Build Project" not in result.output
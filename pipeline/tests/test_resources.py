@@ -0,0 +1,135 @@
+import os
+import textwrap
+from pathlib import Path
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+import pipeline.resources
+from pipeline.cli import cli
+from pipeline.execution import _patch_subprocess_environment
+from pipeline.resources import count_available_cpus
+from pipeline.resources import determine_n_jobs
+from pipeline.resources import split_cpus
+from pipeline.resources import THREAD_ENVIRONMENT_VARIABLES
+
+
+@pytest.fixture
+def fake_cgroup(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.resources, "CGROUP_DIRECTORY", tmp_path)
+    monkeypatch.setattr(pipeline.resources, "MEMINFO", tmp_path / "meminfo")
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)))
+    return tmp_path
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "cpu_max, expected", [(None, 8), ("max 100000", 8), ("250000 100000", 2)]
+)
+def test_count_available_cpus_with_cgroup_quota(fake_cgroup, cpu_max, expected):
+    if cpu_max is not None:
+        fake_cgroup.joinpath("cpu.max").write_text(cpu_max)
+    assert count_available_cpus() == expected
+
+
+@pytest.mark.unit
+def test_count_available_cpus_with_cgroup_v1_quota(fake_cgroup):
+    fake_cgroup.joinpath("cpu").mkdir()
+    fake_cgroup.joinpath("cpu", "cpu.cfs_quota_us").write_text("300000")
+    fake_cgroup.joinpath("cpu", "cpu.cfs_period_us").write_text("100000")
+    assert count_available_cpus() == 3
+
+
+@pytest.mark.unit
+def test_determine_n_jobs_limited_by_memory(fake_cgroup):
+    fake_cgroup.joinpath("meminfo").write_text("MemAvailable:   16777216 kB\n")
+    fake_cgroup.joinpath("memory.max").write_text(str(10 * 1024 ** 3))
+    fake_cgroup.joinpath("memory.current").write_text(str(2 * 1024 ** 3))
+
+    assert determine_n_jobs(16) == 16
+    assert determine_n_jobs(16, threads=2) == 8
+    assert determine_n_jobs(16, memory_per_job="2G") == 4
+    assert determine_n_jobs(16, memory_per_job="100G") == 1
+
+
+@pytest.mark.unit
+def test_patch_subprocess_environment_limits_threads(monkeypatch):
+    for variable in THREAD_ENVIRONMENT_VARIABLES:
+        monkeypatch.delenv(variable, raising=False)
+    config = {"project_directory": ".", "threads_per_job": 2}
+
+    env = _patch_subprocess_environment(config)
+    assert all(env[variable] == "2" for variable in THREAD_ENVIRONMENT_VARIABLES)
+
+    env = _patch_subprocess_environment(config, threads=4)
+    assert all(env[variable] == "4" for variable in THREAD_ENVIRONMENT_VARIABLES)
+
+    # Variables of the user are kept unless the task requests threads.
+    monkeypatch.setenv("OMP_NUM_THREADS", "1")
+    assert _patch_subprocess_environment(config)["OMP_NUM_THREADS"] == "1"
+    assert _patch_subprocess_environment(config, threads=4)["OMP_NUM_THREADS"] == "4"
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "n_cpus, n_sets, expected",
+    [
+        (8, 2, [{0, 1, 2, 3}, {4, 5, 6, 7}]),
+        (5, 2, [{0, 1}, {2, 3, 4}]),
+        (2, 3, [{0}, {1}, {0}]),
+    ],
+)
+def test_split_cpus(monkeypatch, n_cpus, n_sets, expected):
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(n_cpus)))
+    assert split_cpus(n_sets) == expected
+
+
+@pytest.mark.end_to_end
+def test_build_with_auto_jobs_and_threads(test_project_config, monkeypatch):
+    for variable in THREAD_ENVIRONMENT_VARIABLES:
+        monkeypatch.delenv(variable, raising=False)
+
+    config = test_project_config
+    config["n_jobs"] = "auto"
+    config["pin_cpus"] = True
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = {
+        "threads-default": {
+            "template": "threads.py",
+            "produces": "{{ build_directory }}/threads-default.txt",
+        },
+        "threads-four": {
+            "template": "threads.py",
+            "threads": 4,
+            "produces": "{{ build_directory }}/threads-four.txt",
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    task = """
+    import os
+    from pathlib import Path
+
+    Path("{{ produces }}").write_text(os.environ["OMP_NUM_THREADS"])
+    """
+    project_path.joinpath("src", "threads.py").write_text(textwrap.dedent(task))
+
+    os.chdir(project_path)
+
+    result = CliRunner().invoke(cli, ["build", "-n", "auto"])
+
+    assert result.exit_code == 0
+    assert project_path.joinpath("bld", "threads-default.txt").read_text() == "1"
+    assert project_path.joinpath("bld", "threads-four.txt").read_text() == "4"
+
+
+@pytest.mark.end_to_end
+def test_build_with_invalid_number_of_jobs():
+    result = CliRunner().invoke(cli, ["build", "-n", "many"])
+    assert result.exit_code == 2
+    assert "'many' is neither an integer nor 'auto'." in result.output
@@ -0,0 +1,121 @@
+import os
+import textwrap
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.sampling import parse_sample
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "sample, expected", [("10%", 0.1), (" 1 % ", 0.01), ("0.25", 0.25), (1, 1.0)]
+)
+def test_parse_sample(sample, expected):
+    assert parse_sample(sample) == pytest.approx(expected)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("sample", ["0%", "150%", -0.1, 2])
+def test_parse_sample_raises_error(sample):
+    with pytest.raises(ValueError, match="'sample' must be a fraction"):
+        parse_sample(sample)
+
+
+@pytest.fixture
+def sampling_project(test_project_config):
+    config = test_project_config
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    pd.DataFrame({"id": [i % 100 for i in range(1_000)], "x": range(1_000)}).to_csv(
+        project_path.joinpath("src", "data.csv"), index=False
+    )
+
+    tasks = {
+        "copy-data": {
+            "template": "copy_data.py",
+            "depends_on": "{{ source_directory }}/data.csv",
+            "produces": "{{ build_directory }}/copy.csv",
+        },
+        "count-rows": {
+            "template": "count_rows.py",
+            "depends_on": "copy-data",
+            "produces": "{{ build_directory }}/count.txt",
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    copy_data = """
+    {% include 'load_data.py' %}
+
+    {% include 'save_data.py' %}
+
+    save_data(load_data("{{ depends_on }}"), "{{ produces }}")
+    """
+    project_path.joinpath("src", "copy_data.py").write_text(textwrap.dedent(copy_data))
+
+    count_rows = """
+    {% include 'load_data.py' %}
+
+    df = load_data("{{ depends_on }}")
+    Path("{{ produces }}").write_text(f"{len(df)},{df.id.nunique()}")
+    """
+    project_path.joinpath("src", "count_rows.py").write_text(
+        textwrap.dedent(count_rows)
+    )
+
+    os.chdir(project_path)
+
+    yield project_path
+
+
+@pytest.mark.end_to_end
+def test_build_with_sample(sampling_project):
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["build", "--sample", "10%"])
+    assert result.exit_code == 0
+
+    # Only the root dependency is sampled and the full build directory is untouched.
+    n_rows, _ = (
+        sampling_project.joinpath("bld-sample", "count.txt").read_text().split(",")
+    )
+    assert 50 < int(n_rows) < 150
+    copy = pd.read_csv(sampling_project.joinpath("bld-sample", "copy.csv"))
+    assert len(copy) == int(n_rows)
+    assert not sampling_project.joinpath("bld", "count.txt").exists()
+
+    # The sample is deterministic.
+    sampling_project.joinpath("bld-sample", "count.txt").unlink()
+    result = runner.invoke(cli, ["build", "--sample", "10%"])
+    assert result.exit_code == 0
+    n_rows_again, _ = (
+        sampling_project.joinpath("bld-sample", "count.txt").read_text().split(",")
+    )
+    assert n_rows_again == n_rows
+
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert sampling_project.joinpath("bld", "count.txt").read_text() == "1000,100"
+
+
+@pytest.mark.end_to_end
+def test_build_with_sample_by_units(sampling_project):
+    config = yaml.safe_load(sampling_project.joinpath(".pipeline.yaml").read_text())
+    config.update(sample="20%", sample_by="id")
+    sampling_project.joinpath(".pipeline.yaml").write_text(yaml.dump(config))
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    # All rows of the sampled units are kept.
+    n_rows, n_units = (
+        sampling_project.joinpath("bld-sample", "count.txt").read_text().split(",")
+    )
+    assert int(n_rows) == 10 * int(n_units)
+    assert 0 < int(n_units) < 100
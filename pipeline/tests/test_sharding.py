@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import textwrap
+from pathlib import Path
+
+import networkx as nx
+import pytest
+import yaml
+from click.testing import CliRunner
+
+import pipeline.sharding
+from pipeline.cli import cli
+from pipeline.database import merge_databases
+from pipeline.sharding import parse_shard
+from pipeline.sharding import select_shard
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("shard, expected", [("1/2", (1, 2)), ("3/3", (3, 3))])
+def test_parse_shard(shard, expected):
+    assert parse_shard(shard) == expected
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("shard", ["0/2", "3/2", "1", "a/b"])
+def test_parse_invalid_shard(shard):
+    with pytest.raises(ValueError, match="'shard' must"):
+        parse_shard(shard)
+
+
+def _create_chains(lengths):
+    dag = nx.DiGraph()
+    for i, length in enumerate(lengths):
+        for j in range(length):
+            dag.add_edge(f"task-{i}-{j}", f"file-{i}-{j}")
+            if j > 0:
+                dag.add_edge(f"file-{i}-{j - 1}", f"task-{i}-{j}")
+
+    return dag
+
+
+@pytest.mark.unit
+def test_select_shard_keeps_connected_tasks_together(monkeypatch):
+    monkeypatch.setattr(pipeline.sharding, "load_runtimes", lambda ids: {})
+    dag = _create_chains([3, 1, 1, 1])
+    tasks = {node for node in dag if node.startswith("task")}
+
+    shards = [select_shard(dag, tasks, {"shard": (i, 2)}) for i in (1, 2)]
+
+    assert shards[0] | shards[1] == tasks
+    assert not shards[0] & shards[1]
+    assert {"task-0-0", "task-0-1", "task-0-2"} <= shards[0]
+    assert len(shards[1]) == 3
+    # The assignment is deterministic.
+    assert select_shard(dag, tasks, {"shard": (2, 2)}) == shards[1]
+
+
+@pytest.mark.unit
+def test_select_shard_balances_runtimes(monkeypatch):
+    runtimes = {"task-0-0": 10, "task-1-0": 6, "task-2-0": 3, "task-3-0": 2}
+    monkeypatch.setattr(pipeline.sharding, "load_runtimes", lambda ids: runtimes)
+    dag = _create_chains([1, 1, 1, 1])
+
+    shards = [select_shard(dag, set(runtimes), {"shard": (i, 2)}) for i in (1, 2)]
+
+    assert shards == [{"task-0-0"}, {"task-1-0", "task-2-0", "task-3-0"}]
+
+
+def _create_database(path, hashes, runtimes):
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(
+            'CREATE TABLE "Hash" ("task" TEXT NOT NULL, "dependency" TEXT NOT NULL, '
+            '"hash_" TEXT NOT NULL, "algorithm" TEXT NOT NULL, '
+            'PRIMARY KEY ("task", "dependency"))'
+        )
+        connection.execute(
+            'CREATE TABLE "Runtime" ("task" TEXT NOT NULL PRIMARY KEY, '
+            '"seconds" REAL NOT NULL, "finished" REAL NOT NULL)'
+        )
+        connection.executemany('INSERT INTO "Hash" VALUES (?, ?, ?, ?)', hashes)
+        connection.executemany('INSERT INTO "Runtime" VALUES (?, ?, ?)', runtimes)
+    connection.close()
+
+
+@pytest.mark.unit
+def test_merge_databases_keeps_hashes_of_last_execution(tmp_path):
+    _create_database(
+        tmp_path / "main.sql",
+        [("a", "a.txt", "old", "sha256"), ("b", "b.txt", "new", "sha256")],
+        [("a", 1.0, 100.0), ("b", 1.0, 200.0)],
+    )
+    _create_database(
+        tmp_path / "shard.sql",
+        [
+            ("a", "a.txt", "new", "sha256"),
+            ("b", "b.txt", "old", "sha256"),
+            ("c", "c.txt", "new", "sha256"),
+        ],
+        [("a", 2.0, 150.0), ("b", 2.0, 150.0), ("c", 3.0, 150.0)],
+    )
+    config = {"db": {"provider": "sqlite", "filename": str(tmp_path / "main.sql")}}
+
+    n_merged = merge_databases([tmp_path / "shard.sql"], config)
+
+    connection = sqlite3.connect(tmp_path / "main.sql")
+    hashes = dict(connection.execute('SELECT task, hash_ FROM "Hash"').fetchall())
+    runtimes = dict(
+        connection.execute('SELECT task, seconds FROM "Runtime"').fetchall()
+    )
+    connection.close()
+
+    assert n_merged == 2
+    assert hashes == {"a": "new", "b": "new", "c": "new"}
+    assert runtimes == {"a": 2.0, "b": 1.0, "c": 3.0}
+
+
+@pytest.mark.end_to_end
+def test_build_shards(test_project_config):
+    config = test_project_config
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = {
+        **{
+            f"shard-write-{i}": {
+                "template": "write.py",
+                "produces": "{{ build_directory }}/" + f"shard-{i}.txt",
+            }
+            for i in range(4)
+        },
+        "shard-append": {
+            "template": "append.py",
+            "depends_on": "shard-write-0",
+            "produces": "{{ build_directory }}/shard-append.txt",
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    write = """
+    from pathlib import Path
+
+    Path("{{ produces }}").write_text("written")
+    """
+    project_path.joinpath("src", "write.py").write_text(textwrap.dedent(write))
+    append = """
+    from pathlib import Path
+
+    Path("{{ produces }}").write_text(Path("{{ depends_on }}").read_text() + "!")
+    """
+    project_path.joinpath("src", "append.py").write_text(textwrap.dedent(append))
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    os.chdir(project_path)
+
+    # The first shard contains the connected tasks and one more task.
+    result = CliRunner().invoke(cli, ["build", "--shard", "1/2"])
+    assert result.exit_code == 0
+    assert "3/3 tasks" in result.output
+    assert project_path.joinpath("bld", "shard-append.txt").read_text() == "written!"
+    assert len(list(project_path.joinpath("bld").glob("shard-*.txt"))) == 3
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+    assert "2/2 tasks" in result.output
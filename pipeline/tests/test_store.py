@@ -0,0 +1,172 @@
+import os
+import textwrap
+from pathlib import Path
+
+import jinja2
+import networkx as nx
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.store import _count_consumers
+from pipeline.store import _is_shareable
+
+
+@pytest.mark.unit
+def test_count_consumers():
+    dag = nx.DiGraph()
+    dag.add_node("data.csv", _is_task=False)
+    dag.add_node("data.txt", _is_task=False)
+    for id_, template in [("a", "a.py"), ("b", "b.py"), ("c", "c.r"), ("d", "d.py")]:
+        dag.add_node(id_, _is_task=True, template=template)
+        dag.add_edge("data.csv", id_)
+        dag.add_edge("data.txt", id_)
+
+    config = {"dataset_store_min_consumers": 2, "hidden_target_format": "csv"}
+    consumers = _count_consumers(dag, {"a", "b", "c"}, jinja2.Environment(), config)
+
+    assert consumers == {"data.csv": 2}
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "template, target, expected",
+    [
+        ("create_data.py", "bld/.pipeline/create-data", True),
+        ("create_data.py", "bld/data.pkl", True),
+        ("create_data.py", "bld/data.txt", False),
+        ("fit_model.py", "bld/.pipeline/fit-model", False),
+        ("fit_model.py", "bld/model.pkl", False),
+        ("fit_model.py", "bld/data.csv", False),
+    ],
+)
+def test_shareability_is_declared_by_the_producer(template, target, expected):
+    env = jinja2.Environment(
+        loader=jinja2.DictLoader(
+            {
+                "create_data.py": "{% include 'save_data.py' %}",
+                "fit_model.py": "{% include 'estimation.py' %}",
+                "estimation.py": "{% include 'save_model.py' %}",
+                "save_data.py": "",
+                "save_model.py": "",
+            }
+        )
+    )
+    dag = nx.DiGraph()
+    dag.add_node("task", _is_task=True, template=template)
+    dag.add_node(target, _is_task=False)
+    dag.add_edge("task", target)
+
+    config = {"hidden_target_format": "parquet"}
+    assert _is_shareable(target, dag, env, config) is expected
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("n_jobs", ["1", "2"])
+def test_dataset_store(test_project_config, n_jobs):
+    pytest.importorskip("pyarrow")
+    config = test_project_config
+    config["dataset_store"] = True
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    tasks = {
+        "create-data": {
+            "template": "create_data.py",
+            "produces": "{{ build_directory }}/data.csv",
+        },
+        **{
+            f"load-data-{i}": {
+                "template": "load_data_task.py",
+                "depends_on": "create-data",
+                "columns": ["b"],
+            }
+            for i in range(3)
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    create_data = """
+    import pandas as pd
+
+    {% include 'save_data.py' %}
+
+    save_data(pd.DataFrame({"a": [1, 2, 3], "b": [4, 5, 6]}), "{{ produces }}")
+    """
+    project_path.joinpath("src", "create_data.py").write_text(
+        textwrap.dedent(create_data)
+    )
+
+    load_data_task = """
+    import os
+
+    {% include 'load_data.py' %}
+
+    df = load_data("{{ depends_on }}", columns={{ columns }})
+    store = os.environ.get("PIPELINE_DATASET_STORE", "")
+    Path("{{ produces }}").write_text(f"{list(df.columns)}:{df.b.sum()}:{bool(store)}")
+    """
+    project_path.joinpath("src", "load_data_task.py").write_text(
+        textwrap.dedent(load_data_task)
+    )
+
+    os.chdir(project_path)
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build", "-n", n_jobs])
+
+    assert result.exit_code == 0
+    for i in range(3):
+        path = project_path.joinpath("bld", ".pipeline", f"load-data-{i}")
+        assert path.read_text() == "['b']:15:True"
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("produces", [None, "{{ build_directory }}/model.pkl"])
+def test_dataset_store_with_shared_model(test_project_config, produces):
+    pytest.importorskip("pyarrow")
+    config = test_project_config
+    config["dataset_store"] = True
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+
+    fit_model = {"template": "fit_model.py"}
+    if produces is not None:
+        fit_model["produces"] = produces
+    tasks = {
+        "fit-model": fit_model,
+        **{
+            f"use-model-{i}": {"template": "use_model.py", "depends_on": "fit-model"}
+            for i in range(2)
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+
+    fit_model = """
+    {% include 'save_model.py' %}
+
+    save_model({"coefficient": 2}, "{{ produces }}")
+    """
+    project_path.joinpath("src", "fit_model.py").write_text(textwrap.dedent(fit_model))
+
+    use_model = """
+    from pathlib import Path
+
+    import joblib
+
+    model = joblib.load("{{ depends_on }}")
+    Path("{{ produces }}").write_text(str(model["coefficient"]))
+    """
+    project_path.joinpath("src", "use_model.py").write_text(textwrap.dedent(use_model))
+
+    os.chdir(project_path)
+    result = CliRunner().invoke(cli, ["build"])
+
+    assert result.exit_code == 0
+    for i in range(2):
+        path = project_path.joinpath("bld", ".pipeline", f"use-model-{i}")
+        assert path.read_text() == "2"
@@ -6,6 +6,7 @@ import yaml
 from pipeline.config import load_config
 from pipeline.cli import cli
 from pathlib import Path
+import pandas as pd
 import pytest
 
 
@@ -83,3 +84,479 @@ def test_globals_in_templates(test_project_config):
         config["globals"]["a"]
         == Path(config["hidden_build_directory"], "task").read_text()
     )
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("hidden_target_format", ["parquet", "arrow"])
+def test_column_projection_with_hidden_target_format(
+    test_project_config, hidden_target_format
+):
+    """Test saving and loading columns of data sets in Arrow formats."""
+    pytest.importorskip("pyarrow")
+    config = test_project_config
+
+    config["hidden_target_format"] = hidden_target_format
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    tasks = {
+        "create-data": {"template": "create_data.py"},
+        "load-columns": {
+            "template": "load_columns.py",
+            "depends_on": "create-data",
+            "columns": ["a"],
+            "filters": [["a", ">", 1]],
+        },
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    create_data = """
+    import pandas as pd
+
+    {% include 'save_data.py' %}
+
+    save_data(pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}), "{{ produces }}")
+    """
+    Path(config["source_directory"], "create_data.py").write_text(
+        textwrap.dedent(create_data)
+    )
+
+    load_columns = """
+    from pathlib import Path
+
+    {% include 'load_data.py' %}
+
+    df = load_data(
+        "{{ depends_on }}", columns={{ columns }}, filters={{ filters }}
+    )
+    Path("{{ produces }}").write_text(",".join(df.columns) + ":" + str(df.a.sum()))
+    """
+    Path(config["source_directory"], "load_columns.py").write_text(
+        textwrap.dedent(load_columns)
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    path = Path(config["hidden_build_directory"], "load-columns")
+    assert path.read_text() == "a:5"
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("hidden_target_format", ["csv", "parquet", "arrow"])
+def test_streaming_templates(test_project_config, hidden_target_format):
+    """Test transforming and aggregating data sets in chunks."""
+    if hidden_target_format != "csv":
+        pytest.importorskip("pyarrow")
+    config = test_project_config
+
+    config["hidden_target_format"] = hidden_target_format
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    tasks = {
+        "create-data": {"template": "create_data.py"},
+        "transform": {
+            "template": "transform.py",
+            "depends_on": "create-data",
+            "chunksize": 2,
+        },
+        "aggregate": {
+            "template": "aggregate.py",
+            "depends_on": "transform",
+            "chunksize": 2,
+        },
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    create_data = """
+    import pandas as pd
+
+    {% include 'save_data_chunked.py' %}
+
+    with ChunkWriter("{{ produces }}") as writer:
+        writer.write(pd.DataFrame({"g": ["a", "b", "a"], "x": [1, 2, 3]}))
+        writer.write(pd.DataFrame({"g": ["b", "a"], "x": [4, 5]}))
+    """
+    Path(config["source_directory"], "create_data.py").write_text(
+        textwrap.dedent(create_data)
+    )
+
+    transform = """
+    {% extends 'stream_transform.py' %}
+
+    {% block transform_chunk %}
+        chunk = chunk.assign(x=chunk.x * 10)
+    {% endblock %}
+    """
+    Path(config["source_directory"], "transform.py").write_text(
+        textwrap.dedent(transform)
+    )
+
+    aggregate = """
+    {% extends 'stream_aggregate.py' %}
+
+    {% block aggregate_chunk %}
+        result = chunk.groupby("g").x.sum().to_frame()
+    {% endblock %}
+
+    {% block finalize %}
+        result = result.reset_index()
+    {% endblock %}
+    """
+    Path(config["source_directory"], "aggregate.py").write_text(
+        textwrap.dedent(aggregate)
+    )
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    path = Path(config["hidden_build_directory"], "aggregate")
+    if hidden_target_format == "csv":
+        df = pd.read_csv(path)
+    elif hidden_target_format == "parquet":
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_feather(path)
+    assert df.set_index("g").x.to_dict() == {"a": 90, "b": 60}
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("suffix", ["csv", "parquet"])
+def test_stream_aggregate_without_selected_rows(test_project_config, suffix):
+    """Test that a filter which removes all rows yields an empty aggregate."""
+    pytest.importorskip("pyarrow")
+    config = test_project_config
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    data = pd.DataFrame({"g": ["a", "b"], "x": [1, 2]})
+    path = Path(config["source_directory"], f"data.{suffix}")
+    if suffix == "csv":
+        data.iloc[:0].to_csv(path, index=False)
+        filters = None
+    else:
+        data.to_parquet(path)
+        filters = [["x", ">", 10]]
+
+    tasks = {
+        "aggregate": {
+            "template": "aggregate.py",
+            "depends_on": f"{{{{ source_directory }}}}/data.{suffix}",
+            "filters": filters,
+            "produces": "{{ build_directory }}/aggregate.csv",
+        }
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    aggregate = """
+    {% extends 'stream_aggregate.py' %}
+
+    {% block aggregate_chunk %}
+        result = chunk.groupby("g").x.sum().to_frame()
+    {% endblock %}
+    """
+    Path(config["source_directory"], "aggregate.py").write_text(
+        textwrap.dedent(aggregate)
+    )
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    df = pd.read_csv(Path(config["build_directory"], "aggregate.csv"))
+    assert list(df.columns) == ["g", "x"]
+    assert df.empty
+
+
+@pytest.mark.end_to_end
+def test_ols_specifications(test_project_config):
+    """Test fitting a grid of specifications in one task."""
+    statsmodels_formula = pytest.importorskip("statsmodels.formula.api")
+    joblib = pytest.importorskip("joblib")
+    config = test_project_config
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    data = pd.DataFrame(
+        {
+            "y": [1.0, 3.0, 2.0, 5.0, 4.0, 6.0, 8.0, None],
+            "z": [2.0, 1.0, 4.0, 3.0, 6.0, 5.0, 7.0, 9.0],
+            "x": [0.5, 1.0, 1.5, 2.5, 2.0, 3.0, 4.0, 4.5],
+            "g": ["a", "b", "a", "b", "c", "c", "a", "b"],
+        }
+    )
+    data.to_csv(Path(config["source_directory"], "data.csv"), index=False)
+
+    paths = [Path(config["build_directory"], f"model-{i}.pkl") for i in range(4)]
+    tasks = {
+        "ols-grid": {
+            "template": "ols_specifications.py",
+            "depends_on": "{{ source_directory }}/data.csv",
+            "outcomes": ["y", "z"],
+            "regressors": ["x", "x + C(g)"],
+            "produces": [path.as_posix() for path in paths],
+        }
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    formulas = ["y ~ x", "y ~ x + C(g)", "z ~ x", "z ~ x + C(g)"]
+    for formula, path in zip(formulas, paths):
+        model = joblib.load(path)
+        expected = statsmodels_formula.ols(formula, data=data).fit()
+
+        assert model.nobs == expected.nobs
+        assert list(model.params.index) == list(expected.params.index)
+        assert model.params.values == pytest.approx(expected.params.values)
+        assert model.bse.values == pytest.approx(expected.bse.values)
+        assert model.rsquared == pytest.approx(expected.rsquared)
+
+
+@pytest.mark.end_to_end
+def test_ols_specifications_are_coded_like_single_models(test_project_config):
+    """Test that categorical variables are coded like in a model of one formula."""
+    statsmodels_formula = pytest.importorskip("statsmodels.formula.api")
+    joblib = pytest.importorskip("joblib")
+    config = test_project_config
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    n = 30
+    data = pd.DataFrame(
+        {
+            "x": [(i * 37 % 101) / 10 for i in range(n)],
+            "g": [["a", "b", "c"][i % 3] for i in range(n)],
+            "h": [["u", "v"][i % 2] for i in range(n)],
+        }
+    )
+    data["y"] = 1 + 2 * data.x + [(i * 17 % 13) / 13 for i in range(n)]
+    data.to_csv(Path(config["source_directory"], "data.csv"), index=False)
+
+    formulas = ["y ~ x", "y ~ C(g):x", "y ~ C(g) + C(g):C(h)", "y ~ C(h) + x - 1"]
+    paths = [Path(config["build_directory"], f"model-{i}.pkl") for i in range(4)]
+    tasks = {
+        "ols-grid": {
+            "template": "ols_specifications.py",
+            "depends_on": "{{ source_directory }}/data.csv",
+            "formulas": formulas,
+            "produces": [path.as_posix() for path in paths],
+        }
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    result = CliRunner().invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    for formula, path in zip(formulas, paths):
+        model = joblib.load(path)
+        expected = statsmodels_formula.ols(formula, data=data).fit()
+
+        assert list(model.params.index) == list(expected.params.index)
+        assert model.params.values == pytest.approx(expected.params.values)
+        assert model.bse.values == pytest.approx(expected.bse.values)
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize(
+    "formula", ["y ~ x", "y ~ x + C(group)", "y ~ x + C(group) - 1"]
+)
+def test_ols_with_fixed_effects(test_project_config, formula):
+    """Test that absorbed fixed effects yield the same estimates as dummies."""
+    statsmodels_formula = pytest.importorskip("statsmodels.formula.api")
+    joblib = pytest.importorskip("joblib")
+    config = test_project_config
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    n = 200
+    data = pd.DataFrame(
+        {
+            "firm": [i % 7 for i in range(n)],
+            "year": [i % 5 for i in range(n)],
+            "x": [(i * 37 % 101) / 10 for i in range(n)],
+            "group": ["abcd"[i % 4] for i in range(n)],
+        }
+    )
+    data["y"] = 2 * data.x + data.firm + 0.5 * data.year + [i % 3 for i in range(n)]
+    data.loc[data.group == "b", "y"] += 1
+    data.to_csv(Path(config["source_directory"], "data.csv"), index=False)
+
+    tasks = {
+        "ols-fe": {
+            "template": "ols_fe.py",
+            "depends_on": "{{ source_directory }}/data.csv",
+            "formula": formula,
+            "absorb": ["firm", "year"],
+            "produces": "{{ build_directory }}/model.pkl",
+        }
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    model = joblib.load(Path(config["build_directory"], "model.pkl"))
+    # Categorical regressors are coded with a reference level like with an intercept.
+    expected = statsmodels_formula.ols(
+        formula.replace(" - 1", "") + " + C(firm) + C(year)", data=data
+    ).fit()
+
+    assert list(model.params.index) == [
+        name for name in expected.params.index if name in model.params.index
+    ]
+    assert model.params.values == pytest.approx(expected.params[model.params.index])
+    assert model.df_resid == expected.df_resid
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("bootstrap_n_jobs", [1, 2])
+def test_bootstrap(test_project_config, bootstrap_n_jobs):
+    """Test that replications are reproducible and equal to fits on resampled data."""
+    statsmodels_formula = pytest.importorskip("statsmodels.formula.api")
+    np = pytest.importorskip("numpy")
+    config = test_project_config
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    data = pd.DataFrame({"x": [(i * 37 % 101) / 10 for i in range(100)]})
+    data["y"] = 1 + 2 * data.x + [(i * 17 % 13) / 13 for i in range(100)]
+    data.to_csv(Path(config["source_directory"], "data.csv"), index=False)
+
+    tasks = {
+        "bootstrap": {
+            "template": "bootstrap.py",
+            "depends_on": "{{ source_directory }}/data.csv",
+            "formula": "y ~ x",
+            "n_replications": 20,
+            "seed": 42,
+            "bootstrap_n_jobs": bootstrap_n_jobs,
+            "produces": "{{ build_directory }}/coefficients.csv",
+        }
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    coefficients = pd.read_csv(
+        Path(config["build_directory"], "coefficients.csv"), index_col="replication"
+    )
+    assert coefficients.shape == (20, 2)
+
+    seed = np.random.SeedSequence(42).spawn(20)[7]
+    indices = np.random.default_rng(seed).integers(0, 100, 100)
+    expected = statsmodels_formula.ols("y ~ x", data=data.iloc[indices]).fit()
+    assert coefficients.loc[7].values == pytest.approx(expected.params.values)
+
+
+@pytest.mark.end_to_end
+@pytest.mark.parametrize("compress", [0, 3])
+def test_lean_models_in_stargazer(test_project_config, compress):
+    """Test that models without data are smaller and render the same table."""
+    pytest.importorskip("statsmodels")
+    pytest.importorskip("stargazer")
+    config = test_project_config
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    data = pd.DataFrame({"x": [(i * 37 % 101) / 10 for i in range(5_000)]})
+    data["y"] = 1 + 2 * data.x + [(i * 17 % 13) / 13 for i in range(5_000)]
+    data.to_csv(Path(config["source_directory"], "data.csv"), index=False)
+
+    tasks = {}
+    for name, remove_data in [("full", False), ("lean", True)]:
+        tasks[f"ols-{name}"] = {
+            "template": "ols.py",
+            "depends_on": "{{ source_directory }}/data.csv",
+            "formula": "y ~ x",
+            "remove_data": remove_data,
+            "compress": compress,
+            "produces": "{{ build_directory }}/" + f"ols-{name}.pkl",
+        }
+        tasks[f"table-{name}"] = {
+            "template": "stargazer.py",
+            "depends_on": "{{ build_directory }}/" + f"ols-{name}.pkl",
+            "produces": "{{ build_directory }}/" + f"table-{name}.html",
+        }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    build = Path(config["build_directory"])
+    assert build.joinpath("ols-lean.pkl").stat().st_size < (
+        build.joinpath("ols-full.pkl").stat().st_size / 2
+    )
+    assert (
+        build.joinpath("table-lean.html").read_text()
+        == build.joinpath("table-full.html").read_text()
+    )
+
+
+@pytest.mark.end_to_end
+def test_binned_figures(test_project_config):
+    """Test that the figures for large data sets only load the columns they need."""
+    pytest.importorskip("matplotlib")
+    config = test_project_config
+
+    os.chdir(config["project_directory"])
+    config = load_config()
+    Path(config["source_directory"]).mkdir()
+
+    data = pd.DataFrame(
+        {
+            "x": [(i * 37 % 101) / 10 for i in range(1_000)],
+            "y": [(i * 17 % 13) / 13 for i in range(1_000)],
+            "z": ["a"] * 1_000,
+        }
+    )
+    data.loc[3, "x"] = None
+    data.to_csv(Path(config["source_directory"], "data.csv"), index=False)
+
+    tasks = {
+        template: {
+            "template": f"{template}.py",
+            "depends_on": "{{ source_directory }}/data.csv",
+            "produces": "{{ build_directory }}/" + f"{template}.png",
+            **({"a": "x"} if template == "histogram" else {"x": "x", "y": "y"}),
+        }
+        for template in ["binscatter", "hexbin", "hist2d", "histogram"]
+    }
+    Path(config["source_directory"], "task.yaml").write_text(yaml.dump(tasks))
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["build"])
+    assert result.exit_code == 0
+
+    for template in tasks:
+        assert Path(config["build_directory"], f"{template}.png").exists()
+        task = Path(config["hidden_task_directory"], f"{template}.py").read_text()
+        assert "matplotlib.use(\"Agg\")" in task
+        expected = "['x']" if template == "histogram" else "['x', 'y']"
+        assert f"columns={expected}," in task
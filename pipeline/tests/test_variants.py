@@ -0,0 +1,200 @@
+import os
+import textwrap
+from pathlib import Path
+
+import networkx as nx
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from pipeline.cli import cli
+from pipeline.variants import parse_variants
+from pipeline.variants import prune_task_cache
+from pipeline.variants import select_variants
+from pipeline.variants import TaskCache
+
+
+@pytest.mark.unit
+def test_parse_invalid_variants():
+    with pytest.raises(ValueError, match="must map names to values"):
+        parse_variants({"recent": 2000})
+
+
+@pytest.mark.unit
+def test_select_unknown_variant():
+    with pytest.raises(ValueError, match=r"Unknown variant\(s\) \['c'\]"):
+        select_variants("a,c", {"a": {}, "b": {}})
+
+
+def _create_config(tmp_path, variant):
+    build_directory = tmp_path.joinpath(f"bld-{variant}").as_posix()
+    return {
+        "_variant": variant,
+        "build_directory": build_directory,
+        "hidden_build_directory": build_directory + "/.pipeline",
+        "hidden_task_directory": build_directory + "/.tasks",
+        "variant_cache_directory": tmp_path.joinpath("cache").as_posix(),
+        "profile_tasks": [],
+    }
+
+
+@pytest.mark.unit
+def test_task_cache_shares_targets_between_variants(tmp_path):
+    caches = {}
+    for variant in ["a", "b"]:
+        config = _create_config(tmp_path, variant)
+        target = Path(config["hidden_build_directory"], "task")
+        path = Path(config["hidden_task_directory"], "task.py")
+        path.parent.mkdir(parents=True)
+        path.write_text(f'open("{target.as_posix()}", "w").write("data")')
+
+        dag = nx.DiGraph()
+        dag.add_node("task", template="task.py", produces=target.as_posix())
+        dependency_hashes = {
+            "task.py": ("hash-of-rendered-task-" + variant, "sha256"),
+            tmp_path.joinpath("data.csv").as_posix(): ("hash-of-data", "sha256"),
+        }
+        cache = TaskCache(config)
+        caches[variant] = (
+            cache,
+            cache.compute_key("task", path, dependency_hashes, dag),
+        )
+
+    (cache_a, key_a), (cache_b, key_b) = caches["a"], caches["b"]
+    assert key_a == key_b
+
+    target_b = tmp_path.joinpath("bld-b", ".pipeline", "task")
+    assert not cache_b.restore(key_b, target_b.as_posix())
+
+    target_a = tmp_path.joinpath("bld-a", ".pipeline", "task")
+    target_a.parent.mkdir()
+    target_a.write_text("data")
+    cache_a.store(key_a, target_a.as_posix())
+    assert cache_b.restore(key_b, target_b.as_posix())
+    assert target_b.read_text() == "data"
+
+
+@pytest.mark.unit
+def test_prune_task_cache_keeps_keys_of_all_variants(tmp_path):
+    config = {**_create_config(tmp_path, "a"), "variants": {"a": {}, "b": {}}}
+    registered_keys = {
+        "a": {"task": "1", "removed-task": "2"},
+        "b": {"task": "3"},
+        "removed-variant": {"task": "4"},
+    }
+    for variant, keys in registered_keys.items():
+        cache = TaskCache({**config, "_variant": variant})
+        for id_, key in keys.items():
+            cache.register(id_, key)
+            tmp_path.joinpath("cache", key).mkdir(parents=True)
+    tmp_path.joinpath("cache", "5").mkdir()
+    tmp_path.joinpath("cache", ".tmp-6").mkdir()
+
+    assert prune_task_cache(config, {"a": {"task"}}) == 3
+    entries = sorted(path.name for path in tmp_path.joinpath("cache").iterdir())
+    assert entries == [".tmp-6", "1", "3", "keys"]
+    assert TaskCache({**config, "_variant": "a"}).keys == {"task": "1"}
+
+
+def _create_project(config):
+    """Create a project whose task ``create-data`` does not depend on the variant."""
+    config["globals"] = {"factor": 1}
+    config["variants"] = {"base": None, "double": {"factor": 2}}
+    Path(config["user_config_file"]).write_text(yaml.dump(config))
+
+    project_path = Path(config["project_directory"])
+    project_path.joinpath("src").mkdir()
+    tasks = {
+        "create-data": {"template": "create_data.py"},
+        "scale": {
+            "template": "scale.py",
+            "depends_on": "create-data",
+            "produces": "{{ build_directory }}/scaled.txt",
+        },
+    }
+    project_path.joinpath("src", "tasks.yaml").write_text(yaml.dump(tasks))
+    create_data = """
+    from pathlib import Path
+
+    with open("{{ project_directory }}/executions.txt", "a") as f:
+        f.write("create-data\\n")
+    Path("{{ produces }}").write_text("21")
+    """
+    project_path.joinpath("src", "create_data.py").write_text(
+        textwrap.dedent(create_data)
+    )
+    scale = """
+    from pathlib import Path
+
+    value = int(Path("{{ depends_on }}").read_text())
+    Path("{{ produces }}").write_text(str(value * {{ globals["factor"] }}))
+    """
+    project_path.joinpath("src", "scale.py").write_text(textwrap.dedent(scale))
+
+    os.chdir(project_path)
+
+    return project_path
+
+
+@pytest.mark.end_to_end
+def test_build_variants_executes_identical_tasks_once(test_project_config):
+    project_path = _create_project(test_project_config)
+
+    result = CliRunner().invoke(cli, ["build", "--variants"])
+    assert result.exit_code == 0
+    assert "### Build Variant 'base'" in result.output
+    assert project_path.joinpath("bld-base", "scaled.txt").read_text() == "21"
+    assert project_path.joinpath("bld-double", "scaled.txt").read_text() == "42"
+    assert project_path.joinpath("bld-double", ".pipeline", "create-data").exists()
+    # The task which does not depend on the variant is executed only once.
+    assert project_path.joinpath("executions.txt").read_text() == "create-data\n"
+
+    result = CliRunner().invoke(cli, ["build", "--variants", "double"])
+    assert result.exit_code == 0
+    assert "### Build Variant 'base'" not in result.output
+    assert "0/0 tasks" in result.output
+
+
+@pytest.mark.end_to_end
+def test_variants_have_their_own_hash_database(test_project_config):
+    project_path = _create_project(test_project_config)
+
+    result = CliRunner().invoke(cli, ["build", "--variants"])
+    assert result.exit_code == 0
+    for variant in ["base", "double"]:
+        assert project_path.joinpath(f"bld-{variant}", ".pipeline", "db.sql").exists()
+
+    result = CliRunner().invoke(cli, ["build", "--variants"])
+    assert result.exit_code == 0
+    outputs = result.output.split("### Build Variant")[1:]
+    assert len(outputs) == 2
+    assert all("0/0 tasks" in output for output in outputs)
+
+
+@pytest.mark.end_to_end
+def test_gc_prunes_the_variant_cache(test_project_config):
+    project_path = _create_project(test_project_config)
+    cache_directory = project_path.joinpath("bld", ".pipeline", "variant-cache")
+
+    def _count_entries():
+        return sum(1 for path in cache_directory.iterdir() if path.name != "keys")
+
+    result = CliRunner().invoke(cli, ["build", "--variants"])
+    assert result.exit_code == 0
+    assert _count_entries() == 3
+
+    # The entry of the old task of the variant is deleted after the build.
+    config = yaml.safe_load(Path(".pipeline.yaml").read_text())
+    config["variants"]["double"] = {"factor": 3}
+    Path(".pipeline.yaml").write_text(yaml.dump(config))
+    result = CliRunner().invoke(cli, ["build", "--variants", "double"])
+    assert result.exit_code == 0
+    assert _count_entries() == 3
+
+    # Entries of removed variants are deleted by the garbage collection.
+    del config["variants"]["double"]
+    Path(".pipeline.yaml").write_text(yaml.dump(config))
+    result = CliRunner().invoke(cli, ["gc"])
+    assert result.exit_code == 0
+    assert "Deleted 1 stale entr(y/ies) of the variant cache." in result.output
+    assert _count_entries() == 2
@@ -0,0 +1,288 @@
+"""This module contains the code to build variants of a project.
+
+Variants are declared in ``variants`` of the configuration and map names to values
+which update ``globals``, for example, different sample definitions or robustness
+checks. ``pipeline build --variants`` builds every variant with its own build directory
+and hash database.
+
+Many tasks do not depend on the values which differ between variants. To execute them
+only once, tasks of variants are identified by a key which is computed from the
+rendered task, the hashes of its dependencies, and the paths of its targets where the
+build directory of the variant is replaced with a placeholder. The targets of executed
+tasks are stored under their key in a cache which is shared by all variants. Before a
+task is executed, its targets are copied from the cache if the key is known.
+
+Every variant records the current key of each of its tasks. Entries of the cache whose
+keys are not recorded by any variant are deleted by :func:`prune_task_cache`.
+
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from pipeline.functions import create_function_fingerprint
+from pipeline.shared import ensure_list
+
+BUILD_DIRECTORY_PLACEHOLDER = "<build_directory>"
+KEYS_DIRECTORY = "keys"
+
+
+def parse_variants(variants):
+    """Parse the variants of the project.
+
+    Examples
+    --------
+    >>> parse_variants({"baseline": None, "recent": {"min_year": 2000}})
+    {'baseline': {}, 'recent': {'min_year': 2000}}
+    >>> parse_variants(None)
+    {}
+
+    """
+    variants = {} if variants is None else variants
+    if not isinstance(variants, dict):
+        raise ValueError(
+            "'variants' must map names of variants to values of 'globals', but is "
+            f"{variants}."
+        )
+
+    parsed = {}
+    for name, globals_ in variants.items():
+        globals_ = {} if globals_ is None else globals_
+        if not isinstance(globals_, dict):
+            raise ValueError(
+                f"The variant '{name}' must map names to values of 'globals', but "
+                f"is {globals_}."
+            )
+        parsed[str(name)] = globals_
+
+    return parsed
+
+
+def select_variants(selection, variants):
+    """Select the variants which are built.
+
+    Examples
+    --------
+    >>> variants = {"a": {}, "b": {}, "c": {}}
+    >>> select_variants("all", variants)
+    ['a', 'b', 'c']
+    >>> select_variants("c, a", variants)
+    ['c', 'a']
+
+    """
+    if not variants:
+        raise ValueError("There are no 'variants' in the configuration.")
+
+    if selection == "all":
+        selected = list(variants)
+    else:
+        selected = [name.strip() for name in selection.split(",") if name.strip()]
+
+    unknown_variants = [name for name in selected if name not in variants]
+    if unknown_variants:
+        raise ValueError(
+            f"Unknown variant(s) {unknown_variants}. Choose from {list(variants)}."
+        )
+
+    return selected
+
+
+class TaskCache:
+    """Share the targets of identical tasks between variants.
+
+    The cache is only active if a variant is built.
+
+    Parameters
+    ----------
+    config : dict
+        The workflow configuration.
+
+    """
+
+    def __init__(self, config):
+        self.is_active = config.get("_variant") is not None
+        self.directory = Path(config["variant_cache_directory"])
+        self.config = config
+        self.keys_path = _get_keys_path(self.directory, config.get("_variant"))
+        self.keys = (
+            json.loads(self.keys_path.read_text())
+            if self.is_active and self.keys_path.exists()
+            else {}
+        )
+
+    def is_cacheable(self, id_, dag):
+        """Check whether the targets of a task can be taken from the cache.
+
+        Tasks which are always executed or profiled are never taken from the cache.
+
+        """
+        return (
+            self.is_active
+            and not dag.nodes[id_].get("run_always", False)
+            and id_ not in self.config["profile_tasks"]
+        )
+
+    def compute_key(self, id_, path, dependency_hashes, dag):
+        """Compute the key of a task.
+
+        Parameters
+        ----------
+        id_ : str
+            The id of the task.
+        path : pathlib.Path
+            The rendered task in the hidden task directory.
+        dependency_hashes : dict
+            The hashes of the dependencies of the task.
+        dag : nx.DiGraph
+            The DAG containing the complete workflow.
+
+        """
+        task_info = dag.nodes[id_]
+        description = [Path(path).suffix, self._normalize(Path(path).read_text())]
+
+        # The template and the module of function tasks are described by the rendered
+        # task and the fingerprint which do not contain the paths of the variant.
+        excluded_dependencies = {task_info.get("template")}
+        if "function" in task_info:
+            excluded_dependencies.add(task_info["config"])
+            fingerprint = create_function_fingerprint(task_info, self.config)
+            description.append(self._normalize(fingerprint))
+
+        for dependency, (hash_, _) in sorted(dependency_hashes.items()):
+            if dependency not in excluded_dependencies:
+                description.append(f"{self._normalize(dependency)} {hash_}")
+
+        for target in ensure_list(task_info["produces"]):
+            description.append(self._normalize(Path(target).as_posix()))
+
+        return hashlib.sha256("\n".join(description).encode()).hexdigest()
+
+    def register(self, id_, key):
+        """Record the key of a task of the variant such that its entry is kept."""
+        if self.keys.get(id_) != key:
+            self.keys[id_] = key
+            self.keys_path.parent.mkdir(parents=True, exist_ok=True)
+            self.keys_path.write_text(json.dumps(self.keys, indent=4, sort_keys=True))
+
+    def restore(self, key, targets):
+        """Copy the targets of a task from the cache.
+
+        Returns
+        -------
+        is_restored : bool
+            Whether the targets were found in the cache.
+
+        """
+        entry = self.directory / key
+        if not entry.exists():
+            return False
+
+        for i, target in enumerate(ensure_list(targets)):
+            _copy(entry / str(i), Path(target))
+
+        return True
+
+    def store(self, key, targets):
+        """Copy the targets of a task into the cache."""
+        entry = self.directory / key
+        if entry.exists():
+            return
+
+        # Entries are completed in a temporary directory and renamed such that other
+        # builds never see partial entries.
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary_entry = Path(tempfile.mkdtemp(dir=self.directory, prefix=".tmp-"))
+        for i, target in enumerate(ensure_list(targets)):
+            _copy(Path(target), temporary_entry / str(i))
+        try:
+            os.rename(temporary_entry, entry)
+        except OSError:
+            # Another build has stored the same task in the meantime.
+            shutil.rmtree(temporary_entry)
+
+    def _normalize(self, text):
+        """Replace the directories of the variant with a placeholder."""
+        directories = {
+            self.config[key]: BUILD_DIRECTORY_PLACEHOLDER + suffix
+            for key, suffix in [
+                ("hidden_task_directory", "/hidden_task_directory"),
+                ("hidden_build_directory", "/hidden_build_directory"),
+                ("build_directory", ""),
+            ]
+        }
+        for directory in sorted(directories, key=len, reverse=True):
+            text = text.replace(directory, directories[directory])
+
+        return text
+
+
+def prune_task_cache(config, task_ids):
+    """Delete entries of the cache which are not used by any task of a variant.
+
+    Parameters
+    ----------
+    config : dict
+        The workflow configuration.
+    task_ids : dict
+        A dictionary mapping variants to the ids of their current tasks. The keys of
+        other variants are kept. Keys of variants which are not in the configuration
+        anymore are deleted.
+
+    Returns
+    -------
+    n_deleted : int
+        The number of deleted entries.
+
+    """
+    directory = Path(config["variant_cache_directory"])
+    if not directory.exists():
+        return 0
+
+    live_keys = set()
+    for path in directory.joinpath(KEYS_DIRECTORY).glob("*.json"):
+        variant = path.stem
+        if variant not in config["variants"]:
+            path.unlink()
+            continue
+
+        keys = json.loads(path.read_text())
+        if variant in task_ids:
+            keys = {id_: key for id_, key in keys.items() if id_ in task_ids[variant]}
+            path.write_text(json.dumps(keys, indent=4, sort_keys=True))
+        live_keys.update(keys.values())
+
+    n_deleted = 0
+    for entry in directory.iterdir():
+        # Temporary entries might belong to a running build.
+        is_stale = entry.name != KEYS_DIRECTORY and not entry.name.startswith(".")
+        if is_stale and entry.name not in live_keys:
+            shutil.rmtree(entry)
+            n_deleted += 1
+
+    return n_deleted
+
+
+def _get_keys_path(directory, variant):
+    return Path(directory, KEYS_DIRECTORY, f"{variant}.json")
+
+
+def _copy(source, destination):
+    """Copy a file or a directory and replace the destination.
+
+    Files are copied instead of linked such that tasks which overwrite their targets do
+    not modify the cache.
+
+    """
+    if destination.is_dir():
+        shutil.rmtree(destination)
+    elif destination.exists():
+        destination.unlink()
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    if source.is_dir():
+        shutil.copytree(source, destination)
+    else:
+        shutil.copy2(source, destination)